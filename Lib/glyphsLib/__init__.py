@@ -18,13 +18,25 @@
 from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
 
+from fontTools.misc.py23 import tobytes, tounicode
+
 from io import open
 import logging
+import multiprocessing
 
-from glyphsLib.builder import to_ufos
-from glyphsLib.casting import cast_data
-from glyphsLib.interpolation import interpolate, build_designspace
-from glyphsLib.parser import Parser
+from glyphsLib.builder import (
+    to_ufos, iter_ufos, get_instance_data, check_app_version, load_features,
+    load_master_layers, generate_base_fonts, get_glyph_order, build_master,
+    FamilyData, GLYPHS_PREFIX)
+from glyphsLib.cache import ParseCache
+from glyphsLib.casting import (
+    cast_data, cast_glyph_data, _TYPE_STRUCTURE, _COMPACT_TYPE_STRUCTURE)
+from glyphsLib.interpolation import (
+    interpolate, build_designspace, write_designspace)
+from glyphsLib.lazy import load_lazy, loads_lazy
+from glyphsLib.parser import Parser, index_glyphs
+from glyphsLib.subset import subset_data
+from glyphsLib.timing import Timings, span
 from glyphsLib.util import write_ufo
 
 
@@ -32,54 +44,195 @@ __version__ = "1.7.6.dev0"
 
 __all__ = [
     "build_masters", "build_instances", "load_to_ufos", "load", "loads",
+    "load_lazy", "loads_lazy", "Timings",
 ]
 
 logger = logging.getLogger(__name__)
 
 
-def load(fp):
+def load(fp, workers=None, compact_nodes=False, cache=None):
     """Read a .glyphs file. 'fp' should be (readable) file object.
     Return the unpacked root object (an ordered dictionary).
+
+    If 'workers' is more than one, the glyphs are parsed and cast by that
+    many processes, see loads. If 'compact_nodes' is true, the nodes of paths
+    are read into NodeArrays, which take much less memory than the default
+    lists of [x, y, type, smooth] lists. If 'cache' is given, a ParseCache or
+    the path to a cache directory, the data is loaded from there if the same
+    source has been loaded before, and stored there otherwise.
     """
-    return loads(fp.read())
+    if cache is not None or (workers is not None and workers > 1):
+        return loads(fp.read(), workers=workers, compact_nodes=compact_nodes,
+                     cache=cache)
+    with span('parse') as stage:
+        p = Parser(_type_structure(compact_nodes))
+        logger.info('Parsing and casting .glyphs file')
+        data = p.parse_file(fp)
+        stage.count = len(data.get('glyphs', ()))
+    return data
 
 
-def loads(value):
+def loads(value, workers=None, compact_nodes=False, cache=None):
     """Read a .glyphs file from a bytes object.
     Return the unpacked root object (an ordered dictionary).
+
+    If 'workers' is more than one, the glyphs list is split into chunks of
+    whole glyphs which are parsed and cast in a pool of that many processes.
+    For 'compact_nodes' and 'cache' see load.
     """
-    p = Parser()
-    logger.info('Parsing .glyphs file')
-    data = p.parse(value)
-    logger.info('Casting parsed values')
-    cast_data(data)
+    if cache is not None:
+        if not isinstance(cache, ParseCache):
+            cache = ParseCache(cache)
+        with span('cache_load'):
+            key = cache.key(tobytes(value, encoding='utf-8'), compact_nodes)
+            data = cache.get(key)
+        if data is None:
+            data = loads(value, workers=workers, compact_nodes=compact_nodes)
+            with span('cache_store'):
+                cache.put(key, data)
+        return data
+    with span('parse') as stage:
+        if workers is not None and workers > 1:
+            data = _loads_parallel(
+                tounicode(value, encoding='utf-8'), workers, compact_nodes)
+        else:
+            p = Parser(_type_structure(compact_nodes))
+            logger.info('Parsing and casting .glyphs file')
+            data = p.parse(value)
+        stage.count = len(data.get('glyphs', ()))
     return data
 
 
+# number of chunks per worker, so that workers finishing early can take over
+# some of the work of the others
+_CHUNKS_PER_WORKER = 4
+
+
+def _type_structure(compact_nodes):
+    return _COMPACT_TYPE_STRUCTURE if compact_nodes else _TYPE_STRUCTURE
+
+
+def _loads_parallel(text, workers, compact_nodes):
+    index = index_glyphs(text)
+    if index is None:
+        return loads(text, compact_nodes=compact_nodes)
+    start, end, glyphs = index
+
+    logger.info('Parsing and casting .glyphs file')
+    data = Parser(_type_structure(compact_nodes)).parse(
+        text[:start] + '()' + text[end:])
+
+    # split the glyphs into chunks of about the same size in the source
+    chunks = []
+    chunk_size = (end - start) // (workers * _CHUNKS_PER_WORKER) + 1
+    chunk_start = None
+    for _, glyph_start, glyph_end in glyphs:
+        if chunk_start is None:
+            chunk_start = glyph_start
+        if glyph_end - chunk_start >= chunk_size:
+            chunks.append(
+                ('(' + text[chunk_start:glyph_end] + ')', compact_nodes))
+            chunk_start = None
+    if chunk_start is not None:
+        chunks.append(
+            ('(' + text[chunk_start:glyphs[-1][2]] + ')', compact_nodes))
+
+    logger.info('Parsing and casting glyphs in %d processes', workers)
+    pool = multiprocessing.Pool(workers)
+    try:
+        data['glyphs'] = [glyph for chunk in pool.imap(_load_glyphs, chunks)
+                          for glyph in chunk]
+    finally:
+        pool.close()
+        pool.join()
+    return data
+
+
+def _load_glyphs(args):
+    """Parse and cast a chunk of the glyphs list, in a worker process."""
+    text, compact_nodes = args
+    glyphs = Parser().parse(text)
+    for glyph in glyphs:
+        cast_glyph_data(glyph, compact_nodes=compact_nodes)
+    return glyphs
+
+
 def load_to_ufos(file_or_path, include_instances=False, family_name=None,
-                 debug=False):
-    """Load an unpacked .glyphs object to UFO objects."""
+                 debug=False, compact_nodes=False, cache=None, workers=None,
+                 subset=None):
+    """Load an unpacked .glyphs object to UFO objects. For 'workers',
+    'compact_nodes' and 'cache' see load. If 'subset' is given, a list of
+    glyph names, only these glyphs and the glyphs they are made of through
+    components are parsed and loaded, see glyphsLib.subset.subset_data.
+    """
 
-    if hasattr(file_or_path, 'read'):
-        data = load(file_or_path)
-    else:
-        with open(file_or_path, 'r', encoding='utf-8') as ifile:
-            data = load(ifile)
+    data = _load_file(file_or_path, workers=workers,
+                      compact_nodes=compact_nodes, cache=cache, subset=subset)
     logger.info('Loading to UFOs')
     return to_ufos(data, include_instances=include_instances,
                    family_name=family_name, debug=debug)
 
 
+def _load_file(file_or_path, workers=None, compact_nodes=False, cache=None,
+               subset=None):
+    """Load a .glyphs file or path. If subset is given, a list of glyph
+    names, the data only has these glyphs and the glyphs they are made of
+    through components (see subset.subset_data), and unless it is loaded
+    from a cache, the other glyphs are not even parsed.
+    """
+
+    if hasattr(file_or_path, 'read'):
+        return _load_subset(file_or_path, workers, compact_nodes, cache,
+                            subset)
+    with open(file_or_path, 'r', encoding='utf-8') as ifile:
+        return _load_subset(ifile, workers, compact_nodes, cache, subset)
+
+
+def _load_subset(fp, workers, compact_nodes, cache, subset):
+    if subset is None:
+        return load(fp, workers=workers, compact_nodes=compact_nodes,
+                    cache=cache)
+    if cache is not None:
+        data = load(fp, workers=workers, compact_nodes=compact_nodes,
+                    cache=cache)
+    else:
+        data = load_lazy(fp, compact_nodes=compact_nodes)
+    return subset_data(data, subset)
+
+
 def build_masters(filename, master_dir, designspace_instance_dir=None,
-                  family_name=None):
+                  family_name=None, cache=None, workers=None, direct=False,
+                  incremental=False, subset=None):
     """Write and return UFOs from the masters defined in a .glyphs file.
 
+    The masters are built one at a time, and each is written and released
+    before the next one is built, unless 'workers' is more than one. The
+    returned UFOs are opened from master_dir, and only load their glyphs from
+    there when accessed.
+
     Args:
         master_dir: Directory where masters are written.
         designspace_instance_dir: If provided, a designspace document will be
             written alongside the master UFOs though no instances will be built.
         family_name: If provided, the master UFOs will be given this name and
             only instances with this name will be included in the designspace.
+        cache: If provided, a ParseCache or cache directory path to load the
+            parsed .glyphs file from, or store it into.
+        workers: If more than one, the .glyphs file is parsed, and the masters
+            are built and written, by a pool of that many processes, each
+            master in one process.
+        direct: If True, the masters are written by glyphsLib.ufowriter
+            straight from the .glyphs data, without building defcon objects.
+            The UFOs are the same.
+        incremental: If True, the masters are built like with 'direct', and
+            master UFOs written by a previous incremental build are updated:
+            only the glyphs which changed since, according to their
+            lastChange dates and content, and the other files whose content
+            changed are rewritten. See glyphsLib.incremental.
+        subset: If provided, a list of glyph names, the masters only have
+            these glyphs and the glyphs they are made of through components.
+            The other glyphs are not parsed, unless the file is loaded
+            through 'cache'.
 
     Returns:
         A list of master UFOs, and if designspace_instance_dir is provided, a
@@ -87,19 +240,105 @@ def build_masters(filename, master_dir, designspace_instance_dir=None,
         paths from the designspace and respective data from the Glyphs source.
     """
 
-    ufos, instance_data = load_to_ufos(
-        filename, include_instances=True, family_name=family_name)
+    from defcon import Font
+
+    font_class = None
+    if direct or incremental:
+        from glyphsLib import ufowriter
+        font_class = ufowriter.Font
+    data = _load_file(filename, workers=workers, cache=cache, subset=subset)
+    keys = None
+    if incremental:
+        from glyphsLib.incremental import change_keys
+        keys = change_keys(data)
+    logger.info('Loading to UFOs')
+    if workers is not None and workers > 1:
+        ufos = [Font(path) for path in _build_masters_parallel(
+            data, master_dir, family_name, workers, font_class, keys)]
+        instance_data = get_instance_data(data, ufos[0])
+    else:
+        ufos, instance_data = [], None
+        for ufo in iter_ufos(data, family_name=family_name,
+                             font_class=font_class):
+            if instance_data is None:
+                instance_data = get_instance_data(data, ufo)
+            ufos.append(Font(_write_master(ufo, master_dir, keys)))
+            del ufo
     if designspace_instance_dir is not None:
-        designspace_path, instance_data = build_designspace(
+        designspace_path, instance_data = write_designspace(
             ufos, master_dir, designspace_instance_dir, instance_data)
         return ufos, designspace_path, instance_data
-    else:
-        for ufo in ufos:
-            write_ufo(ufo, master_dir)
-        return ufos
+    return ufos
+
+
+def _build_masters_parallel(data, master_dir, family_name, workers,
+                            font_class=None, keys=None):
+    """Build and write the masters of .glyphs data in a pool of processes,
+    like iter_ufos does in this process. Return the paths of the UFOs.
+    """
+
+    check_app_version(data)
+    if family_name is None:
+        family_name = data['familyName']
+
+    features = load_features(data)
+    glyph_names, kerning_groups, master_layers, backgrounds = \
+        load_master_layers(data)
+    kerning = data.get('kerning', {})
+    family = FamilyData(
+        get_glyph_order(next(generate_base_fonts(data, family_name)),
+                        glyph_names),
+        master_layers, features, kerning_groups)
+
+    # each process only gets the font-level data and the layers of its master
+    per_master_keys = ('fontMaster', 'glyphs', 'kerning', 'instances')
+    font_data = {k: v for k, v in data.items() if k not in per_master_keys}
+    jobs = []
+    for master in data['fontMaster']:
+        master_id = master['id']
+        jobs.append((
+            dict(font_data, fontMaster=[master]), family_name,
+            master_layers[master_id], backgrounds[master_id], family,
+            kerning.get(master_id), master_dir, font_class,
+            None if keys is None else keys.get(master_id, {})))
+
+    logger.info('Building %d masters in %d processes', len(jobs), workers)
+    with span('parallel_masters', len(jobs)):
+        pool = multiprocessing.Pool(min(workers, len(jobs)))
+        try:
+            return list(pool.imap(_build_master, jobs))
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _build_master(args):
+    """Build and write one master UFO, in a worker process."""
+    (font_data, family_name, layers, backgrounds, family, kerning, master_dir,
+     font_class, keys) = args
+    ufo = next(generate_base_fonts(font_data, family_name, font_class))
+    build_master(ufo, layers, backgrounds, family, kerning)
+    if keys is None:
+        return write_ufo(ufo, master_dir)
+    from glyphsLib.incremental import write_ufo_incrementally
+    return write_ufo_incrementally(ufo, master_dir, keys)
+
+
+def _write_master(ufo, master_dir, keys=None):
+    """Write a master UFO, incrementally if the change keys of the glyphs of
+    each master (see glyphsLib.incremental.change_keys) are given, and
+    return its path.
+    """
+
+    if keys is None:
+        return write_ufo(ufo, master_dir)
+    from glyphsLib.incremental import write_ufo_incrementally
+    master_id = ufo.lib[GLYPHS_PREFIX + 'fontMasterID']
+    return write_ufo_incrementally(ufo, master_dir, keys.get(master_id, {}))
 
 
-def build_instances(filename, master_dir, instance_dir, family_name=None):
+def build_instances(filename, master_dir, instance_dir, family_name=None,
+                    cache=None, workers=None, subset=None):
     """Write and return UFOs from the instances defined in a .glyphs file.
 
     Args:
@@ -107,10 +346,18 @@ def build_instances(filename, master_dir, instance_dir, family_name=None):
         instance_dir: Directory where instances are written.
         family_name: If provided, the master UFOs will be given this name and
             only instances with this name will be built.
+        cache: If provided, a ParseCache or cache directory path to load the
+            parsed .glyphs file from, or store it into.
+        workers: If more than one, the .glyphs file is parsed by a pool of
+            that many processes.
+        subset: If provided, a list of glyph names, the masters and instances
+            only have these glyphs and the glyphs they are made of through
+            components, like with build_masters.
     """
 
     master_ufos, instance_data = load_to_ufos(
-        filename, include_instances=True, family_name=family_name)
+        filename, include_instances=True, family_name=family_name,
+        cache=cache, workers=workers, subset=subset)
     instance_ufos = interpolate(
         master_ufos, master_dir, instance_dir, instance_data)
     return instance_ufos
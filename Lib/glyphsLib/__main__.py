@@ -20,6 +20,8 @@ import sys
 import argparse
 
 import glyphsLib
+from glyphsLib.cache import ParseCache, DEFAULT_MAX_SIZE
+from glyphsLib.timing import Timings
 
 
 description = """\n
@@ -43,17 +45,91 @@ def parse_options(args):
                         help="Output and generate interpolated instances UFO "
                              "to folder INSTANCES. "
                              "(default: %(const)s)")
+    parser.add_argument("--cache", metavar="CACHE", default=None,
+                        help="Cache parsed Glyphs files in folder CACHE, and "
+                             "reuse them when the same file is converted "
+                             "again.")
+    parser.add_argument("--cache-size", metavar="MB", type=int,
+                        default=DEFAULT_MAX_SIZE // (1024 * 1024),
+                        help="Maximum size of the cache folder in megabytes. "
+                             "(default: %(default)s)")
+    parser.add_argument("-j", "--workers", metavar="N", type=int,
+                        default=None,
+                        help="Parse the Glyphs file and build the masters in "
+                             "N processes.")
+    parser.add_argument("--direct", action="store_true",
+                        help="Write the master UFOs straight from the Glyphs "
+                             "data, without building defcon fonts.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rewrite the files of master UFOs from a "
+                             "previous incremental build which changed, "
+                             "instead of writing them from scratch.")
+    parser.add_argument("--subset", metavar="GLYPHS", default=None,
+                        type=parse_subset,
+                        help="Only build the glyphs in the comma-separated "
+                             "list GLYPHS, and the glyphs they are made of "
+                             "through components.")
+    parser.add_argument("--timings", metavar="FILE", nargs="?", const="-",
+                        default=None,
+                        help="Write a JSON report of the time taken by each "
+                             "stage of the build to FILE, or print it if no "
+                             "FILE is given.")
+    parser.add_argument("--profile", metavar="DIR", default=None,
+                        help="Profile each stage of the build with cProfile, "
+                             "and write the statistics to DIR/STAGE.prof.")
+    parser.add_argument("--memory", metavar="N", type=int, nargs="?",
+                        const=10, default=None,
+                        help="Trace memory with tracemalloc, and add the peak "
+                             "memory of each stage of the build and its N "
+                             "top allocation sites to the --timings report, "
+                             "which is printed if --timings is not given. "
+                             "Slows the build down a lot. "
+                             "(default N: %(const)s)")
     options = parser.parse_args(args)
+    if options.instances is not None:
+        # instances are interpolated from defcon masters built in memory
+        for option in ('direct', 'incremental'):
+            if getattr(options, option):
+                parser.error("argument --%s: not allowed with argument "
+                             "-n/--instances" % option)
     return options
 
 
+def parse_subset(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
 def main(args=None):
     opt = parse_options(args)
+    if opt.timings is None and opt.profile is None and opt.memory is None:
+        build(opt)
+        return
+    memory = opt.memory is not None
+    with Timings(profile=opt.profile is not None, memory=memory,
+                 top=opt.memory or 0) as timings:
+        build(opt)
+    if opt.timings == '-' or (opt.timings is None and memory):
+        print(timings.report())
+    elif opt.timings is not None:
+        timings.write_report(opt.timings)
+    if opt.profile is not None:
+        timings.dump_profiles(opt.profile)
+
+
+def build(opt):
+    cache = None
+    if opt.cache is not None:
+        cache = ParseCache(opt.cache, opt.cache_size * 1024 * 1024)
     if opt.glyphs is not None:
         if opt.instances is None:
-            glyphsLib.build_masters(opt.glyphs, opt.masters)
+            glyphsLib.build_masters(opt.glyphs, opt.masters, cache=cache,
+                                    workers=opt.workers, direct=opt.direct,
+                                    incremental=opt.incremental,
+                                    subset=opt.subset)
         else:
-            glyphsLib.build_instances(opt.glyphs, opt.masters, opt.instances)
+            glyphsLib.build_instances(opt.glyphs, opt.masters, opt.instances,
+                                      cache=cache, workers=opt.workers,
+                                      subset=opt.subset)
 
 if __name__ == '__main__':
     main(sys.argv[1:])
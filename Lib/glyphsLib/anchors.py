@@ -25,72 +25,127 @@ def propagate_font_anchors(ufo):
     """Copy anchors from parent glyphs' components to the parent."""
 
     processed = set()
+    anchor_index = {}
     for glyph in ufo:
-        propagate_glyph_anchors(ufo, glyph, processed)
+        propagate_glyph_anchors(ufo, glyph, processed, anchor_index)
 
 
-def propagate_glyph_anchors(ufo, parent, processed):
-    """Propagate anchors for a single parent glyph."""
+def propagate_glyph_anchors(ufo, parent, processed, anchor_index=None):
+    """Propagate anchors for a single parent glyph, and the glyphs it is
+    composed of which haven't been processed yet.
+
+    The component graph is walked depth-first with a stack rather than by
+    recursion, so that the depth of components isn't limited, and each
+    glyph is processed after its components, in the order the recursion
+    would take. anchor_index maps glyph names to the AnchorIndex of their
+    final anchors, and is shared between calls for the same font.
+    """
 
     if parent.name in processed:
         return
     processed.add(parent.name)
+    if anchor_index is None:
+        anchor_index = {}
+
+    stack = [(parent, iter(parent.components))]
+    # glyphs on the stack, whose anchors may still change
+    pending = {parent.name}
+    while stack:
+        glyph, components = stack[-1]
+        for component in components:
+            base = ufo[component.baseGlyph]
+            if base.name not in processed:
+                processed.add(base.name)
+                pending.add(base.name)
+                stack.append((base, iter(base.components)))
+                break
+        else:
+            stack.pop()
+            if glyph.components:
+                add_component_anchors(ufo, glyph, anchor_index, pending)
+            pending.discard(glyph.name)
+
+
+def add_component_anchors(ufo, parent, anchor_index, pending=()):
+    """Add the anchors of a parent glyph's components to the parent, once
+    the components have been processed.
+    """
 
     base_components = []
     mark_components = []
     anchor_names = set()
     to_add = {}
     for component in parent.components:
-        glyph = ufo[component.baseGlyph]
-        propagate_glyph_anchors(ufo, glyph, processed)
-        if any(a.name.startswith('_') for a in glyph.anchors):
-            mark_components.append(component)
+        name = component.baseGlyph
+        index = anchor_index.get(name)
+        if index is None:
+            index = AnchorIndex(ufo[name].anchors)
+            # a glyph still being processed, through a component cycle, is
+            # indexed again when it is used next
+            if name not in pending:
+                anchor_index[name] = index
+        transform = Transform(*component.transformation)
+        if index.is_mark:
+            mark_components.append((index, transform))
         else:
-            base_components.append(component)
-            anchor_names |= {a.name for a in glyph.anchors}
+            base_components.append((index, transform))
+            anchor_names |= index.names
 
-    for anchor_name in anchor_names:
-        # don't add if parent already contains this anchor OR any associated
-        # ligature anchors (e.g. "top_1, top_2" for "top")
-        if not any(a.name.startswith(anchor_name) for a in parent.anchors):
-            get_anchor_data(to_add, ufo, base_components, anchor_name)
+    if anchor_names:
+        parent_names = [a.name for a in parent.anchors]
+        for anchor_name in anchor_names:
+            # don't add if parent already contains this anchor OR any
+            # associated ligature anchors (e.g. "top_1, top_2" for "top")
+            if not any(n.startswith(anchor_name) for n in parent_names):
+                get_anchor_data(to_add, base_components, anchor_name)
 
-    for component in mark_components:
-        adjust_anchors(to_add, ufo, component)
+    for index, transform in mark_components:
+        adjust_anchors(to_add, index, transform)
 
     for name, (x, y) in to_add.items():
         anchor_dict = {'name': name, 'x': x, 'y': y}
-        parent.appendAnchor(glyph.anchorClass(anchorDict=anchor_dict))
+        parent.appendAnchor(parent.anchorClass(anchorDict=anchor_dict))
 
 
-def get_anchor_data(anchor_data, ufo, components, anchor_name):
-    """Get data for an anchor from a list of components."""
+def get_anchor_data(anchor_data, components, anchor_name):
+    """Get data for an anchor from a list of (AnchorIndex, Transform) tuples
+    for components.
+    """
 
     anchors = []
-    for component in components:
-        for anchor in ufo[component.baseGlyph].anchors:
-            if anchor.name == anchor_name:
-                anchors.append((anchor, component))
-                break
+    for index, transform in components:
+        anchor = index.first.get(anchor_name)
+        if anchor is not None:
+            anchors.append((anchor, transform))
     if len(anchors) > 1:
-        for i, (anchor, component) in enumerate(anchors):
-            t = Transform(*component.transformation)
+        for i, (anchor, transform) in enumerate(anchors):
             name = '%s_%d' % (anchor.name, i + 1)
-            anchor_data[name] = t.transformPoint((anchor.x, anchor.y))
+            anchor_data[name] = transform.transformPoint((anchor.x, anchor.y))
     elif anchors:
-        anchor, component = anchors[0]
-        t = Transform(*component.transformation)
-        anchor_data[anchor.name] = t.transformPoint((anchor.x, anchor.y))
+        anchor, transform = anchors[0]
+        anchor_data[anchor.name] = transform.transformPoint(
+            (anchor.x, anchor.y))
 
 
-def adjust_anchors(anchor_data, ufo, component):
+def adjust_anchors(anchor_data, index, transform):
     """Adjust anchors to which a mark component may have been attached."""
 
-    glyph = ufo[component.baseGlyph]
-    t = Transform(*component.transformation)
-    for anchor in glyph.anchors:
+    for anchor in index.anchors:
         # only adjust if this anchor has data and the component also contains
         # the associated mark anchor (e.g. "_top" for "top")
-        if (anchor.name in anchor_data and
-            any(a.name == '_' + anchor.name for a in glyph.anchors)):
-            anchor_data[anchor.name] = t.transformPoint((anchor.x, anchor.y))
+        if anchor.name in anchor_data and '_' + anchor.name in index.first:
+            anchor_data[anchor.name] = transform.transformPoint(
+                (anchor.x, anchor.y))
+
+
+class AnchorIndex(object):
+    """The anchors of a glyph, indexed by name."""
+
+    def __init__(self, anchors):
+        self.anchors = list(anchors)
+        self.names = {a.name for a in self.anchors}
+        # the first anchor of each name
+        self.first = {}
+        for anchor in self.anchors:
+            self.first.setdefault(anchor.name, anchor)
+        self.is_mark = any(a.name.startswith('_') for a in self.anchors)
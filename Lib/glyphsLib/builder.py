@@ -18,15 +18,21 @@ from __future__ import (print_function, division, absolute_import,
 
 from fontTools.misc.py23 import round, unicode
 
+import collections
+import contextlib
+import itertools
 import logging
 import re
 
 from glyphsLib.anchors import propagate_font_anchors
-from glyphsLib.util import clear_data, cast_to_number_or_bool, bin_to_int_list
+from glyphsLib.subset import subset_data
+from glyphsLib.timing import span
+from glyphsLib.util import (
+    track_data, unused_data, cast_to_number_or_bool, bin_to_int_list)
 import glyphsLib.glyphdata
 
 __all__ = [
-    'to_ufos', 'set_redundant_data', 'set_custom_params',
+    'to_ufos', 'iter_ufos', 'set_redundant_data', 'set_custom_params',
     'GLYPHS_PREFIX'
 ]
 
@@ -119,198 +125,369 @@ CODEPAGE_RANGES = {
 }
 
 
-def to_ufos(data, include_instances=False, family_name=None, debug=False):
+def to_ufos(data, include_instances=False, family_name=None, debug=False,
+            subset=None):
     """Take .glyphs file data and load it into UFOs.
 
     Takes in data as a dictionary structured according to
     https://github.com/schriftgestalt/GlyphsSDK/blob/master/GlyphsFileFormat.md
     and returns a list of UFOs, one per master.
 
-    If debug is True, returns unused input data instead of the resulting UFOs.
+    The input data is only read, never modified, so it can be converted
+    several times. If debug is True, returns the parts of the input data which
+    were not read instead of the resulting UFOs. If subset is given, a list of
+    glyph names, the UFOs only have these glyphs and the glyphs they are made
+    of through components, see subset.subset_data.
     """
 
+    if subset is not None:
+        data = subset_data(data, subset)
+    if debug:
+        data = track_data(data)
+
+    result = list(iter_ufos(data, family_name=family_name))
+    instances = get_instance_data(data, result[0])
+    if debug:
+        return unused_data(data)
+    elif include_instances:
+        return result, instances
+    return result
+
+
+def iter_ufos(data, family_name=None, font_class=None):
+    """Take .glyphs file data and yield UFOs, one per master.
+
+    Like to_ufos, but each UFO is built completely, with its glyphs, anchors,
+    features, groups and kerning, only when the previous one has been
+    consumed, so that a caller which writes and releases each UFO in turn
+    never holds more than one of them in memory.
+
+    The UFOs are instances of font_class, defcon.Font by default; a caller
+    which only writes them can pass glyphsLib.ufowriter.Font instead.
+    """
+
+    check_app_version(data)
+    if family_name is None:
+        family_name = data['familyName']
+
+    features = load_features(data)
+    with span('master_layers') as stage:
+        glyph_names, kerning_groups, master_layers, backgrounds = \
+            load_master_layers(data)
+        stage.count = len(glyph_names)
+    kerning = data.get('kerning', {})
+    family = None
+
+    for ufo in generate_base_fonts(data, family_name, font_class):
+        master_id = ufo.lib[GLYPHS_PREFIX + 'fontMasterID']
+        if family is None:
+            with span('family', len(glyph_names)):
+                family = FamilyData(get_glyph_order(ufo, glyph_names),
+                                    master_layers, features, kerning_groups)
+        build_master(ufo, master_layers[master_id], backgrounds[master_id],
+                     family,
+                     kerning[master_id] if master_id in kerning else None)
+        yield ufo
+
+
+def check_app_version(data):
+    """Warn if .glyphs data is too old to be converted reliably."""
+
     # check that source was generated with at least stable version 2.3
     # https://github.com/googlei18n/glyphsLib/pull/65#issuecomment-237158140
-    if data.pop('.appVersion', 0) < 895:
+    if data.get('.appVersion', 0) < 895:
         logger.warn('This Glyphs source was generated with an outdated version '
                     'of Glyphs. The resulting UFOs may be incorrect.')
 
-    source_family_name = data.pop('familyName')
-    if family_name is None:
-        family_name = source_family_name
+
+def load_features(data):
+    """Read feature prefixes, classes and features out of .glyphs data, as
+    taken by add_features_to_ufo.
+    """
 
     feature_prefixes, classes, features = [], [], []
     for f in data.get('featurePrefixes', []):
-        feature_prefixes.append((f.pop('name'), f.pop('code'),
-                                 f.pop('automatic', None)))
+        feature_prefixes.append((f['name'], f['code'], f.get('automatic')))
     for c in data.get('classes', []):
-        classes.append((c.pop('name'), c.pop('code'), c.pop('automatic', None)))
+        classes.append((c['name'], c['code'], c.get('automatic')))
     for f in data.get('features', []):
-        features.append((f.pop('name'), f.pop('code'), f.pop('automatic', None),
-                         f.pop('disabled', None), f.pop('notes', None)))
-    kerning_groups = {}
+        features.append((f['name'], f['code'], f.get('automatic'),
+                         f.get('disabled'), f.get('notes')))
+    return feature_prefixes, classes, features
 
-    # stores background data from "associated layers"
-    supplementary_bg_data = []
 
-    #TODO(jamesgk) maybe create one font at a time to reduce memory usage
-    ufos, master_id_order = generate_base_fonts(data, family_name)
+def load_master_layers(data):
+    """Sort the glyph layers in .glyphs data by master.
 
-    # get the 'glyphOrder' custom parameter as stored in the lib.plist.
-    # We assume it's the same for all ufos.
-    first_ufo = ufos[master_id_order[0]]
-    glyphOrder_key = PUBLIC_PREFIX + 'glyphOrder'
-    if glyphOrder_key in first_ufo.lib:
-        glyph_order = first_ufo.lib[glyphOrder_key]
-    else:
-        glyph_order = []
-    sorted_glyphset = set(glyph_order)
+    Returns the glyph names in source order, the kerning groups, and two
+    dictionaries from master IDs to the (glyph name, layer, glyph metadata)
+    tuples of the master and to its (glyph name, layer name, layer) background
+    data from "associated layers".
+    """
+
+    glyph_names = []
+    kerning_groups = {}
+    master_layers = collections.defaultdict(list)
+    backgrounds = collections.defaultdict(list)
 
     for glyph in data['glyphs']:
         add_glyph_to_groups(kerning_groups, glyph)
 
-        glyph_name = glyph.pop('glyphname')
-        if glyph_name not in sorted_glyphset:
-            # glyphs not listed in the 'glyphOrder' custom parameter but still
-            # in the font are appended after the listed glyphs, in the order
-            # in which they appear in the source file
-            glyph_order.append(glyph_name)
+        glyph_name = glyph['glyphname']
+        glyph_names.append(glyph_name)
 
-        # pop glyph metadata only once, i.e. not when looping through layers
+        # read glyph metadata only once, i.e. not when looping through layers
         metadata_keys = ['unicode', 'color', 'export', 'lastChange',
                          'leftMetricsKey', 'note', 'production',
                          'rightMetricsKey', 'widthMetricsKey',
                          'category', 'subCategory']
-        glyph_data = {k: glyph.pop(k) for k in metadata_keys if k in glyph}
+        glyph_data = {k: glyph[k] for k in metadata_keys if k in glyph}
 
         for layer in glyph['layers']:
-            layer_id = layer.pop('layerId')
-            layer_name = layer.pop('name', None)
+            layer_id = layer['layerId']
+            layer_name = layer.get('name')
 
-            assoc_id = layer.pop('associatedMasterId', None)
+            assoc_id = layer.get('associatedMasterId')
             if assoc_id is not None:
                 if layer_name is not None:
-                    supplementary_bg_data.append(
-                        (assoc_id, glyph_name, layer_name, layer))
+                    backgrounds[assoc_id].append(
+                        (glyph_name, layer_name, layer))
                 continue
 
-            ufo = ufos[layer_id]
-            glyph = ufo.newGlyph(glyph_name)
-            load_glyph(glyph, layer, glyph_data)
+            master_layers[layer_id].append((glyph_name, layer, glyph_data))
 
-    for layer_id, glyph_name, bg_name, bg_data in supplementary_bg_data:
-        glyph = ufos[layer_id][glyph_name]
-        set_robofont_glyph_background(glyph, bg_name, bg_data)
+    return glyph_names, kerning_groups, master_layers, backgrounds
+
+
+def get_glyph_order(ufo, glyph_names):
+    """Return the glyph order of a family, given the base UFO of its first
+    master and the names of its glyphs in source order.
+    """
 
-    for ufo in ufos.values():
-        ufo.lib[glyphOrder_key] = glyph_order
+    # get the 'glyphOrder' custom parameter as stored in the lib.plist.
+    # We assume it's the same for all ufos.
+    # It is copied, as the parameter value belongs to the input data.
+    glyph_order = list(ufo.lib.get(PUBLIC_PREFIX + 'glyphOrder', []))
+    sorted_glyphset = set(glyph_order)
+    # glyphs not listed in the 'glyphOrder' custom parameter but still
+    # in the font are appended after the listed glyphs, in the order
+    # in which they appear in the source file
+    glyph_order.extend(
+        name for name in glyph_names if name not in sorted_glyphset)
+    return glyph_order
+
+
+def build_master(ufo, layers, backgrounds, family, kerning):
+    """Load a master's glyphs, as sorted by load_master_layers, and what it
+    shares with the other masters of its family, from their FamilyData, into
+    its base UFO, then its kerning if not None.
+    """
+
+    with notifications_disabled(ufo):
+        _build_master(ufo, layers, backgrounds, family, kerning)
+
+
+def _build_master(ufo, layers, backgrounds, family, kerning):
+    categories = family.categories
+    with span('glyphs', len(layers)):
+        for glyph_name, layer, glyph_data in layers:
+            glyph = ufo.newGlyph(glyph_name)
+            load_glyph(glyph, layer, glyph_data, categories[glyph_name],
+                       production_names=False)
+
+        for glyph_name, bg_name, bg_data in backgrounds:
+            glyph = ufo[glyph_name]
+            set_robofont_glyph_background(glyph, bg_name, bg_data)
+
+    # each UFO gets its own copies, so that changing one doesn't change the
+    # others
+    ufo.lib[PUBLIC_PREFIX + 'glyphOrder'] = list(family.glyph_order)
+    if len(ufo) < len(categories):
+        # the master lacks some of the family's glyphs
+        postscript_names = {name: production_name
+                            for name, production_name
+                            in family.postscript_names.items() if name in ufo}
+    else:
+        postscript_names = dict(family.postscript_names)
+    if postscript_names:
+        ufo.lib[PUBLIC_PREFIX + 'postscriptNames'] = postscript_names
+    with span('anchors', len(ufo)):
         propagate_font_anchors(ufo)
-        add_features_to_ufo(ufo, feature_prefixes, classes, features)
-        add_groups_to_ufo(ufo, kerning_groups)
+    with span('features'):
+        set_features_text(ufo, family.features_text, family.gdef_builder)
+    with span('groups', len(family.kerning_groups)):
+        add_groups_to_ufo(ufo, family.kerning_groups)
+
+    if kerning is not None:
+        with span('kerning', sum(len(pairs) for pairs in kerning.values())):
+            load_kerning(ufo, kerning, family.group_index)
+
+
+@contextlib.contextmanager
+def notifications_disabled(ufo):
+    """Disable the notifications of a defcon font, which nothing observes
+    while it is being built, then mark it as changed.
+
+    Every new glyph, contour, component, anchor and lib entry posts several
+    notifications, which are only needed by the font's own bookkeeping:
+    the dirty state, which is set again afterwards, and caches such as the
+    unicode data and glyph representations, which are built lazily, after
+    the font is built.
+    """
+
+    dispatcher = getattr(ufo, 'dispatcher', None)
+    if dispatcher is None:
+        yield
+        return
+    dispatcher.disableNotifications()
+    try:
+        yield
+    finally:
+        dispatcher.enableNotifications()
+    ufo.layers.defaultLayer.dirty = True
+
+
+class FamilyData(object):
+    """What the master UFOs of a family have in common, computed once from
+    .glyphs data for all of them.
+
+    This is the glyph order, the GlyphData info, category and sub-category
+    and production name of each glyph, the feature file without its GDEF
+    statement, which depends on the anchors of each master, and the kerning
+    groups, with a GDEFBuilder and a KerningGroupIndex. build_master gives
+    each UFO its own copies of the glyph order, production names and kerning
+    groups.
+    """
 
-    for master_id, kerning in data.pop('kerning', {}).items():
-        load_kerning(ufos[master_id], kerning)
+    def __init__(self, glyph_order, master_layers, features, kerning_groups):
+        # the glyph-level data, which is the same for all the layers of a
+        # glyph
+        glyph_data = collections.OrderedDict()
+        for layers in master_layers.values():
+            for glyph_name, _, data in layers:
+                if glyph_name not in glyph_data:
+                    glyph_data[glyph_name] = data
+
+        self.glyph_order = glyph_order
+        self.glyph_infos = glyphsLib.glyphdata.get_glyphs(glyph_data)
+        self.categories = {}
+        self.postscript_names = {}
+        for glyph_name, data in glyph_data.items():
+            glyphinfo = self.glyph_infos[glyph_name]
+            self.categories[glyph_name] = get_glyph_categories(
+                data, glyphinfo)
+            production_name = data.get('production') or \
+                glyphinfo.production_name
+            if production_name != glyph_name:
+                self.postscript_names[glyph_name] = production_name
+
+        self.features_text = build_features_text(*features)
+        self.gdef_builder = GDEFBuilder(glyph_order, self.glyph_infos)
+        # the glyph libs get the same category overrides as glyph_data
+        self.gdef_builder.categories.update(self.categories)
+        self.kerning_groups = kerning_groups
+        self.group_index = KerningGroupIndex(kerning_groups)
+
+
+def get_instance_data(data, ufo):
+    """Return the instance data of a .glyphs file, as taken by interpolate
+    and build_designspace, given the UFO of its first master.
+    """
 
-    result = [ufos[master_id] for master_id in master_id_order]
-    instances = {'defaultFamilyName': source_family_name,
-                 'data': data.pop('instances', [])}
+    instances = {'defaultFamilyName': data['familyName'],
+                 'data': data.get('instances', [])}
 
     # the 'Variation Font Origin' is a font-wide custom parameter, thus it is
     # shared by all the master ufos; here we just get it from the first one
     varfont_origin_key = "Variation Font Origin"
-    varfont_origin = first_ufo.lib.get(GLYPHS_PREFIX + varfont_origin_key)
+    varfont_origin = ufo.lib.get(GLYPHS_PREFIX + varfont_origin_key)
     if varfont_origin:
         instances[varfont_origin_key] = varfont_origin
-    if debug:
-        return clear_data(data)
-    elif include_instances:
-        return result, instances
-    return result
+    return instances
 
 
-def generate_base_fonts(data, family_name):
-    """Generate a list of UFOs with metadata loaded from .glyphs data."""
-    from defcon import Font
+def generate_base_fonts(data, family_name, font_class=None):
+    """Generate UFOs with metadata loaded from .glyphs data, one per master.
+    Each UFO is only created when the previous one has been consumed.
+    """
+    if font_class is None:
+        from defcon import Font as font_class
 
     # "date" can be missing; Glyphs.app removes it on saving if it's empty:
     # https://github.com/googlei18n/glyphsLib/issues/134
-    date_created = data.pop('date', None)
+    date_created = data.get('date')
     if date_created is not None:
         date_created = to_ufo_time(date_created)
-    units_per_em = data.pop('unitsPerEm')
-    version_major = data.pop('versionMajor')
-    version_minor = data.pop('versionMinor')
-    user_data = data.pop('userData', {})
-    copyright = data.pop('copyright', None)
-    designer = data.pop('designer', None)
-    designer_url = data.pop('designerURL', None)
-    manufacturer = data.pop('manufacturer', None)
-    manufacturer_url = data.pop('manufacturerURL', None)
+    units_per_em = data['unitsPerEm']
+    version_major = data['versionMajor']
+    version_minor = data['versionMinor']
+    user_data = data.get('userData', {})
+    copyright = data.get('copyright')
+    designer = data.get('designer')
+    designer_url = data.get('designerURL')
+    manufacturer = data.get('manufacturer')
+    manufacturer_url = data.get('manufacturerURL')
 
     misc = ['DisplayStrings', 'disablesAutomaticAlignment', 'disablesNiceNames']
     custom_params = parse_custom_params(data, misc)
 
-    ufos = {}
-    master_id_order = []
     for master in data['fontMaster']:
-        ufo = Font()
-
-        if date_created is not None:
-            ufo.info.openTypeHeadCreated = date_created
-        ufo.info.unitsPerEm = units_per_em
-        ufo.info.versionMajor = version_major
-        ufo.info.versionMinor = version_minor
-
-        if copyright:
-            ufo.info.copyright = copyright
-        if designer:
-            ufo.info.openTypeNameDesigner = designer
-        if designer_url:
-            ufo.info.openTypeNameDesignerURL = designer_url
-        if manufacturer:
-            ufo.info.openTypeNameManufacturer = manufacturer
-        if manufacturer_url:
-            ufo.info.openTypeNameManufacturerURL = manufacturer_url
-
-        ufo.info.ascender = master.pop('ascender')
-        ufo.info.capHeight = master.pop('capHeight')
-        ufo.info.descender = master.pop('descender')
-        ufo.info.xHeight = master.pop('xHeight')
-
-        horizontal_stems = master.pop('horizontalStems', None)
-        vertical_stems = master.pop('verticalStems', None)
-        italic_angle = -master.pop('italicAngle', 0)
-        if horizontal_stems:
-            ufo.info.postscriptStemSnapH = horizontal_stems
-        if vertical_stems:
-            ufo.info.postscriptStemSnapV = vertical_stems
-        if italic_angle:
-            ufo.info.italicAngle = italic_angle
-
-        ufo.info.familyName = family_name
-        ufo.info.styleName = build_style_name(
-            master, 'width', 'weight', 'custom', italic_angle != 0)
-
-        set_redundant_data(ufo)
-        set_blue_values(ufo, master.pop('alignmentZones', []))
-        set_family_user_data(ufo, user_data)
-        set_master_user_data(ufo, master.pop('userData', {}))
-        set_robofont_guidelines(ufo, master, is_global=True)
-
-        set_custom_params(ufo, parsed=custom_params)
-        # the misc attributes double as deprecated info attributes!
-        # they are Glyphs-related, not OpenType-related, and don't go in info
-        misc = ('customValue', 'weightValue', 'widthValue')
-        set_custom_params(ufo, data=master, misc_keys=misc, non_info=misc)
-
-        set_default_params(ufo)
-
-        master_id = master.pop('id')
-        ufo.lib[GLYPHS_PREFIX + 'fontMasterID'] = master_id
-        master_id_order.append(master_id)
-        ufos[master_id] = ufo
-
-    return ufos, master_id_order
+        with span('base_font'):
+            ufo = font_class()
+
+            if date_created is not None:
+                ufo.info.openTypeHeadCreated = date_created
+            ufo.info.unitsPerEm = units_per_em
+            ufo.info.versionMajor = version_major
+            ufo.info.versionMinor = version_minor
+
+            if copyright:
+                ufo.info.copyright = copyright
+            if designer:
+                ufo.info.openTypeNameDesigner = designer
+            if designer_url:
+                ufo.info.openTypeNameDesignerURL = designer_url
+            if manufacturer:
+                ufo.info.openTypeNameManufacturer = manufacturer
+            if manufacturer_url:
+                ufo.info.openTypeNameManufacturerURL = manufacturer_url
+
+            ufo.info.ascender = master['ascender']
+            ufo.info.capHeight = master['capHeight']
+            ufo.info.descender = master['descender']
+            ufo.info.xHeight = master['xHeight']
+
+            horizontal_stems = master.get('horizontalStems')
+            vertical_stems = master.get('verticalStems')
+            italic_angle = -master.get('italicAngle', 0)
+            if horizontal_stems:
+                ufo.info.postscriptStemSnapH = horizontal_stems
+            if vertical_stems:
+                ufo.info.postscriptStemSnapV = vertical_stems
+            if italic_angle:
+                ufo.info.italicAngle = italic_angle
+
+            ufo.info.familyName = family_name
+            ufo.info.styleName = build_style_name(
+                master, 'width', 'weight', 'custom', italic_angle != 0)
+
+            set_redundant_data(ufo)
+            set_blue_values(ufo, master.get('alignmentZones', []))
+            set_family_user_data(ufo, user_data)
+            set_master_user_data(ufo, master.get('userData', {}))
+            set_robofont_guidelines(ufo, master, is_global=True)
+
+            set_custom_params(ufo, parsed=custom_params)
+            # the misc attributes double as deprecated info attributes!
+            # they are Glyphs-related, not OpenType-related, and don't go in
+            # info
+            misc = ('customValue', 'weightValue', 'widthValue')
+            set_custom_params(ufo, data=master, misc_keys=misc, non_info=misc)
+
+            set_default_params(ufo)
+
+            ufo.lib[GLYPHS_PREFIX + 'fontMasterID'] = master['id']
+        yield ufo
 
 
 def set_redundant_data(ufo):
@@ -348,9 +525,8 @@ def set_custom_params(ufo, parsed=None, data=None, misc_keys=(), non_info=()):
 
     Custom parameter data can be pre-parsed out of Glyphs data and provided via
     the `parsed` argument, otherwise `data` should be provided and will be
-    parsed. The `parsed` option is provided so that custom params can be popped
-    from Glyphs data once and used several times; in general this is used for
-    debugging purposes (to detect unused Glyphs data).
+    parsed. The `parsed` option is provided so that custom params can be read
+    from Glyphs data once and used several times.
 
     The `non_info` argument can be used to specify potential UFO info attributes
     which should not be put in UFO info.
@@ -539,11 +715,11 @@ def set_robofont_guidelines(ufo_obj, glyphs_data, is_global=False):
 
     new_guidelines = []
     for guideline in guidelines:
-        x, y = guideline.pop('position')
-        angle = guideline.pop('angle', 0)
+        x, y = guideline['position']
+        angle = guideline.get('angle', 0)
         new_guideline = {'x': x, 'y': y, 'angle': angle, 'isGlobal': is_global}
 
-        locked = guideline.pop('locked', False)
+        locked = guideline.get('locked', False)
         if locked:
             new_guideline['locked'] = True
 
@@ -558,22 +734,22 @@ def set_robofont_glyph_background(glyph, key, background):
         return
 
     new_background = {}
-    new_background['lib'] = background.pop('lib', {})
+    new_background['lib'] = background.get('lib', {})
 
     anchors = []
     for anchor in background.get('anchors', []):
-        x, y = anchor.pop('position')
-        anchors.append({'x': x, 'y': y, 'name': anchor.pop('name')})
+        x, y = anchor['position']
+        anchors.append({'x': x, 'y': y, 'name': anchor['name']})
     new_background['anchors'] = anchors
 
     components = []
     for component in background.get('components', []):
         new_component = {
-            'baseGlyph': component.pop('name'),
-            'transformation': component.pop('transform', (1, 0, 0, 1, 0, 0))}
+            'baseGlyph': component['name'],
+            'transformation': component.get('transform', (1, 0, 0, 1, 0, 0))}
 
         for meta_attr in ['disableAlignment', 'locked']:
-            value = component.pop(meta_attr, False)
+            value = component.get(meta_attr, False)
             if value:
                 new_component[meta_attr] = True
 
@@ -583,16 +759,16 @@ def set_robofont_glyph_background(glyph, key, background):
     contours = []
     for path in background.get('paths', []):
         points = []
-        for x, y, node_type, smooth in path.pop('nodes', []):
+        for x, y, node_type, smooth in path.get('nodes', []):
             point = {'x': x, 'y': y, 'smooth': smooth}
             if node_type in ['line', 'curve', 'qcurve']:
                 point['segmentType'] = node_type
             points.append(point)
         contours.append({'points': points})
-        path.pop('closed', None)  # not used, but remove for debug purposes
+        path.get('closed')  # not used, but read for debug purposes
     new_background['contours'] = contours
 
-    new_background['width'] = background.pop('width', glyph.width)
+    new_background['width'] = background.get('width', glyph.width)
     new_background['name'] = glyph.name
     new_background['unicodes'] = []
 
@@ -623,9 +799,9 @@ def build_style_name(data, width_key, weight_key, custom_key, italic):
     """
 
     italic = 'Italic' if italic else ''
-    width = data.pop(width_key, '')
-    weight = data.pop(weight_key, 'Regular')
-    custom = data.pop(custom_key, '')
+    width = data.get(width_key, '')
+    weight = data.get(weight_key, 'Regular')
+    custom = data.get(custom_key, '')
     if (italic or width or custom) and weight == 'Regular':
         weight = ''
     return ' '.join(s for s in (width, weight, custom, italic) if s)
@@ -651,36 +827,39 @@ def parse_custom_params(data, misc_keys):
 
     params = []
     for p in data.get('customParameters', []):
-        params.append((p.pop('name'), p.pop('value')))
+        params.append((p['name'], p['value']))
     for key in misc_keys:
-        try:
-            val = data.pop(key)
-        except KeyError:
-            continue
-        params.append((key, val))
+        if key in data:
+            params.append((key, data[key]))
     return params
 
 
-def load_kerning(ufo, kerning_data):
-    """Add .glyphs kerning to an UFO."""
+def load_kerning(ufo, kerning_data, group_index=None):
+    """Add .glyphs kerning to an UFO.
+
+    The pairs are collected and their conflicts resolved in a dictionary,
+    which is then added to the UFO's kerning at once. group_index may be the
+    KerningGroupIndex of the UFO's groups, which is built otherwise.
+    """
 
+    if group_index is None:
+        group_index = KerningGroupIndex(ufo.groups)
     warning_msg = 'Non-existent glyph class %s found in kerning rules.'
+    kerning = dict(ufo.kerning)
     class_glyph_pairs = []
 
     for left, pairs in kerning_data.items():
-        match = re.match(r'@MMK_L_(.+)', left)
-        left_is_class = bool(match)
+        left_is_class = left.startswith('@MMK_L_') and len(left) > 7
         if left_is_class:
-            left = 'public.kern1.%s' % match.group(1)
-            if left not in ufo.groups:
+            left = 'public.kern1.' + left[7:]
+            if left not in group_index.members:
                 logger.warn(warning_msg % left)
                 continue
         for right, kerning_val in pairs.items():
-            match = re.match(r'@MMK_R_(.+)', right)
-            right_is_class = bool(match)
+            right_is_class = right.startswith('@MMK_R_') and len(right) > 7
             if right_is_class:
-                right = 'public.kern2.%s' % match.group(1)
-                if right not in ufo.groups:
+                right = 'public.kern2.' + right[7:]
+                if right not in group_index.members:
                     logger.warn(warning_msg % right)
                     continue
             if left_is_class != right_is_class:
@@ -689,43 +868,134 @@ def load_kerning(ufo, kerning_data):
                 else:
                     pair = (right, left, False)
                 class_glyph_pairs.append(pair)
-            ufo.kerning[left, right] = kerning_val
+            kerning[left, right] = kerning_val
 
-    seen = {}
-    for classname, glyph, is_left_class in reversed(class_glyph_pairs):
-        remove_rule_if_conflict(ufo, seen, classname, glyph, is_left_class)
+    seen = ({}, {})
+    for i, (classname, glyph, is_left_class) in enumerate(
+            reversed(class_glyph_pairs)):
+        remove_rule_if_conflict(ufo, kerning, group_index, seen, i,
+                                classname, glyph, is_left_class)
 
+    if len(ufo.kerning):
+        ufo.kerning.clear()
+    ufo.kerning.update(kerning)
 
-def remove_rule_if_conflict(ufo, seen, classname, glyph, is_left_class):
-    """Check if a class-to-glyph kerning rule has a conflict with any existing
-    rule in `seen`, and remove any conflicts if they exist.
+
+def remove_rule_if_conflict(ufo, kerning, group_index, seen, index,
+                            classname, glyph, is_left_class):
+    """Check if a class-to-glyph kerning rule has a conflict with any rule
+    seen before, and remove any conflicts from the `kerning` dictionary.
+
+    A glyph pair conflicts if the last rule seen which covers it has another
+    value, and the pair has no kerning of its own. The rules seen are kept in
+    `seen`, by side (0 for class-to-glyph, 1 for glyph-to-class rules), class
+    and glyph, with their index, so that only the rules which can cover the
+    pairs of this rule are looked up, through `group_index`.
     """
 
     original_pair = (classname, glyph) if is_left_class else (glyph, classname)
-    val = ufo.kerning[original_pair]
+    val = kerning[original_pair]
     rule = original_pair + (val,)
+    side = 0 if is_left_class else 1
+    members = group_index.members[classname]
+
+    # the last rule seen which covers the pair of each member, if any
+    last_rules = {}
+
+    def cover(member, entry):
+        if member not in last_rules or last_rules[member][0] < entry[0]:
+            last_rules[member] = entry[:2]
+
+    # rules of the other side, from a member to a class with this glyph
+    for other in group_index.groups_of[1 - side].get(glyph, ()):
+        entries = seen[1 - side].get(other)
+        if not entries:
+            continue
+        if len(entries) < len(members):
+            for member, entry in entries.items():
+                if member in members and glyph not in entry[2]:
+                    cover(member, entry)
+        else:
+            for member in members:
+                entry = entries.get(member)
+                if entry is not None and glyph not in entry[2]:
+                    cover(member, entry)
+    # rules of the same side, from another class with some of the members
+    # to this glyph
+    for other in group_index.overlaps.get(classname, ()):
+        entry = seen[side].get(other, {}).get(glyph)
+        if entry is not None:
+            for member in members & group_index.members[other]:
+                if member not in entry[2]:
+                    cover(member, entry)
+
+    conflicts = set()
+    for member, (_, existing_rule) in last_rules.items():
+        pair = (member, glyph) if is_left_class else (glyph, member)
+        if existing_rule[-1] != val and pair not in kerning:
+            conflicts.add(member)
+    seen[side].setdefault(classname, {})[glyph] = (index, rule, conflicts)
+    if not conflicts:
+        return
 
-    old_glyphs = ufo.groups[classname]
     new_glyphs = []
-    for member in old_glyphs:
+    for member in group_index.groups[classname]:
         pair = (member, glyph) if is_left_class else (glyph, member)
-        existing_rule = seen.get(pair)
-        if (existing_rule is not None and
-            existing_rule[-1] != val and
-            pair not in ufo.kerning):
+        if member in conflicts:
             logger.warn(
                 'Conflicting kerning rules found in %s master for glyph pair '
                 '"%s, %s" (%s and %s), removing pair from latter rule' %
-                ((ufo.info.styleName,) + pair + (existing_rule, rule)))
+                ((ufo.info.styleName,) + pair + (last_rules[member][1], rule)))
         else:
-            new_glyphs.append(member)
-            seen[pair] = rule
+            new_glyphs.append(pair)
+    del kerning[original_pair]
+    for pair in new_glyphs:
+        kerning[pair] = val
 
-    if new_glyphs != old_glyphs:
-        del ufo.kerning[original_pair]
-        for member in new_glyphs:
-            pair = (member, glyph) if is_left_class else (glyph, member)
-            ufo.kerning[pair] = val
+
+class KerningGroupIndex(object):
+    """The members of kerning groups, and the groups of each glyph on each
+    side (0 for public.kern1, 1 for public.kern2 groups), which are the same
+    for all the masters of a family.
+    """
+
+    def __init__(self, groups):
+        self.groups = dict(groups)
+        self.members = {}
+        self.groups_of = ({}, {})
+        for name, glyphs in self.groups.items():
+            self.members[name] = set(glyphs)
+            if name.startswith('public.kern1.'):
+                groups_of = self.groups_of[0]
+            elif name.startswith('public.kern2.'):
+                groups_of = self.groups_of[1]
+            else:
+                continue
+            for glyph in self.members[name]:
+                groups_of.setdefault(glyph, []).append(name)
+        # groups of the same side which share members; normally none, since
+        # a glyph only has one kerning group per side
+        self.overlaps = {}
+        for groups_of in self.groups_of:
+            for names in groups_of.values():
+                if len(names) > 1:
+                    for name in names:
+                        self.overlaps.setdefault(name, set()).update(
+                            n for n in names if n != name)
+
+
+def get_glyph_categories(glyph_data, glyphinfo):
+    """Return the category and sub-category of a glyph: its overrides in
+    .glyphs metadata, else the global values from its GlyphData info.
+    """
+
+    category = glyph_data.get('category')
+    if category is None:
+        category = glyphinfo.category
+    subCategory = glyph_data.get('subCategory')
+    if subCategory is None:
+        subCategory = glyphinfo.subCategory
+    return category, subCategory
 
 
 def load_glyph_libdata(glyph, layer):
@@ -734,23 +1004,27 @@ def load_glyph_libdata(glyph, layer):
     set_robofont_guidelines(glyph, layer)
     set_robofont_glyph_background(glyph, 'background', layer.get('background'))
     for key in ['annotations', 'hints']:
-        try:
-            value = layer.pop(key)
-        except KeyError:
-            continue
-        glyph.lib[GLYPHS_PREFIX + key] = value
+        if key in layer:
+            glyph.lib[GLYPHS_PREFIX + key] = layer[key]
 
     # data related to components stored in lists of booleans
     # each list's elements correspond to the components in order
     for key in ['disableAlignment', 'locked']:
-        values = [c.pop(key, False) for c in layer.get('components', [])]
+        values = [c.get(key, False) for c in layer.get('components', [])]
         if any(values):
             key = key[0].upper() + key[1:]
             glyph.lib['%scomponents%s' % (GLYPHS_PREFIX, key)] = values
 
 
-def load_glyph(glyph, layer, glyph_data):
-    """Add .glyphs metadata, paths, components, and anchors to a glyph."""
+def load_glyph(glyph, layer, glyph_data, categories=None,
+               production_names=True):
+    """Add .glyphs metadata, paths, components, and anchors to a glyph.
+    categories is the glyph's category and sub-category, as returned by
+    get_glyph_categories, which is called if not given. If production_names
+    is true, the glyph's production name is added to the font's
+    public.postscriptNames if it differs from its name; build_master adds
+    those of all the glyphs at once instead.
+    """
 
     uval = glyph_data.get('unicode')
     if uval is not None:
@@ -768,38 +1042,39 @@ def load_glyph(glyph, layer, glyph_data):
     export = glyph_data.get('export')
     if export is not None:
         glyph.lib[GLYPHLIB_PREFIX + 'Export'] = export
-    glyphinfo = glyphsLib.glyphdata.get_glyph(glyph.name)
-    production_name = glyph_data.get('production') or glyphinfo.production_name
-    if production_name != glyph.name:
-        postscriptNamesKey = PUBLIC_PREFIX + 'postscriptNames'
-        if postscriptNamesKey not in glyph.font.lib:
-            glyph.font.lib[postscriptNamesKey] = dict()
-        glyph.font.lib[postscriptNamesKey][glyph.name] = production_name
 
     for key in ['leftMetricsKey', 'rightMetricsKey', 'widthMetricsKey']:
-        glyph_metrics_key = None
-        try:
-            glyph_metrics_key = layer.pop(key)
-        except KeyError:
+        if key in layer:
+            glyph_metrics_key = layer[key]
+        else:
             glyph_metrics_key = glyph_data.get(key)
         if glyph_metrics_key:
             glyph.lib[GLYPHLIB_PREFIX + key] = glyph_metrics_key
 
     # if glyph contains custom 'category' and 'subCategory' overrides, store
     # them in the UFO glyph's lib
-    category = glyph_data.get('category')
-    if category is None:
-        category = glyphinfo.category
-    else:
-        glyph.lib[GLYPHLIB_PREFIX + 'category'] = category
-    subCategory = glyph_data.get('subCategory')
-    if subCategory is None:
-        subCategory = glyphinfo.subCategory
-    else:
-        glyph.lib[GLYPHLIB_PREFIX + 'subCategory'] = subCategory
+    for key in ['category', 'subCategory']:
+        value = glyph_data.get(key)
+        if value is not None:
+            glyph.lib[GLYPHLIB_PREFIX + key] = value
+    glyphinfo = None
+    if categories is None or production_names:
+        glyphinfo = glyphsLib.glyphdata.get_glyph(glyph.name)
+    if categories is None:
+        categories = get_glyph_categories(glyph_data, glyphinfo)
+    category, subCategory = categories
+
+    if production_names:
+        production_name = glyph_data.get('production') or \
+            glyphinfo.production_name
+        if production_name != glyph.name:
+            postscriptNamesKey = PUBLIC_PREFIX + 'postscriptNames'
+            if postscriptNamesKey not in glyph.font.lib:
+                glyph.font.lib[postscriptNamesKey] = dict()
+            glyph.font.lib[postscriptNamesKey][glyph.name] = production_name
 
     # load width before background, which is loaded with lib data
-    width = layer.pop('width')
+    width = layer['width']
     if category == 'Mark' and subCategory == 'Nonspacing' and width > 0:
         # zero the width of Nonspacing Marks like Glyphs.app does on export
         # TODO: check for customParameter DisableAllAutomaticBehaviour
@@ -816,7 +1091,9 @@ def load_glyph(glyph, layer, glyph_data):
 
 
 def draw_paths(pen, paths):
-    """Draw .glyphs paths onto a pen."""
+    """Draw .glyphs paths onto a pen. The nodes of a path may be a list of
+    [x, y, type, smooth] lists or a NodeArray.
+    """
 
     for path in paths:
         pen.beginPath()
@@ -824,14 +1101,16 @@ def draw_paths(pen, paths):
         if not nodes:
             pen.endPath()
             continue
-        if not path.pop('closed', False):
-            x, y, node_type, smooth = nodes.pop(0)
+        if not path.get('closed', False):
+            x, y, node_type, smooth = nodes[0]
             assert node_type == 'line', 'Open path starts with off-curve points'
             pen.addPoint((x, y), segmentType='move')
+            nodes = itertools.islice(nodes, 1, None)
         else:
             # In Glyphs.app, the starting node of a closed contour is always
             # stored at the end of the nodes list.
-            nodes.insert(0, nodes.pop())
+            nodes = itertools.chain(
+                (nodes[-1],), itertools.islice(nodes, len(nodes) - 1))
         for x, y, node_type, smooth in nodes:
             if node_type not in ['line', 'curve', 'qcurve']:
                 node_type = None
@@ -843,16 +1122,16 @@ def draw_components(pen, components):
     """Draw .glyphs components onto a pen, adding them to the parent glyph."""
 
     for component in components:
-        pen.addComponent(component.pop('name'),
-                         component.pop('transform', (1, 0, 0, 1, 0, 0)))
+        pen.addComponent(component['name'],
+                         component.get('transform', (1, 0, 0, 1, 0, 0)))
 
 
 def add_anchors_to_glyph(glyph, anchors):
     """Add .glyphs anchors to a glyph."""
 
     for anchor in anchors:
-        x, y = anchor.pop('position')
-        anchor_dict = {'name': anchor.pop('name'), 'x': x, 'y': y}
+        x, y = anchor['position']
+        anchor_dict = {'name': anchor['name'], 'x': x, 'y': y}
         glyph.appendAnchor(glyph.anchorClass(anchorDict=anchor_dict))
 
 
@@ -866,85 +1145,148 @@ def add_glyph_to_groups(kerning_groups, glyph_data):
     for side, group_key in group_keys.items():
         if group_key not in glyph_data:
             continue
-        group = 'public.kern%s.%s' % (side, glyph_data.pop(group_key))
-        kerning_groups[group] = kerning_groups.get(group, []) + [glyph_name]
+        group = 'public.kern%s.%s' % (side, glyph_data[group_key])
+        kerning_groups.setdefault(group, []).append(glyph_name)
 
 
 def add_groups_to_ufo(ufo, kerning_groups):
     """Add kerning groups to an UFO."""
 
-    for name, glyphs in kerning_groups.items():
-        ufo.groups[name] = glyphs
-
-
-def build_gdef(ufo):
-    """Build a table GDEF statement for ligature carets."""
-    bases, ligatures, marks, carets = set(), set(), set(), {}
-    category_key = GLYPHLIB_PREFIX + 'category'
-    subCategory_key = GLYPHLIB_PREFIX + 'subCategory'
-    for glyph in ufo:
-        has_attaching_anchor = False
-        for anchor in glyph.anchors:
-            name = anchor.get('name')
-            if name and not name.startswith('_'):
-                has_attaching_anchor = True
-            if name and name.startswith('caret_') and 'x' in anchor:
-                carets.setdefault(glyph.name, []).append(round(anchor['x']))
-        lib = glyph.lib
-        glyphinfo = glyphsLib.glyphdata.get_glyph(glyph.name)
-        # first check glyph.lib for category/subCategory overrides; else use
-        # global values from GlyphData
-        category = lib.get(category_key)
+    ufo.groups.update((name, list(glyph_names))
+                      for name, glyph_names in kerning_groups.items())
+
+
+def build_gdef(ufo, glyph_infos=None):
+    """Build a table GDEF statement for ligature carets. glyph_infos may map
+    glyph names to their GlyphData info, which is looked up otherwise.
+    """
+    return GDEFBuilder(
+        ufo.lib[PUBLIC_PREFIX + 'glyphOrder'], glyph_infos).build(ufo)
+
+
+class GDEFBuilder(object):
+    """Build the table GDEF statements of the masters of a family.
+
+    The position of each glyph in the glyph order and the category of each
+    glyph, which comes from the glyph-level data, are only computed once for
+    all masters, and the GlyphClassDef statement of a master is reused by
+    the next one if their glyph classes are the same. Only the attaching
+    anchors and the caret positions are read from each master.
+    """
+
+    def __init__(self, glyph_order, glyph_infos=None):
+        self.glyph_index = {name: i for i, name in enumerate(glyph_order)}
+        self.glyph_infos = glyph_infos if glyph_infos is not None else {}
+        self.categories = {}
+        self._class_def = None
+
+    def category(self, glyph):
+        """Return the category and sub-category of a glyph: the overrides in
+        its lib, else the global values from GlyphData.
+        """
+        try:
+            return self.categories[glyph.name]
+        except KeyError:
+            pass
+        glyphinfo = self.glyph_infos.get(glyph.name)
+        if glyphinfo is None:
+            glyphinfo = glyphsLib.glyphdata.get_glyph(glyph.name)
+        category = glyph.lib.get(GLYPHLIB_PREFIX + 'category')
         if category is None:
             category = glyphinfo.category
-        subCategory = lib.get(subCategory_key)
+        subCategory = glyph.lib.get(GLYPHLIB_PREFIX + 'subCategory')
         if subCategory is None:
             subCategory = glyphinfo.subCategory
+        self.categories[glyph.name] = category, subCategory
+        return category, subCategory
+
+    def build(self, ufo):
+        """Return the table GDEF statement of a master UFO, or None."""
+
+        bases, ligatures, marks, carets = set(), set(), set(), {}
+        for glyph in ufo:
+            has_attaching_anchor = False
+            for anchor in glyph.anchors:
+                name = anchor.get('name')
+                if name and not name.startswith('_'):
+                    has_attaching_anchor = True
+                if name and name.startswith('caret_') and 'x' in anchor:
+                    carets.setdefault(glyph.name, []).append(
+                        round(anchor['x']))
+            category, subCategory = self.category(glyph)
+
+            # Glyphs.app assigns glyph classes like this:
+            #
+            # * Base: any glyph that has an attaching anchor
+            #   (such as "top"; "_top" does not count) and is neither
+            #   classified as Ligature nor Mark using the definitions below;
+            #
+            # * Ligature: if subCategory is "Ligature" and the glyph has
+            #   at least one attaching anchor;
+            #
+            # * Mark: if category is "Mark" and subCategory is either
+            #   "Nonspacing" or "Spacing Combining";
+            #
+            # * Compound: never assigned by Glyphs.app.
+            #
+            # https://github.com/googlei18n/glyphsLib/issues/85
+            # https://github.com/googlei18n/glyphsLib/pull/100#issuecomment-275430289
+            if subCategory == 'Ligature' and has_attaching_anchor:
+                ligatures.add(glyph.name)
+            elif category == 'Mark' and (subCategory == 'Nonspacing' or
+                                         subCategory == 'Spacing Combining'):
+                marks.add(glyph.name)
+            elif has_attaching_anchor:
+                bases.add(glyph.name)
+        if not any((bases, ligatures, marks, carets)):
+            return None
+        lines = ['table GDEF {', '  # automatic']
+        lines.extend(self.class_def(bases, ligatures, marks))
+        for glyph, caretPos in sorted(carets.items()):
+            lines.append('  LigatureCaretByPos %s %s;' %
+                         (glyph, ' '.join(unicode(p) for p in sorted(caretPos))))
+        lines.append('} GDEF;')
+        return '\n'.join(lines)
+
+    def class_def(self, bases, ligatures, marks):
+        """Return the lines of a GlyphClassDef statement."""
+
+        classes = bases, ligatures, marks
+        if self._class_def is not None and self._class_def[0] == classes:
+            return self._class_def[1]
+        glyph_index = self.glyph_index
+        fmt = lambda g: ('[%s]' % ' '.join(
+            sorted(g, key=glyph_index.__getitem__))) if g else ''
+        lines = [
+            '  GlyphClassDef',
+            '    %s, # Base' % fmt(bases),
+            '    %s, # Liga' % fmt(ligatures),
+            '    %s, # Mark' % fmt(marks),
+            '    ;']
+        self._class_def = classes, lines
+        return lines
+
+
+def add_features_to_ufo(ufo, feature_prefixes, classes, features,
+                        glyph_infos=None, gdef_builder=None):
+    """Write an UFO's OpenType feature file. Its GDEF statement is built by
+    gdef_builder, a GDEFBuilder of the UFO's family, or else by build_gdef
+    with glyph_infos.
+    """
 
-        # Glyphs.app assigns glyph classes like this:
-        #
-        # * Base: any glyph that has an attaching anchor
-        #   (such as "top"; "_top" does not count) and is neither
-        #   classified as Ligature nor Mark using the definitions below;
-        #
-        # * Ligature: if subCategory is "Ligature" and the glyph has
-        #   at least one attaching anchor;
-        #
-        # * Mark: if category is "Mark" and subCategory is either
-        #   "Nonspacing" or "Spacing Combining";
-        #
-        # * Compound: never assigned by Glyphs.app.
-        #
-        # https://github.com/googlei18n/glyphsLib/issues/85
-        # https://github.com/googlei18n/glyphsLib/pull/100#issuecomment-275430289
-        if subCategory == 'Ligature' and has_attaching_anchor:
-            ligatures.add(glyph.name)
-        elif category == 'Mark' and (subCategory == 'Nonspacing' or
-                                     subCategory == 'Spacing Combining'):
-            marks.add(glyph.name)
-        elif has_attaching_anchor:
-            bases.add(glyph.name)
-    if not any((bases, ligatures, marks, carets)):
-        return None
-    lines = ['table GDEF {', '  # automatic']
-    glyphOrder = ufo.lib[PUBLIC_PREFIX + 'glyphOrder']
-    glyphIndex = lambda glyph: glyphOrder.index(glyph)
-    fmt = lambda g: ('[%s]' % ' '.join(sorted(g, key=glyphIndex))) if g else ''
-    lines.extend([
-        '  GlyphClassDef',
-        '    %s, # Base' % fmt(bases),
-        '    %s, # Liga' % fmt(ligatures),
-        '    %s, # Mark' % fmt(marks),
-        '    ;'])
-    for glyph, caretPos in sorted(carets.items()):
-        lines.append('  LigatureCaretByPos %s %s;' %
-                     (glyph, ' '.join(unicode(p) for p in sorted(caretPos))))
-    lines.append('} GDEF;')
-    return '\n'.join(lines)
-
-
-def add_features_to_ufo(ufo, feature_prefixes, classes, features):
-    """Write an UFO's OpenType feature file."""
+    if gdef_builder is None:
+        gdef_builder = GDEFBuilder(
+            ufo.lib[PUBLIC_PREFIX + 'glyphOrder'], glyph_infos)
+    set_features_text(
+        ufo, build_features_text(feature_prefixes, classes, features),
+        gdef_builder)
+
+
+def build_features_text(feature_prefixes, classes, features):
+    """Return the OpenType feature file of .glyphs feature prefixes, classes
+    and features, without a GDEF statement, which is the same for all the
+    masters of a family.
+    """
 
     autostr = lambda automatic: '# automatic\n' if automatic else ''
 
@@ -976,9 +1318,16 @@ def add_features_to_ufo(ufo, feature_prefixes, classes, features):
         lines.append('} %s;' % name)
         feature_defs.append('\n'.join(lines))
     fea_str = '\n\n'.join(feature_defs)
-    gdef_str = build_gdef(ufo)
 
+    return '\n\n'.join(filter(None, [prefix_str, class_str, fea_str]))
+
+
+def set_features_text(ufo, text, gdef_builder):
+    """Write an UFO's OpenType feature file from the text returned by
+    build_features_text, and the GDEF statement built by gdef_builder.
+    """
+
+    gdef_str = gdef_builder.build(ufo)
     # make sure feature text is a unicode string, for defcon
-    full_text = '\n\n'.join(
-        filter(None, [prefix_str, class_str, fea_str, gdef_str])) + '\n'
+    full_text = '\n\n'.join(filter(None, [text, gdef_str])) + '\n'
     ufo.features.text = full_text if full_text.strip() else ''
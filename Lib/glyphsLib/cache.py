@@ -0,0 +1,154 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+
+import errno
+import gc
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import glyphsLib
+
+__all__ = [
+    'ParseCache',
+]
+
+logger = logging.getLogger(__name__)
+
+# default maximum total size of the files in a cache directory, in bytes
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+_SUFFIX = '.pickle'
+
+
+class ParseCache(object):
+    """A directory of parsed and cast .glyphs data.
+
+    Entries are keyed by a hash of the source bytes, the glyphsLib and
+    Python versions and the loading options, and are stored as pickles.
+    Once the files in the directory take more than max_size bytes, the
+    least recently used ones are removed.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, source, compact_nodes=False):
+        """Return the key for the .glyphs source 'source' (bytes)."""
+
+        sha = hashlib.sha256()
+        sha.update(('glyphsLib %s, python %d.%d, pickle %d, compact %d\n' % (
+            glyphsLib.__version__, sys.version_info[0], sys.version_info[1],
+            pickle.HIGHEST_PROTOCOL, bool(compact_nodes))).encode('ascii'))
+        sha.update(source)
+        return sha.hexdigest()
+
+    def get(self, key):
+        """Return the data stored for 'key', or None."""
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fp:
+                pickled = fp.read()
+        except (IOError, OSError):
+            return None
+        # the unpickled data is made of many small containers, which would
+        # make the garbage collector run over and over
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            data = pickle.loads(pickled)
+        except Exception as e:
+            logger.warning('Removing unreadable cache entry %s: %s', path, e)
+            self._remove(path)
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        logger.info('Loaded .glyphs data from cache entry %s', path)
+        return data
+
+    def put(self, key, data):
+        """Store 'data' for 'key', then evict entries as needed."""
+
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+            # atomic, so that concurrent builds never read partial entries
+            if hasattr(os, 'replace'):
+                os.replace(temp_path, self._path(key))
+            else:  # python 2
+                os.rename(temp_path, self._path(key))
+        except Exception:
+            self._remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the total size of
+        the cache is at most max_size.
+        """
+
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            logger.info('Evicting cache entry %s', path)
+            self._remove(path)
+            total_size -= size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
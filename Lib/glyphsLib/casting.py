@@ -16,13 +16,17 @@
 from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
 from fontTools.misc.py23 import basestring
+from array import array
 import datetime
+import itertools
 import logging
 import re
 
 __all__ = [
     'cast_data',
-    'uncast_data'
+    'uncast_data',
+    'cast_glyph_data',
+    'NodeArray',
 ]
 
 logger = logging.getLogger(__name__)
@@ -92,9 +96,17 @@ class RWGlyphs(object):
 
 class RWBackground(RWGlyphs):
     """Use background type structure to cast a single dictionary."""
-    def convert(self, data, to_typed):
-        _convert_data(data, to_typed, _BACKGROUND_TYPE_STRUCTURE)
-        return data
+
+    def __init__(self, compact_nodes=False):
+        self.compact_nodes = compact_nodes
+
+    def read(self, src):
+        if self.compact_nodes:
+            return _cast_compact_background(src)
+        return _cast_background(src)
+
+    def write(self, val):
+        return _uncast_background(val)
 
 
 class RWDefault(RWGlyphs):
@@ -183,6 +195,12 @@ class RWVector(RWGlyphs):
 
     def read(self, src):
         """Parse a vector from a string with format {X, Y, Z, ...}."""
+        if src[:1] == '{' and src[-1:] == '}':
+            values = src[1:-1].split(', ')
+            if len(values) == self.dimension:
+                values = _read_numbers(values)
+                if values is not None:
+                    return values
         return [num.read(i) for i in self.regex.match(src).groups()]
 
     def write(self, val):
@@ -211,6 +229,9 @@ class RWNode(RWGlyphs):
 
     def read(self, src):
         """Cast a node from a string with format X Y TYPE [SMOOTH]."""
+        nodes = _read_nodes([src])
+        if nodes is not None:
+            return nodes[0]
         x, y, node_type, smooth = self._regex.match(src).groups()
         return [num.read(x), num.read(y), node_type.lower(), bool(smooth)]
 
@@ -223,6 +244,83 @@ class RWNode(RWGlyphs):
         return '%s %s %s%s' % (x, y, node_type, ' SMOOTH' if smooth else '')
 
 
+# Strings of numbers read by _read_numbers, with their values. Coordinates
+# repeat a lot, so most of them are looked up instead of converted.
+_number_cache = {}
+_NUMBER_CACHE_SIZE = 65536
+# the characters matched by [-.e\d] in the RWNode and RWVector regexes
+_number_chars = frozenset('-.e0123456789')
+
+# node type tokens, with " SMOOTH" joined to the type by _split_nodes
+_NODE_TYPES = {}
+for _token, _node_type in (('LINE', 'line'), ('CURVE', 'curve'),
+                           ('QCURVE', 'qcurve'), ('OFFCURVE', 'offcurve'),
+                           ('n/a', 'n/a')):
+    _NODE_TYPES[_token] = (_node_type, False)
+    _NODE_TYPES[_token + '_SMOOTH'] = (_node_type, True)
+del _token, _node_type
+
+
+def _read_numbers(src):
+    """Read a list of number strings like RWNum does. Return None if one of
+    them has characters which the regexes of RWNode and RWVector don't
+    match, so that the caller can fall back to them.
+    """
+
+    cache = _number_cache
+    values = list(map(cache.get, src))
+    if None in values:
+        for i, value in enumerate(values):
+            if value is not None:
+                continue
+            string = src[i]
+            if not _number_chars.issuperset(string):
+                return None
+            value = num.read(string)
+            if len(cache) < _NUMBER_CACHE_SIZE:
+                cache[string] = value
+            values[i] = value
+    return values
+
+
+def _split_nodes(src):
+    """Split a list of node strings into their coordinates (x and y
+    interleaved) and type tokens, in bulk. Return None unless every string
+    is made of exactly "X Y TYPE" or "X Y TYPE SMOOTH" with a known type.
+    """
+
+    count = len(src)
+    # each node gives three tokens, followed by a separator token
+    tokens = ' \n '.join(src).replace(' SMOOTH', '_SMOOTH').split(' ')
+    if (len(tokens) != 4 * count - 1 or
+            tokens[3::4].count('\n') != count - 1):
+        return None
+    types = tokens[2::4]
+    if not all(map(_NODE_TYPES.__contains__, types)):
+        return None
+    del tokens[2::4]  # x, y, separator, x, y, separator, ...
+    del tokens[2::3]
+    return tokens, types
+
+
+def _read_nodes(src):
+    """Read a list of node strings like RWNode does, or return None if they
+    can't be read in bulk.
+    """
+
+    split = _split_nodes(src)
+    if split is None:
+        return None
+    coordinates, types = split
+    coordinates = _read_numbers(coordinates)
+    if coordinates is None:
+        return None
+    node_types = _NODE_TYPES
+    return [[x, y, node_types[node_type][0], node_types[node_type][1]]
+            for x, y, node_type in zip(
+                coordinates[0::2], coordinates[1::2], types)]
+
+
 class RWIntList(RWGlyphs):
     """Read/write a list of ints."""
 
@@ -247,12 +345,114 @@ class RWNodeList(RWGlyphs):
     """Read/write a list of nodes."""
 
     def read(self, src):
+        nodes = _read_nodes(src)
+        if nodes is not None:
+            src[:] = nodes
+            return src
         return _mutate_list(node.read, src)
 
     def write(self, val):
+        if isinstance(val, NodeArray):
+            return [node.write(list(n)) for n in val]
         return _mutate_list(node.write, val)
 
 
+class NodeArray(object):
+    """Compact storage for the nodes of a path.
+
+    Coordinates are kept in an array of doubles, node types and smooth flags
+    in arrays of bytes, instead of one [x, y, type, smooth] list per node.
+    Indexing and iterating yield (x, y, type, smooth) tuples, with the same
+    values RWNode reads.
+    """
+
+    __slots__ = ('coordinates', 'types', 'smooth')
+
+    TYPES = ('line', 'curve', 'qcurve', 'offcurve', 'n/a')
+
+    def __init__(self, coordinates=None, types=None, smooth=None):
+        self.coordinates = array('d', coordinates or ())
+        self.types = array('B', types or ())
+        self.smooth = array('B', smooth or ())
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        node_types = NodeArray.TYPES
+        coordinates = self.coordinates
+        for x, y, node_type, smooth in zip(
+                itertools.islice(coordinates, 0, None, 2),
+                itertools.islice(coordinates, 1, None, 2),
+                self.types, self.smooth):
+            yield (int(x) if x.is_integer() else x,
+                   int(y) if y.is_integer() else y,
+                   node_types[node_type], bool(smooth))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self)))
+            return NodeArray(
+                [c for i in indices for c in self.coordinates[2 * i:2 * i + 2]],
+                [self.types[i] for i in indices],
+                [self.smooth[i] for i in indices])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('NodeArray index out of range')
+        x, y = self.coordinates[2 * index], self.coordinates[2 * index + 1]
+        return (int(x) if x.is_integer() else x,
+                int(y) if y.is_integer() else y,
+                NodeArray.TYPES[self.types[index]], bool(self.smooth[index]))
+
+    def __eq__(self, other):
+        if isinstance(other, NodeArray):
+            return (self.coordinates == other.coordinates and
+                    self.types == other.types and self.smooth == other.smooth)
+        return [list(n) for n in self] == [list(n) for n in other]
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'NodeArray(%r)' % [list(n) for n in self]
+
+
+class RWCompactNodeList(RWNodeList):
+    """Read a list of nodes into a NodeArray."""
+
+    _type_indexes = {
+        'LINE': 0, 'CURVE': 1, 'QCURVE': 2, 'OFFCURVE': 3, 'n/a': 4}
+    # type indexes and smooth flags of the type tokens of _split_nodes
+    _token_types = {token: NodeArray.TYPES.index(node_type)
+                    for token, (node_type, _) in _NODE_TYPES.items()}
+    _token_smooth = {token: int(smooth)
+                     for token, (_, smooth) in _NODE_TYPES.items()}
+
+    def read(self, src):
+        split = _split_nodes(src)
+        if split is not None:
+            coordinates, types = split
+            coordinates = _read_numbers(coordinates)
+            if coordinates is not None:
+                return NodeArray(
+                    coordinates, map(self._token_types.__getitem__, types),
+                    map(self._token_smooth.__getitem__, types))
+
+        match = RWNode._regex.match
+        type_indexes = self._type_indexes
+        nodes = NodeArray()
+        coordinates, types, smooth = nodes.coordinates, nodes.types, \
+            nodes.smooth
+        for value in src:
+            x, y, node_type, node_smooth = match(value).groups()
+            coordinates.append(float(x))
+            coordinates.append(float(y))
+            types.append(type_indexes[node_type])
+            smooth.append(1 if node_smooth else 0)
+        return nodes
+
+
 class RWDateTime(RWGlyphs):
     """Read/write a datetime.  Doesn't maintain time zone offset."""
 
@@ -370,6 +570,7 @@ class RWUserData(RWGlyphs):
 # Like singletons, but... not.  Used as type structure values.
 
 background = RWBackground()
+compact_background = RWBackground(compact_nodes=True)
 default = RWDefault()
 string = RWString()
 integer = RWInteger()
@@ -382,6 +583,7 @@ node = RWNode()
 intlist = RWIntList()
 pointlist = RWPointList()
 nodelist = RWNodeList()
+compact_nodelist = RWCompactNodeList()
 glyphs_datetime = RWDateTime()
 kerning = RWKerning()
 descender_val = RWDescenderVal()
@@ -518,23 +720,95 @@ _TYPE_STRUCTURE = {
     'versionMinor': version_minor
 }
 
-def cast_data(data):
-    _convert_data(data, True, _TYPE_STRUCTURE)
+def _compile(types, to_typed):
+    """Compile a type structure into a function which casts (or uncasts) the
+    values of a dictionary described by it in place, and returns it.
 
+    The function only looks at the keys present in the data, and skips
+    values which are passed through unchanged.
+    """
 
-def uncast_data(data):
-    _convert_data(data, False, _TYPE_STRUCTURE)
+    converters = {}
+    for key, cur_type in types.items():
+        if isinstance(cur_type, dict):
+            # data[key] is a list of data of type dict
+            converters[key] = _compile_list(cur_type, to_typed)
+        elif type(cur_type) is RWDefault or (
+                to_typed and type(cur_type) is RWString):
+            continue
+        else:
+            converters[key] = cur_type.read if to_typed else cur_type.write
+    get_converter = converters.get
+
+    def convert(data):
+        for key, value in data.items():
+            converter = get_converter(key)
+            if converter is not None:
+                data[key] = converter(value)
+        return data
+    return convert
+
+
+def _compile_list(types, to_typed):
+    """Like _compile, for a list of dictionaries."""
+
+    convert_item = _compile(types, to_typed)
+
+    def convert(data):
+        for item in data:
+            convert_item(item)
+        return data
+    return convert
 
 
-def _convert_data(data, to_typed, types):
-    """Cast the attributes of parsed glyphs file content."""
+def _with_compact_nodes(types):
+    """Return a copy of a type structure which reads nodes into
+    NodeArrays.
+    """
 
+    compact_types = {}
     for key, cur_type in types.items():
-        if key not in data:
-            continue
         if isinstance(cur_type, dict):
-            # data[key] is a list of data of type dict
-            for cur_data in data[key]:
-                _convert_data(cur_data, to_typed, cur_type)
-        else:
-            data[key] = cur_type.convert(data[key], to_typed)
+            cur_type = _with_compact_nodes(cur_type)
+        elif cur_type is nodelist:
+            cur_type = compact_nodelist
+        elif cur_type is background:
+            cur_type = compact_background
+        compact_types[key] = cur_type
+    return compact_types
+
+
+_COMPACT_BACKGROUND_TYPE_STRUCTURE = _with_compact_nodes(
+    _BACKGROUND_TYPE_STRUCTURE)
+_COMPACT_TYPE_STRUCTURE = _with_compact_nodes(_TYPE_STRUCTURE)
+
+_cast_font = _compile(_TYPE_STRUCTURE, True)
+_cast_compact_font = _compile(_COMPACT_TYPE_STRUCTURE, True)
+_uncast_font = _compile(_TYPE_STRUCTURE, False)
+_cast_glyph = _compile(_TYPE_STRUCTURE['glyphs'], True)
+_cast_compact_glyph = _compile(_COMPACT_TYPE_STRUCTURE['glyphs'], True)
+_cast_background = _compile(_BACKGROUND_TYPE_STRUCTURE, True)
+_cast_compact_background = _compile(_COMPACT_BACKGROUND_TYPE_STRUCTURE, True)
+_uncast_background = _compile(_BACKGROUND_TYPE_STRUCTURE, False)
+
+
+def cast_data(data, compact_nodes=False):
+    """Cast the attributes of parsed glyphs file content. If compact_nodes is
+    true, the nodes of paths are read into NodeArrays.
+    """
+    if compact_nodes:
+        _cast_compact_font(data)
+    else:
+        _cast_font(data)
+
+
+def uncast_data(data):
+    _uncast_font(data)
+
+
+def cast_glyph_data(data, compact_nodes=False):
+    """Cast the attributes of a single parsed glyph."""
+    if compact_nodes:
+        _cast_compact_glyph(data)
+    else:
+        _cast_glyph(data)
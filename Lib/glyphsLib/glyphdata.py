@@ -16,21 +16,199 @@
 
 from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+try:
+    from collections.abc import Mapping, Set
+except ImportError:  # python 2
+    from collections import Mapping, Set
 from fontTools import agl
-from fontTools.misc.py23 import unichr
-from glyphsLib import glyphdata_generated
+from fontTools.misc.py23 import basestring, unichr
+import mmap
+import os
 import sys
 import struct
 import unicodedata
+import zlib
 
 NARROW_PYTHON_BUILD = sys.maxunicode < 0x10FFFF
 
+# the GlyphData tables, written by MetaTools/generate_glyphdata.py both as
+# the glyphdata_generated module and as this binary file, see GlyphTable
+TABLE_PATH = os.path.join(os.path.dirname(__file__), "glyphdata.bin")
+
 
 Glyph = namedtuple("Glyph", "name,production_name,unicode,category,subCategory")
 
+# maximum number of glyphs whose info get_glyph keeps for later lookups
+CACHE_SIZE = 16384
+
+_cache = OrderedDict()
+
+
+_default_data = None
+
+
+def get_glyph(name, data=None):
+    """Return the Glyph info for a glyph name.
+
+    Lookups in the built-in data are cached; the CACHE_SIZE least recently
+    used names are kept.
+    """
+    if data is not None:
+        return _lookup_glyph(name, data)
+    data = default_data()
+    try:
+        glyph = _cache.pop(name)
+    except KeyError:
+        glyph = _lookup_glyph(name, data)
+        while len(_cache) >= CACHE_SIZE:
+            _cache.popitem(last=False)
+    _cache[name] = glyph
+    return glyph
+
+
+def get_glyphs(names, data=None):
+    """Return a dictionary from the given glyph names to their Glyph info,
+    looking up each name once.
+    """
+    glyphs = OrderedDict()
+    for name in names:
+        if name not in glyphs:
+            glyphs[name] = get_glyph(name, data)
+    return glyphs
+
+
+def clear_cache():
+    """Forget the glyph info cached by get_glyph."""
+    _cache.clear()
+
+
+def default_data():
+    """Return the built-in GlyphData tables: a GlyphTable of TABLE_PATH,
+    opened on first use, or the glyphdata_generated module if that file
+    cannot be read.
+    """
+    global _default_data
+    if _default_data is None:
+        try:
+            _default_data = GlyphTable(TABLE_PATH)
+        except (IOError, OSError, ValueError):
+            from glyphsLib import glyphdata_generated
+            _default_data = glyphdata_generated
+    return _default_data
+
+
+def get_glyph_by_unicode(unistr, data=None):
+    """Return the Glyph info of the glyph whose Unicode string is unistr,
+    which may also be a code point, or None if there is no such glyph.
+
+    Characters that no glyph of the tables has get the glyph whose name is
+    their AGLFN name, or their uniXXXX or uXXXXX name, like get_glyph
+    derives Unicode strings from names.
+    """
+    if not isinstance(unistr, basestring):
+        unistr = unichr(unistr)
+    name = _reverse_indexes(data)[0].get(unistr)
+    if name is not None:
+        return get_glyph(name, data)
+    for name in _derived_names(unistr):
+        glyph = get_glyph(name, data)
+        if glyph.unicode == unistr:
+            return glyph
+    return None
+
+
+def get_glyph_by_production_name(production_name, data=None):
+    """Return the Glyph info of the glyph whose production name is
+    production_name, or None if there is no such glyph.
+
+    AGLFN, uniXXXX and uXXXXX names that no glyph of the tables has as its
+    production name stand for their character, see get_glyph_by_unicode.
+    """
+    name = _reverse_indexes(data)[1].get(production_name)
+    if name is not None:
+        return get_glyph(name, data)
+    unistr = agl.toUnicode(production_name)
+    if unistr and production_name in _derived_names(unistr):
+        return get_glyph_by_unicode(unistr, data)
+    return None
+
+
+def _derived_names(unistr):
+    """Return the names whose Unicode string is unistr when derived from
+    the name alone: its AGLFN name if it has one, and its uniXXXX or uXXXXX
+    name. Only single characters have such names.
+    """
+    utf32_str = unistr.encode("utf-32-be")
+    if len(utf32_str) != 4:
+        return []
+    code_point = struct.unpack(">L", utf32_str)[0]
+    names = []
+    if code_point in agl.UV2AGL:
+        names.append(agl.UV2AGL[code_point])
+    if code_point <= 0xFFFF:
+        names.append("uni%04X" % code_point)
+    else:
+        names.append("u%X" % code_point)
+    return names
+
+
+def known_glyph_names(data):
+    """Return the names of the glyphs of GlyphData tables.
+
+    The tables only list the glyphs whose data cannot be derived from their
+    names; the others are the AGLFN names that the tables do not already
+    cover, either as glyph or production names or with the same Unicode
+    string.
+    """
+    names = set(data.PRODUCTION_NAMES)
+    names.update(data.IRREGULAR_UNICODE_STRINGS)
+    names.update(data.MISSING_UNICODE_STRINGS)
+    names.update(data.IRREGULAR_CATEGORIES)
+    production_names = set(data.PRODUCTION_NAMES.values())
+    unicode_strings = set(
+        _lookup_glyph(name, data).unicode for name in names)
+    for name, code_point in agl.AGL2UV.items():
+        if (name not in names and name not in production_names and
+                unichr(code_point) not in unicode_strings):
+            names.add(name)
+    return sorted(names)
+
+
+def build_reverse_indexes(glyphs):
+    """Return dictionaries from Unicode strings and from production names to
+    the names of the given Glyph infos. Where several glyphs have the same
+    Unicode string or production name, the first name in sorted order wins.
+    """
+    by_unicode, by_production_name = {}, {}
+    for glyph in sorted(glyphs, key=lambda glyph: glyph.name):
+        if glyph.unicode is not None:
+            by_unicode.setdefault(glyph.unicode, glyph.name)
+        by_production_name.setdefault(glyph.production_name, glyph.name)
+    return by_unicode, by_production_name
+
 
-def get_glyph(name, data=glyphdata_generated):
+_runtime_indexes = None
+
+
+def _reverse_indexes(data):
+    global _runtime_indexes
+    if data is None:
+        data = default_data()
+    if isinstance(data, GlyphTable):
+        return data.NAMES_BY_UNICODE, data.NAMES_BY_PRODUCTION_NAME
+    # other data has no indexes built by generate_glyphdata.py; build them
+    # here, and only once for the built-in data
+    if data is _default_data and _runtime_indexes is not None:
+        return _runtime_indexes
+    indexes = build_reverse_indexes(
+        _lookup_glyph(name, data) for name in known_glyph_names(data))
+    if data is _default_data:
+        _runtime_indexes = indexes
+    return indexes
+
+
+def _lookup_glyph(name, data):
     prodname = data.PRODUCTION_NAMES.get(name, name)
     unistr = data.IRREGULAR_UNICODE_STRINGS.get(name)
     if unistr is None:
@@ -60,7 +238,9 @@ def _get_unicode_category(unistr):
     return unicodedata.ucd_3_2_0.category(first_char)
 
 
-def _get_category(name, unistr, data=glyphdata_generated):
+def _get_category(name, unistr, data=None):
+    if data is None:
+        data = default_data()
     cat = data.IRREGULAR_CATEGORIES.get(name)
     if cat is not None:
         return cat
@@ -85,3 +265,345 @@ def _get_category(name, unistr, data=glyphdata_generated):
     if "_" in basename:
         return (cat[0], "Ligature")
     return cat
+
+
+# Binary GlyphData tables. All integers are big-endian, strings are UTF-8.
+#
+# The file starts with a header, followed by the category names (the first
+# one stands for None), the default categories of Unicode categories, one
+# record per glyph sorted by name, the index of glyph names by Unicode
+# string, the index of glyph names by production name, and a pool of
+# strings. Strings are referenced by their offset in the pool and their
+# length.
+#
+# Each index is a hash table: an array of _index_size(number of entries)
+# buckets, each either 0 or one plus the index of an entry, followed by the
+# entries. An entry is found at the bucket of the CRC-32 of its key, or at
+# the next ones.
+
+_TABLE_MAGIC = b"GLYD"
+_TABLE_VERSION = 2
+
+# magic, version, number of category names, of default categories, of
+# glyphs, of entries by Unicode string and of entries by production name
+_HEADER = struct.Struct(">4sHHHIII")
+# offset and length of a category name
+_CATEGORY_NAME = struct.Struct(">IH")
+# Unicode category (two ASCII letters, or two zero bytes for None), indexes
+# of the category and sub-category names
+_DEFAULT_CATEGORY = struct.Struct(">2sBB")
+# offset and length of the glyph name, of its production name and of its
+# irregular Unicode string, flags, indexes of its irregular category and
+# sub-category names
+_GLYPH_RECORD = struct.Struct(">IHIHIHBBB")
+
+_INDEX_BUCKET = struct.Struct(">I")
+# offset and length of the key, and of the glyph name
+_INDEX_ENTRY = struct.Struct(">IHIH")
+
+_PRODUCTION_NAME = 1
+_IRREGULAR_UNICODE_STRING = 2
+_MISSING_UNICODE_STRING = 4
+_IRREGULAR_CATEGORY = 8
+
+
+class GlyphTable(object):
+    """GlyphData tables read from a binary file made by write_glyph_table.
+
+    Has the same PRODUCTION_NAMES, IRREGULAR_UNICODE_STRINGS,
+    MISSING_UNICODE_STRINGS, DEFAULT_CATEGORIES and IRREGULAR_CATEGORIES
+    attributes as the glyphdata_generated module, but the file is
+    memory-mapped and each glyph is looked up with a binary search on its
+    name, so that nothing is loaded up front, and processes share the pages
+    of the file that they read.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as fp:
+            self._buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._buffer
+        if len(buf) < _HEADER.size:
+            raise ValueError("%s is not a glyph data table" % path)
+        (magic, version, num_names, num_defaults, num_glyphs, num_unicodes,
+         num_production_names) = _HEADER.unpack_from(buf, 0)
+        if magic != _TABLE_MAGIC or version != _TABLE_VERSION:
+            raise ValueError("%s is not a glyph data table of version %d" % (
+                path, _TABLE_VERSION))
+        offset = _HEADER.size
+        name_refs = [
+            _CATEGORY_NAME.unpack_from(buf, offset + i * _CATEGORY_NAME.size)
+            for i in range(num_names)]
+        offset += num_names * _CATEGORY_NAME.size
+        defaults_offset = offset
+        offset += num_defaults * _DEFAULT_CATEGORY.size
+        self._glyphs_offset = offset
+        self._num_glyphs = num_glyphs
+        offset += num_glyphs * _GLYPH_RECORD.size
+        self.NAMES_BY_UNICODE = _TableIndex(self, offset, num_unicodes)
+        offset += _index_length(num_unicodes)
+        self.NAMES_BY_PRODUCTION_NAME = _TableIndex(
+            self, offset, num_production_names)
+        offset += _index_length(num_production_names)
+        self._pool_offset = offset
+
+        self._category_names = [None] + [
+            self._string(*ref) for ref in name_refs[1:]]
+        self.DEFAULT_CATEGORIES = {}
+        for i in range(num_defaults):
+            ucat, category, sub_category = _DEFAULT_CATEGORY.unpack_from(
+                buf, defaults_offset + i * _DEFAULT_CATEGORY.size)
+            ucat = None if ucat == b"\0\0" else ucat.decode("ascii")
+            self.DEFAULT_CATEGORIES[ucat] = (
+                self._category_names[category],
+                self._category_names[sub_category])
+
+        self.PRODUCTION_NAMES = _TableMapping(self, _PRODUCTION_NAME)
+        self.IRREGULAR_UNICODE_STRINGS = _TableMapping(
+            self, _IRREGULAR_UNICODE_STRING)
+        self.MISSING_UNICODE_STRINGS = _TableSet(
+            self, _MISSING_UNICODE_STRING)
+        self.IRREGULAR_CATEGORIES = _TableMapping(self, _IRREGULAR_CATEGORY)
+        self._last = (None, None)
+
+    def _string(self, offset, length):
+        start = self._pool_offset + offset
+        return self._buffer[start:start + length].decode("utf-8")
+
+    def _record(self, index):
+        return _GLYPH_RECORD.unpack_from(
+            self._buffer, self._glyphs_offset + index * _GLYPH_RECORD.size)
+
+    def _name(self, record):
+        start = self._pool_offset + record[0]
+        return self._buffer[start:start + record[1]]
+
+    def _find(self, name):
+        """Return the record of a glyph name, or None."""
+        last_name, last_record = self._last
+        if name == last_name:
+            return last_record
+        key = name.encode("utf-8")
+        lo, hi = 0, self._num_glyphs
+        record = None
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_record = self._record(mid)
+            mid_name = self._name(mid_record)
+            if mid_name < key:
+                lo = mid + 1
+            elif mid_name > key:
+                hi = mid
+            else:
+                record = mid_record
+                break
+        self._last = (name, record)
+        return record
+
+    def _value(self, record, flag):
+        if not record[6] & flag:
+            return None
+        if flag == _PRODUCTION_NAME:
+            return self._string(record[2], record[3])
+        if flag == _IRREGULAR_UNICODE_STRING:
+            return self._string(record[4], record[5])
+        if flag == _IRREGULAR_CATEGORY:
+            return (self._category_names[record[7]],
+                    self._category_names[record[8]])
+        return True
+
+    def _items(self, flag):
+        for index in range(self._num_glyphs):
+            record = self._record(index)
+            if record[6] & flag:
+                yield (self._name(record).decode("utf-8"),
+                       self._value(record, flag))
+
+
+class _TableView(object):
+    """The glyph names flagged in a GlyphTable."""
+
+    def __init__(self, table, flag):
+        self._table = table
+        self._flag = flag
+        self._len = None
+
+    def __iter__(self):
+        return (name for name, _ in self._table._items(self._flag))
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(1 for _ in self._table._items(self._flag))
+        return self._len
+
+
+class _TableMapping(_TableView, Mapping):
+    """Read-only mapping from glyph names to one value of a GlyphTable."""
+
+    def __getitem__(self, name):
+        record = self._table._find(name)
+        value = None if record is None else self._table._value(
+            record, self._flag)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+
+class _TableSet(_TableView, Set):
+    """Read-only set of the glyph names flagged in a GlyphTable."""
+
+    def __contains__(self, name):
+        record = self._table._find(name)
+        return record is not None and bool(record[6] & self._flag)
+
+
+class _TableIndex(Mapping):
+    """Read-only mapping from strings to glyph names, read from a hash table
+    in a GlyphTable.
+    """
+
+    def __init__(self, table, offset, num_entries):
+        self._table = table
+        self._offset = offset
+        self._num_entries = num_entries
+        self._num_buckets = _index_size(num_entries)
+        self._entries_offset = offset + self._num_buckets * _INDEX_BUCKET.size
+
+    def _entry(self, index):
+        return _INDEX_ENTRY.unpack_from(
+            self._table._buffer,
+            self._entries_offset + index * _INDEX_ENTRY.size)
+
+    def __getitem__(self, key):
+        if self._num_entries:
+            encoded = key.encode("utf-8")
+            buf = self._table._buffer
+            mask = self._num_buckets - 1
+            bucket = _hash(encoded) & mask
+            while True:
+                entry_index, = _INDEX_BUCKET.unpack_from(
+                    buf, self._offset + bucket * _INDEX_BUCKET.size)
+                if not entry_index:
+                    break
+                entry = self._entry(entry_index - 1)
+                if self._table._string(entry[0], entry[1]) == key:
+                    return self._table._string(entry[2], entry[3])
+                bucket = (bucket + 1) & mask
+        raise KeyError(key)
+
+    def __iter__(self):
+        for index in range(self._num_entries):
+            entry = self._entry(index)
+            yield self._table._string(entry[0], entry[1])
+
+    def __len__(self):
+        return self._num_entries
+
+
+def _hash(encoded):
+    return zlib.crc32(encoded) & 0xffffffff
+
+
+def _index_size(num_entries):
+    """Return the number of buckets of a hash table, at most half full."""
+    size = 1
+    while size < 2 * num_entries:
+        size *= 2
+    return size
+
+
+def _index_length(num_entries):
+    return (_index_size(num_entries) * _INDEX_BUCKET.size +
+            num_entries * _INDEX_ENTRY.size)
+
+
+def _pack_index(index, add_string):
+    """Return the bytes of a hash table for a dictionary of strings."""
+    num_buckets = _index_size(len(index))
+    buckets = [0] * num_buckets
+    entries = []
+    for key, name in sorted(index.items()):
+        encoded = key.encode("utf-8")
+        bucket = _hash(encoded) & (num_buckets - 1)
+        while buckets[bucket]:
+            bucket = (bucket + 1) & (num_buckets - 1)
+        entries.append(_INDEX_ENTRY.pack(*(add_string(key) + add_string(name))))
+        buckets[bucket] = len(entries)
+    return b"".join(_INDEX_BUCKET.pack(b) for b in buckets) + b"".join(entries)
+
+
+def write_glyph_table(data, fp, names=None):
+    """Write GlyphData tables, given as an object with the attributes of the
+    glyphdata_generated module, to a binary file object for GlyphTable.
+
+    The reverse indexes are built for the given glyph names, by default
+    those returned by known_glyph_names.
+    """
+    pool = bytearray()
+    pool_offsets = {}
+
+    def add_string(value):
+        encoded = value.encode("utf-8")
+        if encoded not in pool_offsets:
+            pool_offsets[encoded] = len(pool)
+            pool.extend(encoded)
+        return pool_offsets[encoded], len(encoded)
+
+    category_names = [None]
+    category_indexes = {None: 0}
+
+    def category_index(name):
+        if name not in category_indexes:
+            category_indexes[name] = len(category_names)
+            category_names.append(name)
+        return category_indexes[name]
+
+    defaults = []
+    for ucat, (category, sub_category) in sorted(
+            data.DEFAULT_CATEGORIES.items(), key=lambda i: i[0] or ""):
+        defaults.append(_DEFAULT_CATEGORY.pack(
+            b"\0\0" if ucat is None else ucat.encode("ascii"),
+            category_index(category), category_index(sub_category)))
+
+    listed_names = set(data.PRODUCTION_NAMES)
+    listed_names.update(data.IRREGULAR_UNICODE_STRINGS)
+    listed_names.update(data.MISSING_UNICODE_STRINGS)
+    listed_names.update(data.IRREGULAR_CATEGORIES)
+    records = []
+    for name in sorted(listed_names, key=lambda n: n.encode("utf-8")):
+        flags = 0
+        name_ref = add_string(name)
+        production_ref = unicode_ref = (0, 0)
+        category = sub_category = 0
+        if name in data.PRODUCTION_NAMES:
+            flags |= _PRODUCTION_NAME
+            production_ref = add_string(data.PRODUCTION_NAMES[name])
+        if name in data.IRREGULAR_UNICODE_STRINGS:
+            flags |= _IRREGULAR_UNICODE_STRING
+            unicode_ref = add_string(data.IRREGULAR_UNICODE_STRINGS[name])
+        if name in data.MISSING_UNICODE_STRINGS:
+            flags |= _MISSING_UNICODE_STRING
+        if name in data.IRREGULAR_CATEGORIES:
+            flags |= _IRREGULAR_CATEGORY
+            category = category_index(data.IRREGULAR_CATEGORIES[name][0])
+            sub_category = category_index(data.IRREGULAR_CATEGORIES[name][1])
+        records.append(_GLYPH_RECORD.pack(
+            name_ref[0], name_ref[1], production_ref[0], production_ref[1],
+            unicode_ref[0], unicode_ref[1], flags, category, sub_category))
+
+    if names is None:
+        names = known_glyph_names(data)
+    by_unicode, by_production_name = build_reverse_indexes(
+        _lookup_glyph(name, data) for name in names)
+
+    name_refs = [_CATEGORY_NAME.pack(0, 0)] + [
+        _CATEGORY_NAME.pack(*add_string(name))
+        for name in category_names[1:]]
+    fp.write(_HEADER.pack(_TABLE_MAGIC, _TABLE_VERSION, len(category_names),
+                          len(defaults), len(records), len(by_unicode),
+                          len(by_production_name)))
+    fp.write(b"".join(name_refs))
+    fp.write(b"".join(defaults))
+    fp.write(b"".join(records))
+    fp.write(_pack_index(by_unicode, add_string))
+    fp.write(_pack_index(by_production_name, add_string))
+    fp.write(bytes(pool))
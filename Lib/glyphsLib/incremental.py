@@ -0,0 +1,223 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+try:
+    from fontTools.ufoLib import UFOWriter
+    from fontTools.ufoLib.glifLib import writeGlyphToString
+except ImportError:  # fonttools < 3.34, with the ufoLib package of defcon
+    from ufoLib import UFOWriter
+    from ufoLib.glifLib import writeGlyphToString
+
+import glyphsLib
+from glyphsLib.builder import GLYPHS_PREFIX, to_ufo_time
+from glyphsLib.timing import span
+from glyphsLib.ufowriter import (
+    DEFAULT_LAYER_NAME, close_writer, write_font_data)
+from glyphsLib.util import build_ufo_path, clean_ufo
+
+__all__ = [
+    'change_keys', 'write_ufo_incrementally',
+]
+
+logger = logging.getLogger(__name__)
+
+# version of the manifest format
+MANIFEST_FORMAT = 1
+
+_MANIFEST_SUFFIX = '.manifest.json'
+
+
+def change_keys(data):
+    """Return a dictionary from master IDs to dictionaries from glyph names
+    to the change keys of the glyphs in .glyphs data.
+
+    The key of a glyph is a hash of its lastChange date and those of all the
+    glyphs its master layer is made of through components, as anchors are
+    propagated from components. It is None if any of them has no lastChange
+    date, or is not in the font.
+    """
+
+    with span('change_keys', len(data['glyphs'])):
+        return _change_keys(data)
+
+
+def _change_keys(data):
+    last_changes = {}
+    components = {}
+    for glyph in data['glyphs']:
+        glyph_name = glyph['glyphname']
+        last_change = glyph.get('lastChange')
+        last_changes[glyph_name] = (
+            None if last_change is None else to_ufo_time(last_change))
+        for layer in glyph['layers']:
+            if layer.get('associatedMasterId') is not None:
+                continue
+            components.setdefault(layer['layerId'], {})[glyph_name] = [
+                c['name'] for c in layer.get('components', [])]
+
+    keys = {}
+    for master_id, master_components in components.items():
+        master_keys = keys[master_id] = {}
+        for glyph_name in master_components:
+            closure = {glyph_name}
+            stack = [glyph_name]
+            while stack:
+                for name in master_components.get(stack.pop(), ()):
+                    if name not in closure:
+                        closure.add(name)
+                        stack.append(name)
+            changes = [(name, last_changes.get(name))
+                       for name in sorted(closure)]
+            if any(change is None for _, change in changes):
+                master_keys[glyph_name] = None
+            else:
+                master_keys[glyph_name] = _hash('\n'.join(
+                    '%s %s' % change for change in changes))
+    return keys
+
+
+def write_ufo_incrementally(ufo, out_dir, keys):
+    """Write a UFO like util.write_ufo, and return its path, but only
+    rewrite the files of a UFO written by a previous call which changed.
+
+    A manifest next to the UFO records the change key (see change_keys) and
+    the hash of the .glif data of each glyph. A glyph whose key is the same
+    as in the manifest is not written; others are serialized, and only
+    written if their hash changed. Glyphs which were removed are deleted,
+    and the other UFO files are only rewritten if their content changed.
+    Without a usable manifest, e.g. after a glyphsLib update, the UFO is
+    written from scratch. 'keys' maps glyph names to their change keys.
+    """
+
+    path = build_ufo_path(out_dir, ufo.info.familyName, ufo.info.styleName)
+    manifest_path = os.path.splitext(path)[0] + _MANIFEST_SUFFIX
+    master_id = ufo.lib.get(GLYPHS_PREFIX + 'fontMasterID')
+    manifest = _read_manifest(manifest_path, master_id)
+    # an update which is interrupted leaves no manifest, and the next build
+    # writes the UFO from scratch
+    _remove(manifest_path)
+
+    with span('write', len(ufo)):
+        if manifest is None or not os.path.isdir(path):
+            logger.info('Writing %s' % path)
+            clean_ufo(path)
+            ufo.save(path)
+            glyphs = {name: [keys.get(name), None] for name in ufo.keys()}
+        else:
+            logger.info('Updating %s' % path)
+            glyphs = _update_ufo(ufo, path, manifest['glyphs'], keys)
+
+        _write_manifest(manifest_path, {
+            'format': MANIFEST_FORMAT,
+            'glyphsLib': glyphsLib.__version__,
+            'master': master_id,
+            'glyphs': glyphs,
+        })
+    return path
+
+
+def _update_ufo(ufo, path, manifest_glyphs, keys):
+    """Update the UFO at path to ufo, and return the glyph entries of its
+    new manifest.
+    """
+
+    writer = UFOWriter(path, formatVersion=3)
+    write_font_data(writer, ufo)
+    glyph_set = writer.getGlyphSet(DEFAULT_LAYER_NAME, defaultLayer=True)
+    for name in list(glyph_set.keys()):
+        if name not in ufo:
+            glyph_set.deleteGlyph(name)
+
+    glyphs = {}
+    written = 0
+    for name in sorted(ufo.keys()):
+        key = keys.get(name)
+        entry = manifest_glyphs.get(name)
+        exists = name in glyph_set
+        if exists and entry is not None and key is not None and \
+                entry[0] == key:
+            glyphs[name] = entry
+            continue
+        glyph = ufo[name]
+        glif_hash = _hash(writeGlyphToString(name, glyph, glyph.drawPoints))
+        if not exists or entry is None or entry[1] != glif_hash:
+            glyph_set.writeGlyph(name, glyph, glyph.drawPoints)
+            written += 1
+        glyphs[name] = [key, glif_hash]
+    logger.info('Wrote %d of %d glyphs', written, len(glyphs))
+
+    glyph_set.writeContents()
+    writer.writeLayerContents([DEFAULT_LAYER_NAME])
+    close_writer(writer)
+    return glyphs
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _read_manifest(path, master_id):
+    """Return the manifest at path, or None if there is none or it was not
+    written by this version of glyphsLib for this master.
+    """
+
+    try:
+        with open(path, 'rb') as fp:
+            manifest = json.loads(fp.read().decode('utf-8'))
+    except (IOError, OSError):
+        return None
+    except ValueError as e:
+        logger.warning('Ignoring unreadable manifest %s: %s', path, e)
+        return None
+    if (not isinstance(manifest, dict) or
+            manifest.get('format') != MANIFEST_FORMAT or
+            manifest.get('glyphsLib') != glyphsLib.__version__ or
+            manifest.get('master') != master_id or
+            not isinstance(manifest.get('glyphs'), dict)):
+        return None
+    return manifest
+
+
+def _write_manifest(path, manifest):
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(json.dumps(manifest, sort_keys=True).encode('utf-8'))
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, path)
+        else:  # python 2
+            os.rename(temp_path, path)
+    except Exception:
+        _remove(temp_path)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
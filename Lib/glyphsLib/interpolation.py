@@ -23,10 +23,12 @@ import xml.etree.ElementTree as etree
 
 from glyphsLib.builder import set_redundant_data, set_custom_params,\
     set_default_params, GLYPHS_PREFIX
+from glyphsLib.timing import span
 from glyphsLib.util import build_ufo_path, write_ufo, clean_ufo, clear_data
 
 __all__ = [
-    'interpolate', 'build_designspace', 'apply_instance_data'
+    'interpolate', 'build_designspace', 'write_designspace',
+    'apply_instance_data'
 ]
 
 logger = logging.getLogger(__name__)
@@ -51,11 +53,13 @@ def interpolate(ufos, master_dir, out_dir, instance_data, debug=False):
         ufos, master_dir, out_dir, instance_data)
 
     logger.info('Building instances')
-    for path, _ in instance_files:
-        clean_ufo(path)
-    build(designspace_path, outputUFOFormatVersion=3)
+    with span('interpolate', len(instance_files)):
+        for path, _ in instance_files:
+            clean_ufo(path)
+        build(designspace_path, outputUFOFormatVersion=3)
 
-    instance_ufos = apply_instance_data(instance_files)
+    with span('instance_data', len(instance_files)):
+        instance_ufos = apply_instance_data(instance_files)
     if debug:
         return clear_data(instance_data)
     return instance_ufos
@@ -68,10 +72,23 @@ def build_designspace(masters, master_dir, out_dir, instance_data):
     (instance_path, instance_data) tuples which map instance UFO filenames to
     Glyphs data for that instance.
     """
-    from mutatorMath.ufo.document import DesignSpaceDocumentWriter
 
     for font in masters:
         write_ufo(font, master_dir)
+    return write_designspace(masters, master_dir, out_dir, instance_data)
+
+
+def write_designspace(masters, master_dir, out_dir, instance_data):
+    """Like build_designspace, for masters which were written to master_dir
+    already.
+    """
+
+    with span('designspace'):
+        return _write_designspace(masters, master_dir, out_dir, instance_data)
+
+
+def _write_designspace(masters, master_dir, out_dir, instance_data):
+    from mutatorMath.ufo.document import DesignSpaceDocumentWriter
 
     # needed so that added masters and instances have correct relative paths
     tmp_path = os.path.join(master_dir, 'tmp.designspace')
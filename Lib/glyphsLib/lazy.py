@@ -0,0 +1,121 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+from fontTools.misc.py23 import tounicode
+
+import logging
+try:
+    from collections.abc import Sequence
+except ImportError:  # python 2
+    from collections import Sequence
+
+from glyphsLib.casting import _TYPE_STRUCTURE, _COMPACT_TYPE_STRUCTURE
+from glyphsLib.parser import Parser, index_glyphs
+from glyphsLib.timing import span
+
+__all__ = [
+    'LazyGlyphs', 'load_lazy', 'loads_lazy',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class LazyGlyphs(Sequence):
+    """Read-only list of glyph data, which also looks glyphs up by name.
+
+    Only the location of each glyph in the source text is known up front;
+    a glyph is parsed and cast the first time it is accessed, and kept for
+    later accesses. Iterating yields the glyphs in source order, like the
+    list loads returns, while indexing, 'in' and get take glyph names as
+    well. With compact_nodes, nodes are cast into NodeArrays.
+    """
+
+    def __init__(self, text, glyphs, compact_nodes=False):
+        self._text = text
+        self._spans = [(name, start, end) for name, start, end in glyphs]
+        self._indices = {}
+        for index, (name, _, _) in enumerate(self._spans):
+            self._indices.setdefault(name, index)
+        self._glyphs = {}
+        self._type_structure = (
+            _COMPACT_TYPE_STRUCTURE if compact_nodes else _TYPE_STRUCTURE)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._glyph(i) for i in range(*key.indices(len(self)))]
+        if isinstance(key, int):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError('glyph index out of range')
+            return self._glyph(key)
+        return self._glyph(self._indices[key])
+
+    def _glyph(self, index):
+        glyph = self._glyphs.get(index)
+        if glyph is None:
+            _, start, end = self._spans[index]
+            glyph = Parser(self._type_structure['glyphs']).parse(
+                self._text[start:end])
+            self._glyphs[index] = glyph
+        return glyph
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __contains__(self, name):
+        return name in self._indices
+
+    def get(self, name, default=None):
+        """Return the glyph named 'name', or default if there is none."""
+        index = self._indices.get(name)
+        return default if index is None else self._glyph(index)
+
+    def names(self):
+        """Return the glyph names, in source order."""
+        return [name for name, _, _ in self._spans]
+
+
+def loads_lazy(value, compact_nodes=False):
+    """Read a .glyphs file from a bytes object, without parsing its glyphs.
+
+    Return the unpacked root object (an ordered dictionary) like loads does,
+    except that its 'glyphs' entry is a LazyGlyphs list which parses each
+    glyph on first access, so the data can go to to_ufos or subset_data. For 'compact_nodes' see load.
+    """
+    text = tounicode(value, encoding='utf-8')
+    type_structure = (
+        _COMPACT_TYPE_STRUCTURE if compact_nodes else _TYPE_STRUCTURE)
+    with span('parse'):
+        logger.info('Indexing glyphs')
+        index = index_glyphs(text)
+        logger.info('Parsing and casting .glyphs file')
+        if index is None:
+            return Parser(type_structure).parse(text)
+        start, end, glyphs = index
+        data = Parser(type_structure).parse(text[:start] + '()' + text[end:])
+    data['glyphs'] = LazyGlyphs(text, glyphs, compact_nodes)
+    return data
+
+
+def load_lazy(fp, compact_nodes=False):
+    """Read a .glyphs file without parsing its glyphs. 'fp' should be
+    (readable) file object. See loads_lazy.
+    """
+    return loads_lazy(fp.read(), compact_nodes=compact_nodes)
@@ -17,6 +17,7 @@ from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
 from fontTools.misc.py23 import *
 
+import codecs
 import collections
 import re
 import sys
@@ -25,98 +26,59 @@ import sys
 class Parser:
     """Parses Python dictionaries from Glyphs source files."""
 
-    def __init__(self):
-        value_re = r'(".*?(?<!\\)"|[-_./$A-Za-z0-9]+)'
-        self.start_dict_re = re.compile(r'\s*{')
-        self.end_dict_re = re.compile(r'\s*}')
-        self.dict_delim_re = re.compile(r'\s*;')
-        self.start_list_re = re.compile(r'\s*\(')
-        self.end_list_re = re.compile(r'\s*\)')
-        self.list_delim_re = re.compile(r'\s*,')
-        self.attr_re = re.compile(r'\s*%s\s*=' % value_re, re.DOTALL)
-        self.value_re = re.compile(r'\s*%s' % value_re, re.DOTALL)
+    # The source is scanned in a single pass by _events, which iterparse
+    # drives too. Each step is one regex match which consumes a token, or
+    # where possible a whole run of tokens: a "key = value;" dictionary entry
+    # with a plain value, and a list made of plain values only (such as the
+    # nodes of a path), are each matched at once.
+    _quoted = r'"((?:[^"]*\\")*[^"]*)(?<!\\)"'
+    _unquoted = r'([-_./$A-Za-z0-9]+)'
+    _plain = r'(?:"(?:[^"]*\\")*[^"]*(?<!\\)"|[-_./$A-Za-z0-9]+)'
+
+    # group 1 is a delimiter, group 2 the contents of a quoted string and
+    # group 3 an unquoted value; which one matched is the match's lastindex.
+    _token_re = re.compile(r'\s*(?:([{}();,=])|%s|%s)' % (_quoted, _unquoted))
+    # groups 1 and 2 are the (quoted or unquoted) key, groups 3 and 4 the
+    # value if it is plain, otherwise the value has yet to be parsed.
+    _entry_re = re.compile(r'\s*(?:%s|%s)\s*=(?:\s*(?:%s|%s)\s*;)?' % (
+        _quoted, _unquoted, _quoted, _unquoted))
+    # like _entry_re, or group 5 is the end of the dictionary
+    _dict_item_re = re.compile(
+        r'\s*(?:(?:%s|%s)\s*=(?:\s*(?:%s|%s)\s*;)?|(}))' % (
+            _quoted, _unquoted, _quoted, _unquoted))
+    _plain_re = re.compile(r'%s|%s' % (_quoted, _unquoted))
+    # the plain values at the start of a list; group 2 marks a list made of
+    # plain values only.
+    _plain_items_re = re.compile(r'((?:\s*%s(?:\s*,\s*%s)*)?)\s*(\))?' % (
+        _plain, _plain))
+    _space_re = re.compile(r'\s*')
+
+    def __init__(self, types=None):
+        """If 'types' is given, a type structure like the ones in
+        glyphsLib.casting, values are cast while they are parsed, with the
+        same result as casting the parsed data afterwards.
+        """
+        self._types = types
 
     def parse(self, text):
         """Do the parsing."""
 
         text = tounicode(text, encoding='utf-8')
-        result, i = self._parse(text, 0)
-        if text[i:].strip():
-            self._fail('Unexpected trailing content', text, i)
-        return result
-
-    def _parse(self, text, i):
-        """Recursive function to parse a single dictionary, list, or value."""
+        return self._build(_TextScanner(text))
 
-        m = self.start_dict_re.match(text, i)
-        if m:
-            parsed = m.group(0)
-            i += len(parsed)
-            return self._parse_dict(text, i)
-
-        m = self.start_list_re.match(text, i)
-        if m:
-            parsed = m.group(0)
-            i += len(parsed)
-            return self._parse_list(text, i)
+    def parse_file(self, fp, chunk_size=65536):
+        """Parse a file object in text or binary mode, reading it in chunks
+        like iterparse does.
+        """
 
-        m = self.value_re.match(text, i)
-        if m:
-            parsed, value = m.group(0), self._trim_value(m.group(1))
-            i += len(parsed)
-            return value, i
+        return self._build(_Scanner(fp, chunk_size))
 
-        else:
-            self._fail('Unexpected content', text, i)
-
-    def _parse_dict(self, text, i):
-        """Parse a dictionary from source text starting at i."""
-
-        res = collections.OrderedDict()
-        end_match = self.end_dict_re.match(text, i)
-        while not end_match:
-            m = self.attr_re.match(text, i)
-            if not m:
-                self._fail('Unexpected dictionary content', text, i)
-            parsed, name = m.group(0), self._trim_value(m.group(1))
-            i += len(parsed)
-            res[name], i = self._parse(text, i)
-
-            m = self.dict_delim_re.match(text, i)
-            if not m:
-                self._fail('Missing delimiter in dictionary before content',
-                            text, i)
-            parsed = m.group(0)
-            i += len(parsed)
-
-            end_match = self.end_dict_re.match(text, i)
-
-        parsed = end_match.group(0)
-        i += len(parsed)
-        return res, i
-
-    def _parse_list(self, text, i):
-        """Parse a list from source text starting at i."""
-
-        res = []
-        end_match = self.end_list_re.match(text, i)
-        while not end_match:
-            list_item, i = self._parse(text, i)
-            res.append(list_item)
-
-            end_match = self.end_list_re.match(text, i)
-
-            if not end_match:
-                m = self.list_delim_re.match(text, i)
-                if not m:
-                    self._fail('Missing delimiter in list before content',
-                                text, i)
-                parsed = m.group(0)
-                i += len(parsed)
-
-        parsed = end_match.group(0)
-        i += len(parsed)
-        return res, i
+    def _build(self, scanner):
+        result = build_tree(_events(scanner), self._types)
+        if self._types is not None and not isinstance(result, dict):
+            # the type structures are those of dictionaries
+            raise ValueError('Unexpected content: not a dictionary')
+        return result
 
     # glyphs only supports octal escapes between \000 and \077 and hexadecimal
     # escapes between \U0000 and \UFFFF
@@ -128,23 +90,414 @@ class Parser:
             return unichr(int(m.group(1)[1:], 8))
         return unichr(int(m.group(2)[2:], 16))
 
-    def _trim_value(self, value):
-        """Trim double quotes off the ends of a value, un-escaping inner
-        double quotes.
-        Also convert escapes to unicode.
+    @staticmethod
+    def _unescape(value):
+        """Un-escape inner double quotes of a quoted value, and convert
+        escapes to unicode.
         """
 
-        if value[0] == '"':
-            assert value[-1] == '"'
-            value = value[1:-1].replace('\\"', '"')
+        if '\\' not in value:
+            return value
+        value = value.replace('\\"', '"')
         return Parser._unescape_re.sub(Parser._unescape_fn, value)
 
-    def _fail(self, message, text, i):
+    @staticmethod
+    def _fail(message, text, i):
         """Raise an exception with given message and text at i."""
 
         raise ValueError('%s:\n%s' % (message, text[i:i + 79]))
 
 
+START_DICT, END_DICT = 'start_dict', 'end_dict'
+START_LIST, END_LIST = 'start_list', 'end_list'
+KEY, VALUE = 'key', 'value'
+# events of _events only: a dictionary entry with a plain value, as a
+# (key, value) tuple, and a whole list made of plain values only
+_ENTRY, _PLAIN_LIST = 'entry', 'plain_list'
+
+
+def iterparse(fp, chunk_size=65536):
+    """Parse a .glyphs file incrementally, reading it in chunks from 'fp'
+    (a file object in text or binary mode).
+
+    Yields (event, value) tuples, where event is one of 'start_dict',
+    'key', 'value', 'end_dict', 'start_list' and 'end_list'. Only 'key' and
+    'value' events carry a value, the un-escaped key or string value; the
+    others carry None. Memory use is bounded by the chunk size, or the
+    longest token if it is longer, not by the size of the file.
+    """
+
+    for event, value in _events(_Scanner(fp, chunk_size)):
+        if event == _ENTRY:
+            yield KEY, value[0]
+            yield VALUE, value[1]
+        elif event == _PLAIN_LIST:
+            yield START_LIST, None
+            for item in value:
+                yield VALUE, item
+            yield END_LIST, None
+        else:
+            yield event, value
+
+
+def _events(scanner):
+    """Parse the text of a scanner (a _TextScanner or a _Scanner), and
+    yield the events of iterparse, where plain dictionary entries and lists
+    of plain values are single _ENTRY and _PLAIN_LIST events.
+    """
+
+    # Patterns are matched on the text held by the scanner, which is asked
+    # for more when a match fails, or reaches 'end', and may then start
+    # earlier in its new text.
+    text, end = scanner.text, scanner.end
+    refill, fail = scanner.refill, Parser._fail
+    unescape = Parser._unescape
+    token_re, dict_item_re = Parser._token_re, Parser._dict_item_re
+    plain_items_re, plain_re = Parser._plain_items_re, Parser._plain_re
+    token, dict_item = token_re.match, dict_item_re.match
+    plain_items = plain_items_re.match
+
+    # the containers being parsed, innermost last: True for dictionaries and
+    # False for lists
+    stack = []
+    i = 0
+    m = token(text, i)
+    if m is None or m.end() >= end:
+        m, text, i, end = refill(token_re, i)
+    while True:
+        # m is the first token of a value
+        if m is None:
+            fail('Unexpected content', text, i)
+        i = m.end()
+        kind = m.lastindex
+        after_value = True
+        if kind == 3:
+            yield VALUE, m.group(3)
+        elif kind == 2:
+            yield VALUE, unescape(m.group(2))
+        elif m.group(1) == '{':
+            yield START_DICT, None
+            stack.append(True)
+            after_value = False
+        elif m.group(1) == '(':
+            m = plain_items(text, i)
+            if m.end() >= end:
+                m, text, i, end = refill(plain_items_re, i)
+            if m.group(2) is not None:
+                i = m.end()
+                values = m.group(1)
+                if '\\' in values:
+                    yield _PLAIN_LIST, [
+                        value or unescape(quoted_value)
+                        for quoted_value, value in plain_re.findall(values)]
+                else:
+                    yield _PLAIN_LIST, [
+                        value or quoted_value
+                        for quoted_value, value in plain_re.findall(values)]
+            else:
+                i = m.start()
+                yield START_LIST, None
+                stack.append(False)
+                m = token(text, i)
+                if m is None or m.end() >= end:
+                    m, text, i, end = refill(token_re, i)
+                continue
+        else:
+            fail('Unexpected content', text, m.start())
+
+        # continue with the innermost container until the next value starts
+        m = None
+        while stack and m is None:
+            if not stack[-1]:
+                m = token(text, i)
+                if m is None or m.end() >= end:
+                    m, text, i, end = refill(token_re, i)
+                delim = m.group(1) if m is not None else None
+                if delim == ')':
+                    i = m.end()
+                    stack.pop()
+                    yield END_LIST, None
+                    m = None
+                    continue
+                if delim != ',':
+                    fail('Missing delimiter in list before content', text, i)
+                i = m.end()
+                m = token(text, i)
+                if m is None or m.end() >= end:
+                    m, text, i, end = refill(token_re, i)
+                if m is not None and m.group(1) == ')':
+                    fail('Unexpected content', text, i)
+                break
+
+            if after_value:
+                m = token(text, i)
+                if m is None or m.end() >= end:
+                    m, text, i, end = refill(token_re, i)
+                if m is None or m.group(1) != ';':
+                    fail('Missing delimiter in dictionary before content',
+                         text, i)
+                i = m.end()
+            m = dict_item(text, i)
+            if m is None or m.end() >= end:
+                m, text, i, end = refill(dict_item_re, i)
+            if m is None:
+                fail('Unexpected dictionary content', text, i)
+            i = m.end()
+            kind = m.lastindex
+            if kind == 5:
+                stack.pop()
+                yield END_DICT, None
+                after_value = True
+                m = None
+                continue
+            quoted_name, name, quoted_value, value = m.group(1, 2, 3, 4)
+            if name is None:
+                name = unescape(quoted_name)
+            if kind == 4:
+                yield _ENTRY, (name, value)
+            elif kind == 3:
+                yield _ENTRY, (name, unescape(quoted_value))
+            else:
+                yield KEY, name
+                m = token(text, i)
+                if m is None or m.end() >= end:
+                    m, text, i, end = refill(token_re, i)
+                if m is None:
+                    fail('Unexpected content', text, i)
+                break
+            after_value = False
+            m = None
+
+        if not stack:
+            break
+
+    text, i = scanner.skip_space(i)
+    if i != len(text):
+        fail('Unexpected trailing content', text, i)
+
+
+def build_tree(events, types=None):
+    """Build the unpacked root object (an ordered dictionary, or a list or
+    string for fragments) from iterparse() events.
+
+    If 'types' is given, a type structure like the ones in glyphsLib.casting,
+    values are cast as soon as they are complete, like Parser(types) does.
+    """
+
+    containers = []
+    result = parent = key = None
+    in_list = False
+    # the type structure of the values in parent, or of the dictionaries in
+    # parent if it is a list
+    parent_types = None
+    for event, value in events:
+        if event == _ENTRY:
+            key, value = value
+            if parent_types is not None:
+                value_type = parent_types.get(key)
+                if value_type is not None and type(value_type) is not dict:
+                    value = value_type.read(value)
+            parent[key] = value
+        elif event == VALUE or event == _PLAIN_LIST:
+            if in_list:
+                parent.append(value)
+            elif parent is not None:
+                if parent_types is not None:
+                    value_type = parent_types.get(key)
+                    if value_type is not None and type(value_type) is not dict:
+                        value = value_type.read(value)
+                parent[key] = value
+            else:
+                result = value
+        elif event == KEY:
+            key = value
+        elif event == START_DICT or event == START_LIST:
+            is_dict = event == START_DICT
+            value = collections.OrderedDict() if is_dict else []
+            if in_list:
+                parent.append(value)
+                value_types = parent_types if is_dict else None
+            elif parent is not None:
+                parent[key] = value
+                value_types = None
+                if parent_types is not None and not is_dict:
+                    value_types = parent_types.get(key)
+                    if type(value_types) is not dict:
+                        value_types = None
+            else:
+                result = value
+                value_types = types if is_dict else None
+            containers.append((parent, parent_types, key))
+            parent, parent_types = value, value_types
+            in_list = not is_dict
+        else:
+            value = parent
+            parent, parent_types, key = containers.pop()
+            in_list = type(parent) is list
+            if parent_types is not None and not in_list:
+                value_type = parent_types.get(key)
+                if value_type is not None and type(value_type) is not dict:
+                    parent[key] = value_type.read(value)
+    return result
+
+
+# Matches up to and including the next bracket which is not inside a string.
+_bracket_re = re.compile(
+    r'[^"{}()]*(?:"(?:[^"]*\\")*[^"]*(?<!\\)"[^"{}()]*)*([{}()])')
+_glyphs_key_re = re.compile(r'(?<![-_./$A-Za-z0-9"])glyphs\s*=\s*$')
+
+
+def index_glyphs(text):
+    """Locate the glyphs in the text of a .glyphs file without parsing them.
+
+    Only brackets are looked at, so this is much faster than parsing.
+    Returns None if the root dictionary has no 'glyphs' list, otherwise a
+    tuple (start, end, glyphs): text[start:end] is the glyphs list including
+    its parentheses, and glyphs is a list holding a (glyphname, start, end)
+    tuple for each glyph, where text[start:end] is the glyph's dictionary.
+    """
+
+    text = tounicode(text, encoding='utf-8')
+    depth = 0
+    start = None
+    glyphs = []
+    for m in _bracket_re.finditer(text):
+        bracket = m.group(1)
+        if bracket == '{' or bracket == '(':
+            depth += 1
+            if depth == 3 and start is not None:
+                glyph_start = m.start(1)
+            elif (depth == 2 and start is None and bracket == '(' and
+                  _glyphs_key_re.search(text, max(0, m.start(1) - 64),
+                                        m.start(1))):
+                start = m.start(1)
+        else:
+            depth -= 1
+            if start is None:
+                continue
+            if depth == 2:
+                glyphs.append((_glyph_name(text, glyph_start, m.end()),
+                               glyph_start, m.end()))
+            elif depth == 1:
+                return start, m.end(), glyphs
+    return None
+
+
+def _glyph_name(text, start, end):
+    """Return the glyphname of the glyph dictionary text[start:end]."""
+
+    # Glyphs.app writes the glyphname first, so usually a single match of
+    # the first entry is enough.
+    m = Parser._entry_re.match(text, start + 1)
+    if m is not None:
+        quoted_name, name, quoted_value, value = m.groups()
+        if name is None:
+            name = Parser._unescape(quoted_name)
+        if name == 'glyphname' and m.lastindex == 4:
+            return value
+        if name == 'glyphname' and m.lastindex == 3:
+            return Parser._unescape(quoted_value)
+    return Parser().parse(text[start:end]).get('glyphname')
+
+
+class _TextScanner(object):
+    """Holds the whole text to parse, for _events."""
+
+    def __init__(self, text):
+        self.text = text
+        # no match reaches past the end of the text
+        self.end = len(text) + 1
+
+    def refill(self, regex, i):
+        """Return the match of regex at i, the text, i and 'end': there is
+        no more text to read.
+        """
+        return regex.match(self.text, i), self.text, i, self.end
+
+    def skip_space(self, i):
+        """Return the text and the position after the white space at i."""
+        return self.text, Parser._space_re.match(self.text, i).end()
+
+
+class _Scanner(object):
+    """Holds the unparsed text of a file read in chunks, for _events, like
+    _TextScanner.
+
+    Text is read when a match fails or reaches the end of the text held,
+    and the text before the match is dropped then, so the text held is
+    about two chunks, or one token if it is longer.
+    """
+
+    def __init__(self, fp, chunk_size):
+        self._read = fp.read
+        self._chunk_size = chunk_size
+        self._decoder = None
+        self.text = ''
+        self.end = 0
+        self.eof = False
+
+    def refill(self, regex, i):
+        """Match regex at i, reading more text first while the match could
+        depend on text which has not been read yet. Return the match, the
+        text held, the position of i in it and the position from which
+        matches must be refilled.
+        """
+
+        while True:
+            m = regex.match(self.text, i)
+            if self.eof:
+                break
+            if m is not None:
+                if m.end() < len(self.text):
+                    break
+            elif self._mismatch_is_final(i):
+                break
+            i = self._read_chunk(i)
+        return m, self.text, i, self.end
+
+    def _mismatch_is_final(self, i):
+        """Return whether a failed match at i would fail with more text too.
+
+        The patterns of Parser fail depending on at most the first two tokens
+        at the position (a dictionary key and its '='), so the failure is
+        final once both are followed by more text, or there is no token.
+        """
+
+        for _ in range(2):
+            m = Parser._token_re.match(self.text, i)
+            if m is None:
+                # only a string which is not terminated yet could become a
+                # token with more text
+                i = Parser._space_re.match(self.text, i).end()
+                return i < len(self.text) and self.text[i] != '"'
+            if m.end() == len(self.text):
+                return False
+            i = m.end()
+        return True
+
+    def _read_chunk(self, i):
+        """Read a chunk, drop the text before i, and return the new position
+        of i.
+        """
+
+        chunk = self._read(self._chunk_size)
+        if isinstance(chunk, bytes):
+            if self._decoder is None:
+                self._decoder = codecs.getincrementaldecoder('utf-8')()
+            self.eof = not chunk
+            chunk = self._decoder.decode(chunk, final=self.eof)
+        else:
+            self.eof = not chunk
+        # only the text after i, usually less than a chunk, is copied
+        self.text = self.text[i:] + chunk
+        self.end = len(self.text) + 1 if self.eof else len(self.text)
+        return 0
+
+    def skip_space(self, i):
+        m, text, i, _ = self.refill(Parser._space_re, i)
+        return text, m.end()
+
+
 class Writer(object):
     """Write parsed data back to flat file.  Normalizes quoting
     and indentation."""
@@ -0,0 +1,132 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+
+import collections
+import logging
+
+from glyphsLib.lazy import LazyGlyphs
+from glyphsLib.timing import span
+
+__all__ = [
+    'component_closure', 'subset_data',
+]
+
+logger = logging.getLogger(__name__)
+
+
+def component_closure(glyphs, glyph_names):
+    """Return the set of the names of the glyphs in glyph_names, and of all
+    the glyphs they are made of through components, in any layer.
+
+    'glyphs' maps glyph names to glyph data, or is a LazyGlyphs list, of
+    which only the glyphs in the closure are parsed. Components of glyphs which are not
+    in 'glyphs' are left out.
+    """
+
+    closure = set()
+    stack = []
+    for name in glyph_names:
+        if name in glyphs and name not in closure:
+            closure.add(name)
+            stack.append(name)
+    while stack:
+        for layer in glyphs[stack.pop()].get('layers', []):
+            for component in layer.get('components', []):
+                name = component['name']
+                if name in glyphs and name not in closure:
+                    closure.add(name)
+                    stack.append(name)
+    return closure
+
+
+def subset_data(data, glyph_names):
+    """Return a copy of .glyphs data which only has the glyphs in
+    glyph_names and the glyphs they are made of through components.
+
+    Glyphs of the subset are in source order. Kerning pairs with glyphs or
+    classes which are not in the subset, and glyphs not in the subset from
+    the glyphOrder custom parameter, are left out; kerning groups and GDEF
+    categories come from the glyphs, so they are subset as well. Feature
+    code is kept as is. The data is only read, never modified. If its
+    'glyphs' entry is a LazyGlyphs list (see load_lazy), only the glyphs
+    of the subset are parsed.
+    """
+
+    with span('subset') as stage:
+        glyphs = data['glyphs']
+        if isinstance(glyphs, LazyGlyphs):
+            names = glyphs.names()
+        else:
+            glyphs = collections.OrderedDict(
+                (glyph['glyphname'], glyph) for glyph in glyphs)
+            names = list(glyphs)
+        missing = [name for name in glyph_names if name not in glyphs]
+        if missing:
+            logger.warning('Glyphs not found in the font: %s',
+                           ', '.join(missing))
+        closure = component_closure(glyphs, glyph_names)
+        logger.info('Subsetting %d of %d glyphs', len(closure), len(glyphs))
+        stage.count = len(closure)
+        subset_glyphs = [glyphs[name] for name in names if name in closure]
+
+    subset = collections.OrderedDict(data)
+    subset['glyphs'] = subset_glyphs
+    if 'kerning' in data:
+        subset['kerning'] = _subset_kerning(data['kerning'], subset['glyphs'])
+    if 'customParameters' in data:
+        subset['customParameters'] = [
+            _subset_glyph_order(param, closure)
+            for param in data['customParameters']]
+    return subset
+
+
+def _subset_kerning(kerning, glyphs):
+    """Return the kerning of each master without the pairs of glyphs and
+    classes which are not in 'glyphs'.
+    """
+
+    left_names = {glyph['glyphname'] for glyph in glyphs}
+    right_names = set(left_names)
+    for glyph in glyphs:
+        if 'rightKerningGroup' in glyph:
+            left_names.add('@MMK_L_' + glyph['rightKerningGroup'])
+        if 'leftKerningGroup' in glyph:
+            right_names.add('@MMK_R_' + glyph['leftKerningGroup'])
+
+    result = collections.OrderedDict()
+    for master_id, master_kerning in kerning.items():
+        pairs = result[master_id] = collections.OrderedDict()
+        for left, values in master_kerning.items():
+            if left not in left_names:
+                continue
+            left_pairs = collections.OrderedDict(
+                (right, value) for right, value in values.items()
+                if right in right_names)
+            if left_pairs:
+                pairs[left] = left_pairs
+    return result
+
+
+def _subset_glyph_order(param, glyph_names):
+    if param.get('name') != 'glyphOrder':
+        return param
+    param = collections.OrderedDict(param)
+    param['value'] = [name for name in param['value'] if name in glyph_names]
+    return param
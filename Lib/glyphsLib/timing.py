@@ -0,0 +1,331 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+
+import collections
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import pstats
+import time
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+__all__ = [
+    'Timings', 'Span', 'Allocation', 'span',
+]
+
+logger = logging.getLogger(__name__)
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:  # python 2
+    _cpu_time = time.clock
+
+try:
+    _wall_time = time.perf_counter
+except AttributeError:  # python 2
+    _wall_time = time.time
+
+# the Timings recording spans, innermost last
+_active = []
+
+
+class Span(object):
+    """A stage of a build: its name, its wall and CPU times in seconds, and
+    the number of items it processed, such as glyphs or kerning pairs, or
+    None if it doesn't apply. The count may be set while the stage runs.
+
+    When memory is traced, memory_start, memory_end and memory_peak are the
+    traced memory in bytes at the start and end of the stage and at its
+    peak, and top_allocations lists the sites which allocated the most
+    memory that was still held at the end of the stage, as Allocation
+    tuples.
+    """
+
+    def __init__(self, name, count=None):
+        self.name = name
+        self.count = count
+        self.wall = None
+        self.cpu = None
+        self.memory_start = None
+        self.memory_end = None
+        self.memory_peak = None
+        self.top_allocations = None
+
+    def as_dict(self):
+        result = collections.OrderedDict((
+            ('name', self.name), ('wall', self.wall), ('cpu', self.cpu),
+            ('count', self.count)))
+        if self.memory_start is not None:
+            result['memory_start'] = self.memory_start
+            result['memory_end'] = self.memory_end
+            result['memory_peak'] = self.memory_peak
+        if self.top_allocations is not None:
+            result['top_allocations'] = [
+                collections.OrderedDict(zip(Allocation._fields, allocation))
+                for allocation in self.top_allocations]
+        return result
+
+    def __repr__(self):
+        return '<Span %s wall=%r cpu=%r count=%r>' % (
+            self.name, self.wall, self.cpu, self.count)
+
+
+# a site which allocated memory during a stage: the file name and line
+# number, and the size in bytes and number of the memory blocks it allocated
+Allocation = collections.namedtuple(
+    'Allocation', ['filename', 'lineno', 'size', 'count'])
+
+
+class Timings(object):
+    """Record the stages of the builds run while it is active, as a context
+    manager, e.g. of load_to_ufos, build_masters or build_instances:
+
+        with Timings(memory=True) as timings:
+            glyphsLib.build_masters('MyFont.glyphs', 'master_ufo')
+        print(timings.report())
+
+    The stages are timed by the span function. Each finished Span is added
+    to 'spans', and passed to 'callback' if given. If 'profile' is true,
+    each stage also runs under cProfile, and the statistics of all the runs
+    of a stage are gathered in 'profiles', a dictionary from stage names to
+    pstats.Stats; stages within a profiled stage are profiled as part of it.
+
+    If 'memory' is true, Python memory allocations are traced with
+    tracemalloc while the Timings is active, keeping 'frames' frames of
+    traceback for each, and the memory of each stage is recorded in its
+    Span, with its 'top' allocation sites (none if top is 0). Tracing
+    memory, and taking the snapshots needed for the allocation sites, makes
+    builds much slower and bigger, so times are not meaningful then.
+
+    Stages run in worker processes, when building with several workers,
+    are not recorded.
+    """
+
+    def __init__(self, callback=None, profile=False, memory=False, top=10,
+                 frames=1):
+        if memory and tracemalloc is None:
+            raise ValueError(
+                'Tracing memory requires tracemalloc (Python 3.4 or later)')
+        self.callback = callback
+        self.profile = profile
+        self.memory = memory
+        self.top = top
+        self.frames = frames
+        self.spans = []
+        self.profiles = {}
+        self._profiler = None
+        self._started_tracing = False
+        # the peak memory of the running stages, innermost last
+        self._peaks = []
+        # the allocation sites of the last snapshot
+        self._sites = None
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        _active.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active.remove(self)
+        self._sites = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def span(self, name, count=None):
+        """Time a stage, and yield its Span."""
+
+        span = Span(name, count)
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            start_sites = self._start_memory(span)
+        profiler = None
+        if self.profile and self._profiler is None:
+            profiler = self._profiler = cProfile.Profile()
+        start_wall, start_cpu = _wall_time(), _cpu_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield span
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiler = None
+            span.wall = _wall_time() - start_wall
+            span.cpu = _cpu_time() - start_cpu
+            if memory:
+                self._end_memory(span, start_sites)
+            self.spans.append(span)
+            if profiler is not None:
+                self._add_profile(name, profiler)
+            if self.callback is not None:
+                self.callback(span)
+
+    # The peak traced memory is reset at the start and end of each stage, and
+    # the peak of a stage is passed on to the stage it is part of. Snapshots,
+    # which are traced too, are taken between the peaks and reduced to the
+    # memory held by each site right away, so that they count as little as
+    # possible. They are slow to take, so a stage starts from the sites of
+    # the previous snapshot, and memory allocated between two stages is
+    # counted in the allocation sites of the second one.
+
+    def _start_memory(self, span):
+        if self._peaks:
+            self._peaks[-1] = max(
+                self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        sites = None
+        if self.top:
+            if self._sites is None:
+                self._sites = _allocation_sites()
+            sites = self._sites
+        span.memory_start = tracemalloc.get_traced_memory()[0]
+        _reset_peak()
+        self._peaks.append(0)
+        return sites
+
+    def _end_memory(self, span, start_sites):
+        span.memory_end, peak = tracemalloc.get_traced_memory()
+        span.memory_peak = max(self._peaks.pop(), peak)
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], span.memory_peak)
+        if start_sites is not None:
+            self._sites = _allocation_sites()
+            span.top_allocations = _top_allocations(
+                self._sites, start_sites, self.top)
+        _reset_peak()
+
+    def _add_profile(self, name, profiler):
+        stats = self.profiles.get(name)
+        if stats is None:
+            self.profiles[name] = pstats.Stats(profiler)
+        else:
+            stats.add(profiler)
+
+    def totals(self):
+        """Return an ordered dictionary from stage names, in the order they
+        first ran, to dictionaries of their number of runs and total wall
+        time, CPU time and count, and when memory is traced, their highest
+        peak memory.
+        """
+
+        totals = collections.OrderedDict()
+        for span in self.spans:
+            total = totals.get(span.name)
+            if total is None:
+                total = totals[span.name] = collections.OrderedDict((
+                    ('calls', 0), ('wall', 0.0), ('cpu', 0.0),
+                    ('count', None)))
+            total['calls'] += 1
+            total['wall'] += span.wall
+            total['cpu'] += span.cpu
+            if span.count is not None:
+                total['count'] = (total['count'] or 0) + span.count
+            if span.memory_peak is not None:
+                total['memory_peak'] = max(
+                    total.get('memory_peak', 0), span.memory_peak)
+        return totals
+
+    def report(self):
+        """Return the spans and their totals as a JSON string."""
+
+        return json.dumps(collections.OrderedDict((
+            ('spans', [span.as_dict() for span in self.spans]),
+            ('totals', self.totals()))), indent=2)
+
+    def write_report(self, path):
+        """Write the JSON report to path."""
+
+        with open(path, 'wb') as fp:
+            fp.write(self.report().encode('utf-8'))
+
+    def dump_profiles(self, directory):
+        """Write the profile of each stage to <stage>.prof in directory, to
+        be read with pstats, and return their paths.
+        """
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        paths = []
+        for name, stats in sorted(self.profiles.items()):
+            path = os.path.join(directory, name + '.prof')
+            stats.dump_stats(path)
+            paths.append(path)
+        return paths
+
+
+def _reset_peak():
+    # before python 3.9, peaks are those since the tracing started
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+_IGNORED_FILES = (
+    tracemalloc and tracemalloc.__file__, __file__,
+    '<frozen importlib._bootstrap>', '<unknown>')
+
+
+def _allocation_sites():
+    """Return a dictionary from the (filename, lineno) sites which hold
+    traced memory to the size and number of their memory blocks.
+    """
+
+    sites = {}
+    # filtering the statistics is much faster than filtering the snapshot
+    for stat in tracemalloc.take_snapshot().statistics('lineno'):
+        frame = stat.traceback[0]
+        if frame.filename not in _IGNORED_FILES:
+            sites[frame.filename, frame.lineno] = (stat.size, stat.count)
+    return sites
+
+
+def _top_allocations(sites, start_sites, top):
+    """Return the 'top' Allocations of the sites whose memory grew the most
+    since start_sites.
+    """
+
+    allocations = []
+    for (filename, lineno), (size, count) in sites.items():
+        start_size, start_count = start_sites.get((filename, lineno), (0, 0))
+        if size > start_size:
+            allocations.append(Allocation(
+                filename, lineno, size - start_size, count - start_count))
+    allocations.sort(key=lambda a: (-a.size, a.filename, a.lineno))
+    return allocations[:top]
+
+
+@contextlib.contextmanager
+def span(name, count=None):
+    """Time a stage of a build with the active Timings, if any, and yield
+    its Span, whose count may be set inside the block.
+    """
+
+    if not _active:
+        yield Span(name, count)
+        return
+    with _active[-1].span(name, count) as span:
+        yield span
@@ -0,0 +1,237 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+
+import weakref
+
+try:
+    from fontTools.ufoLib import UFOWriter, fontInfoAttributesVersion3
+except ImportError:  # fonttools < 3.34, with the ufoLib package of defcon
+    from ufoLib import UFOWriter, fontInfoAttributesVersion3
+
+__all__ = [
+    'Font', 'Glyph', 'Anchor', 'Component',
+]
+
+DEFAULT_LAYER_NAME = 'public.default'
+
+
+class Font(object):
+    """A font to build and write a master UFO with, instead of defcon.Font.
+
+    It only supports what the builder uses, has no notifications or undo,
+    and is written with ufoLib exactly like defcon writes a new font, so
+    that the UFOs are identical.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.info = Info()
+        self.lib = {}
+        self.groups = {}
+        self.kerning = {}
+        self.features = Features()
+        self._glyphs = {}
+
+    def newGlyph(self, name):
+        glyph = Glyph(name, self)
+        self._glyphs[name] = glyph
+        return glyph
+
+    def keys(self):
+        return self._glyphs.keys()
+
+    def __getitem__(self, name):
+        return self._glyphs[name]
+
+    def __contains__(self, name):
+        return name in self._glyphs
+
+    def __iter__(self):
+        return iter(list(self._glyphs.values()))
+
+    def __len__(self):
+        return len(self._glyphs)
+
+    def save(self, path):
+        """Write the font to a new UFO 3 at path."""
+
+        writer = UFOWriter(path, formatVersion=3)
+        write_font_data(writer, self)
+        glyph_set = writer.getGlyphSet(DEFAULT_LAYER_NAME, defaultLayer=True)
+        for name, glyph in sorted(self._glyphs.items()):
+            glyph_set.writeGlyph(name, glyph, glyph.drawPoints)
+        glyph_set.writeContents()
+        writer.writeLayerContents([DEFAULT_LAYER_NAME])
+        close_writer(writer)
+        self.path = path
+
+
+def close_writer(writer):
+    """Close a UFOWriter, and set the modification time of its UFO."""
+
+    # the writers of the ufoLib package before 2.3 hold nothing to close
+    close = getattr(writer, 'close', None)
+    if close is not None:
+        close()
+    writer.setModificationTime()
+
+
+def write_font_data(writer, font):
+    """Write the info, groups, kerning, lib and features of a font with a
+    UFOWriter. When the UFO already exists, ufoLib leaves the files whose
+    content is the same untouched.
+    """
+
+    writer.writeInfo(font.info)
+    writer.writeGroups(font.groups)
+    writer.writeKerning(font.kerning)
+    writer.writeLib(dict(font.lib))
+    if font.features.text is not None:
+        writer.writeFeatures(font.features.text)
+
+
+class Info(object):
+    """Font info, with one attribute per fontinfo.plist key."""
+
+    # defcon initializes these to empty lists, which are written as such
+    _LIST_ATTRIBUTES = (
+        'guidelines', 'postscriptBlueValues', 'postscriptOtherBlues',
+        'postscriptFamilyBlues', 'postscriptFamilyOtherBlues',
+        'postscriptStemSnapH', 'postscriptStemSnapV')
+
+    def __init__(self):
+        for attr in fontInfoAttributesVersion3:
+            setattr(self, attr, None)
+        for attr in self._LIST_ATTRIBUTES:
+            setattr(self, attr, [])
+
+
+class Features(object):
+
+    def __init__(self):
+        self.text = None
+
+
+class Anchor(dict):
+    """An anchor of a Glyph: a dictionary with 'x', 'y' and 'name' keys,
+    which are also available as attributes.
+    """
+
+    def __init__(self, anchorDict=None):
+        super(Anchor, self).__init__()
+        if anchorDict is not None:
+            for key in ('x', 'y', 'name'):
+                if anchorDict.get(key) is not None:
+                    self[key] = anchorDict[key]
+
+    @property
+    def x(self):
+        return self.get('x')
+
+    @property
+    def y(self):
+        return self.get('y')
+
+    @property
+    def name(self):
+        return self.get('name')
+
+
+class Glyph(object):
+    """A glyph of a Font. Its outline is recorded from its point pen and
+    played back by drawPoints.
+    """
+
+    def __init__(self, name, font):
+        self.name = name
+        self._font = weakref.ref(font)
+        self.width = 0
+        self.height = 0
+        self.unicodes = []
+        self.note = None
+        self.image = None
+        self.guidelines = []
+        self.anchors = []
+        self.components = []
+        self.lib = {}
+        self._contours = []
+
+    anchorClass = Anchor
+
+    @property
+    def font(self):
+        return self._font()
+
+    @property
+    def unicode(self):
+        return self.unicodes[0] if self.unicodes else None
+
+    @unicode.setter
+    def unicode(self, value):
+        self.unicodes = [] if value is None else [value]
+
+    def appendAnchor(self, anchor):
+        if not isinstance(anchor, Anchor):
+            anchor = Anchor(anchorDict=anchor)
+        self.anchors.append(anchor)
+
+    def getPointPen(self):
+        return _GlyphPointPen(self)
+
+    def drawPoints(self, pointPen):
+        for contour in self._contours:
+            pointPen.beginPath()
+            for pt, segment_type, smooth in contour:
+                pointPen.addPoint(pt, segmentType=segment_type, smooth=smooth)
+            pointPen.endPath()
+        for component in self.components:
+            pointPen.addComponent(
+                component.baseGlyph, component.transformation)
+
+
+class Component(object):
+
+    def __init__(self, baseGlyph, transformation):
+        self.baseGlyph = baseGlyph
+        self.transformation = tuple(transformation)
+
+
+class _GlyphPointPen(object):
+    """Point pen which adds contours and components to a Glyph."""
+
+    def __init__(self, glyph):
+        self._glyph = glyph
+        self._contour = None
+
+    def beginPath(self, identifier=None, **kwargs):
+        self._contour = []
+
+    def endPath(self):
+        self._glyph._contours.append(self._contour)
+        self._contour = None
+
+    def addPoint(self, pt, segmentType=None, smooth=False, name=None,
+                 identifier=None, **kwargs):
+        self._contour.append((tuple(pt), segmentType, bool(smooth)))
+
+    def addComponent(self, baseGlyphName, transformation, identifier=None,
+                     **kwargs):
+        self._glyph.components.append(
+            Component(baseGlyphName, transformation))
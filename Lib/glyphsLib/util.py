@@ -13,11 +13,14 @@
 # limitations under the License.
 
 
+import collections
 import logging
 import os
 import shutil
 from fontTools.misc.textTools import num2binary
 
+from glyphsLib.timing import span
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,14 +34,16 @@ def build_ufo_path(out_dir, family_name, style_name):
 
 
 def write_ufo(ufo, out_dir):
-    """Write a UFO."""
+    """Write a UFO, and return its path."""
 
     out_path = build_ufo_path(
         out_dir, ufo.info.familyName, ufo.info.styleName)
 
     logger.info('Writing %s' % out_path)
-    clean_ufo(out_path)
-    ufo.save(out_path)
+    with span('write', len(ufo)):
+        clean_ufo(out_path)
+        ufo.save(out_path)
+    return out_path
 
 
 def clean_ufo(path):
@@ -71,6 +76,128 @@ def clear_data(data):
     return True
 
 
+class _TrackedDict(collections.OrderedDict):
+    """Ordered dictionary which records which of its keys were read."""
+
+    def __init__(self, *args, **kwargs):
+        self.used = set()
+        super(_TrackedDict, self).__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        value = super(_TrackedDict, self).__getitem__(key)
+        self.used.add(key)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            self.used.add(key)
+        return super(_TrackedDict, self).pop(key, *default)
+
+    def items(self):
+        self.used.update(self.keys())
+        return super(_TrackedDict, self).items()
+
+    def values(self):
+        self.used.update(self.keys())
+        return super(_TrackedDict, self).values()
+
+
+class _TrackedList(list):
+    """List which records which of its items were read."""
+
+    def __init__(self, *args):
+        self.used = set()
+        super(_TrackedList, self).__init__(*args)
+
+    def __getitem__(self, index):
+        value = super(_TrackedList, self).__getitem__(index)
+        if isinstance(index, slice):
+            self.used.update(range(*index.indices(len(self))))
+        else:
+            self.used.add(index % len(self))
+        return value
+
+    def __iter__(self):
+        self.used.update(range(len(self)))
+        return super(_TrackedList, self).__iter__()
+
+
+def track_data(data):
+    """Return a copy of data whose dictionaries and lists record which of
+    their items are read. Pass the result to unused_data afterwards.
+    """
+
+    if isinstance(data, dict):
+        return _TrackedDict((k, track_data(v)) for k, v in data.items())
+    elif isinstance(data, list):
+        return _TrackedList(track_data(v) for v in data)
+    return data
+
+
+def unused_data(data):
+    """Return the parts of data (as returned by track_data) which were never
+    read, as plain dictionaries and lists, or None if everything was read.
+
+    A dictionary or list is considered read as a whole if it was looked up
+    but none of its own items were, e.g. when it was copied into an UFO as
+    is. Empty dictionaries and lists are left out, like clear_data does.
+    """
+
+    if isinstance(data, _TrackedDict):
+        if not data.used:
+            return None
+        result = collections.OrderedDict()
+        for key, value in dict.items(data):
+            if key not in data.used:
+                value = _untracked(value)
+            elif isinstance(value, (_TrackedDict, _TrackedList)):
+                value = unused_data(value)
+            else:
+                continue
+            if value is not None:
+                result[key] = value
+        return result or None
+    elif isinstance(data, _TrackedList):
+        if not data.used:
+            return None
+        result = []
+        for index, value in enumerate(list.__iter__(data)):
+            if index not in data.used:
+                value = _untracked(value)
+            elif isinstance(value, (_TrackedDict, _TrackedList)):
+                value = unused_data(value)
+            else:
+                continue
+            if value is not None:
+                result.append(value)
+        return result or None
+    return None
+
+
+def _untracked(data):
+    """Return a plain copy of tracked data, or None if it is an empty
+    dictionary or list.
+    """
+
+    if isinstance(data, dict):
+        result = collections.OrderedDict()
+        for key, value in dict.items(data):
+            value = _untracked(value)
+            if value is not None:
+                result[key] = value
+        return result or None
+    elif isinstance(data, list):
+        result = [v for v in map(_untracked, list.__iter__(data))
+                  if v is not None]
+        return result or None
+    return data
+
+
 def cast_to_number_or_bool(inputstr):
     """Cast a string to int, float or bool. Return original string if it can't be
     converted.
@@ -0,0 +1,119 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time builder.load_glyph and builder.load_kerning on defcon fonts, with
+their notifications posted, as before, and disabled, as build_master does.
+Usage:
+
+    python MetaTools/benchmark_builder.py [NUM_GLYPHS] [NUM_PAIRS]
+
+The glyphs are those of one master of a synthetic source of NUM_GLYPHS
+glyphs (default 5000), and the kerning is made of NUM_PAIRS random glyph
+and class pairs (default 50000).
+"""
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+from fontTools.misc.py23 import *
+
+import collections
+import contextlib
+import random
+import sys
+import time
+
+import glyphsLib
+from glyphsLib import builder
+from synthetic_font import synthetic_glyphs_source
+
+
+@contextlib.contextmanager
+def notifications_posted(ufo):
+    yield
+
+
+def base_font(data):
+    return next(builder.generate_base_fonts(data, data['familyName']))
+
+
+def load_glyphs(data, layers, family, context):
+    ufo = base_font(data)
+    start = time.time()
+    with context(ufo):
+        for glyph_name, layer, glyph_data in layers:
+            glyph = ufo.newGlyph(glyph_name)
+            builder.load_glyph(glyph, layer, glyph_data,
+                               family.categories[glyph_name])
+    return time.time() - start
+
+
+def load_kerning(data, kerning, family, context):
+    ufo = base_font(data)
+    builder.add_groups_to_ufo(ufo, family.kerning_groups)
+    start = time.time()
+    with context(ufo):
+        builder.load_kerning(ufo, kerning, family.group_index)
+    return time.time() - start
+
+
+def random_kerning(glyph_names, kerning_groups, num_pairs, seed=0):
+    """Return .glyphs kerning data of num_pairs pairs, a tenth of which
+    are class pairs.
+    """
+
+    rng = random.Random(seed)
+    left_classes = ['@MMK_L_' + name[len('public.kern1.'):]
+                    for name in kerning_groups
+                    if name.startswith('public.kern1.')]
+    right_classes = ['@MMK_R_' + name[len('public.kern2.'):]
+                     for name in kerning_groups
+                     if name.startswith('public.kern2.')]
+    kerning = collections.OrderedDict()
+    for i in range(num_pairs):
+        if i % 10 == 0 and left_classes and right_classes:
+            left, right = rng.choice(left_classes), rng.choice(right_classes)
+        else:
+            left, right = rng.choice(glyph_names), rng.choice(glyph_names)
+        kerning.setdefault(left, collections.OrderedDict())[right] = \
+            rng.randint(-100, 50)
+    return kerning
+
+
+def main(args):
+    num_glyphs = int(args[0]) if args else 5000
+    num_pairs = int(args[1]) if len(args) > 1 else 50000
+
+    data = glyphsLib.loads(synthetic_glyphs_source(num_glyphs, 1))
+    glyph_names, kerning_groups, master_layers, _ = \
+        builder.load_master_layers(data)
+    family = builder.FamilyData(
+        glyph_names, master_layers, builder.load_features(data),
+        kerning_groups)
+    layers = master_layers[data['fontMaster'][0]['id']]
+    kerning = random_kerning(glyph_names, kerning_groups, num_pairs)
+
+    for name, fn, arg in (('load_glyph', load_glyphs, layers),
+                          ('load_kerning', load_kerning, kerning)):
+        before = min(fn(data, arg, family, notifications_posted)
+                     for _ in range(3))
+        after = min(fn(data, arg, family, builder.notifications_disabled)
+                    for _ in range(3))
+        print('%-14s notifications posted %7.3f s  disabled %7.3f s  '
+              '(%.2fx)' % (name, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,99 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare casting.cast_data and casting.uncast_data, which run converters
+compiled from the type structure, with the previous interpreter, which
+walked the type structure for every dictionary. Usage:
+
+    python MetaTools/benchmark_casting.py [NUM_GLYPHS] [NUM_MASTERS] [FILE...]
+
+If .glyphs files are given they are benchmarked too, in addition to a
+synthetic source of NUM_GLYPHS glyphs (default 5000) and NUM_MASTERS masters
+(default 2).
+"""
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+from fontTools.misc.py23 import *
+
+import copy
+import io
+import sys
+import timeit
+
+from glyphsLib import casting
+from glyphsLib.parser import Parser
+from synthetic_font import synthetic_glyphs_source
+
+
+def legacy_convert_data(data, to_typed, types=casting._TYPE_STRUCTURE):
+    """The type structure interpreter which the compiled converters
+    replaced, kept as reference.
+    """
+
+    for key, cur_type in types.items():
+        if key not in data:
+            continue
+        if isinstance(cur_type, dict):
+            for cur_data in data[key]:
+                legacy_convert_data(cur_data, to_typed, cur_type)
+        elif isinstance(cur_type, casting.RWBackground):
+            legacy_convert_data(data[key], to_typed,
+                                casting._BACKGROUND_TYPE_STRUCTURE)
+        else:
+            data[key] = cur_type.convert(data[key], to_typed)
+
+
+def best_time(fn, data, repeat=5):
+    """Return the best time of fn on fresh copies of data, in seconds."""
+
+    times = []
+    for _ in range(repeat):
+        data_copy = copy.deepcopy(data)
+        times.append(timeit.timeit(lambda: fn(data_copy), number=1))
+    return min(times)
+
+
+def benchmark(name, text):
+    parsed = Parser().parse(text)
+    cast, legacy_cast = copy.deepcopy(parsed), copy.deepcopy(parsed)
+    casting.cast_data(cast)
+    legacy_convert_data(legacy_cast, True)
+    if cast != legacy_cast:
+        raise AssertionError('casting differs on %s' % name)
+
+    old_cast = best_time(lambda data: legacy_convert_data(data, True), parsed)
+    new_cast = best_time(casting.cast_data, parsed)
+    old_uncast = best_time(lambda data: legacy_convert_data(data, False), cast)
+    new_uncast = best_time(casting.uncast_data, cast)
+    print('%-40s cast: legacy %6.3f s  new %6.3f s  (%.2fx)  '
+          'uncast: legacy %6.3f s  new %6.3f s  (%.2fx)' % (
+              name, old_cast, new_cast, old_cast / new_cast,
+              old_uncast, new_uncast, old_uncast / new_uncast))
+
+
+def main(args):
+    num_glyphs = int(args[0]) if args else 5000
+    num_masters = int(args[1]) if len(args) > 1 else 2
+    benchmark('synthetic (%d glyphs, %d masters)' % (num_glyphs, num_masters),
+              synthetic_glyphs_source(num_glyphs, num_masters))
+    for path in args[2:]:
+        with io.open(path, 'r', encoding='utf-8') as fp:
+            benchmark(path, fp.read())
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,151 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure decoding of nodes, points and transforms by glyphsLib.casting.
+
+Compares the bulk decoders of RWNodeList, RWPointList and RWVector with the
+previous decoders, which ran a regex per node or vector. The corpus is the
+nodes, anchor positions and component transforms of a synthetic font, or of
+the given .glyphs files. Usage:
+
+    python MetaTools/benchmark_nodes.py [NUM_GLYPHS] [FILE...]
+
+The bulk decoders cache the values of number strings; times are given with
+the cache cleared before each run ("cold") and kept between runs ("warm").
+"""
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+from fontTools.misc.py23 import *
+
+import io
+import re
+import sys
+import timeit
+
+from glyphsLib import casting
+from glyphsLib.parser import Parser
+from synthetic_font import synthetic_font
+
+
+def legacy_read_num(src):
+    float_val = float(src)
+    return int(float_val) if float_val.is_integer() else float_val
+
+
+_legacy_node_regex = re.compile(
+    r'([-.e\d]+) ([-.e\d]+) (LINE|CURVE|QCURVE|OFFCURVE|n/a)(?: (SMOOTH))?')
+_legacy_vector_regexes = {
+    dimension: re.compile('{%s}' % ', '.join([r'([-.e\d]+)'] * dimension))
+    for dimension in (2, 6)}
+
+
+def legacy_read_nodes(src):
+    """The regex-per-node decoder which RWNodeList replaced."""
+
+    nodes = []
+    for value in src:
+        x, y, node_type, smooth = _legacy_node_regex.match(value).groups()
+        nodes.append([legacy_read_num(x), legacy_read_num(y),
+                      node_type.lower(), bool(smooth)])
+    return nodes
+
+
+def legacy_read_vector(src, dimension):
+    """The regex decoder which RWVector replaced."""
+
+    return [legacy_read_num(i) for i in
+            _legacy_vector_regexes[dimension].match(src).groups()]
+
+
+def collect_corpus(font):
+    """Return the node lists, points and transforms of uncast font data."""
+
+    nodes, points, transforms = [], [], []
+    for glyph in font['glyphs']:
+        for layer in glyph['layers']:
+            nodes.extend(path['nodes'] for path in layer.get('paths', []))
+            points.extend(anchor['position']
+                          for anchor in layer.get('anchors', []))
+            transforms.extend(component['transform']
+                              for component in layer.get('components', []))
+    return nodes, points, transforms
+
+
+def best_time(fn, cold, repeat=5):
+    times = []
+    for _ in range(repeat):
+        if cold:
+            casting._number_cache.clear()
+        times.append(timeit.timeit(fn, number=1))
+    return min(times)
+
+
+def check(actual, expected):
+    if actual != expected or [
+            [type(v) for v in item] for item in actual] != [
+                [type(v) for v in item] for item in expected]:
+        raise AssertionError('bulk and legacy decoders disagree')
+
+
+def benchmark(name, font):
+    nodes, points, transforms = collect_corpus(font)
+    num_nodes = sum(len(n) for n in nodes)
+    for node_list in nodes:
+        check(casting.nodelist.read(list(node_list)),
+              legacy_read_nodes(node_list))
+    check([casting.point.read(p) for p in points],
+          [legacy_read_vector(p, 2) for p in points])
+    check([casting.transform.read(t) for t in transforms],
+          [legacy_read_vector(t, 6) for t in transforms])
+
+    cases = [
+        ('nodes', num_nodes,
+         lambda: [legacy_read_nodes(n) for n in nodes],
+         lambda: [casting.nodelist.read(list(n)) for n in nodes]),
+        ('compact nodes', num_nodes,
+         lambda: [legacy_read_nodes(n) for n in nodes],
+         lambda: [casting.compact_nodelist.read(n) for n in nodes]),
+        ('points', len(points),
+         lambda: [legacy_read_vector(p, 2) for p in points],
+         lambda: [casting.point.read(p) for p in points]),
+        ('transforms', len(transforms),
+         lambda: [legacy_read_vector(t, 6) for t in transforms],
+         lambda: [casting.transform.read(t) for t in transforms]),
+    ]
+    print(name)
+    for case, count, legacy, bulk in cases:
+        if not count:
+            continue
+        old = best_time(legacy, cold=False)
+        cold = best_time(bulk, cold=True)
+        warm = best_time(bulk, cold=False)
+        print('  %-14s %8d  legacy %6.0f ns  cold %6.0f ns (%.2fx)  '
+              'warm %6.0f ns (%.2fx)' % (
+                  case, count, 1e9 * old / count, 1e9 * cold / count,
+                  old / cold, 1e9 * warm / count, old / warm))
+
+
+def main(args):
+    num_glyphs = int(args[0]) if args else 2000
+    benchmark('synthetic (%d glyphs)' % num_glyphs, synthetic_font(num_glyphs))
+    for path in args[1:]:
+        with io.open(path, 'r', encoding='utf-8') as fp:
+            benchmark(path, Parser().parse(fp.read()))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,145 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure .glyphs parsing throughput in MB/s.
+
+Compares glyphsLib.parser.Parser, and the streaming parser
+glyphsLib.parser.iterparse, with the previous parser, which ran one regex
+per token class. Usage:
+
+    python MetaTools/benchmark_parser.py [NUM_GLYPHS] [NUM_MASTERS] [FILE...]
+
+If .glyphs files are given they are benchmarked too, in addition to a
+synthetic source of NUM_GLYPHS glyphs (default 5000) and NUM_MASTERS masters
+(default 2).
+"""
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+from fontTools.misc.py23 import *
+
+import collections
+import io
+import re
+import sys
+import timeit
+
+from glyphsLib.parser import Parser, iterparse, build_tree
+from synthetic_font import synthetic_glyphs_source
+
+
+class LegacyParser(object):
+    """The regex-per-token parser that Parser replaced, kept as reference."""
+
+    def __init__(self):
+        value_re = r'(".*?(?<!\\)"|[-_./$A-Za-z0-9]+)'
+        self.start_dict_re = re.compile(r'\s*{')
+        self.end_dict_re = re.compile(r'\s*}')
+        self.dict_delim_re = re.compile(r'\s*;')
+        self.start_list_re = re.compile(r'\s*\(')
+        self.end_list_re = re.compile(r'\s*\)')
+        self.list_delim_re = re.compile(r'\s*,')
+        self.attr_re = re.compile(r'\s*%s\s*=' % value_re, re.DOTALL)
+        self.value_re = re.compile(r'\s*%s' % value_re, re.DOTALL)
+
+    def parse(self, text):
+        text = tounicode(text, encoding='utf-8')
+        result, i = self._parse(text, 0)
+        return result
+
+    def _parse(self, text, i):
+        m = self.start_dict_re.match(text, i)
+        if m:
+            return self._parse_dict(text, i + len(m.group(0)))
+        m = self.start_list_re.match(text, i)
+        if m:
+            return self._parse_list(text, i + len(m.group(0)))
+        m = self.value_re.match(text, i)
+        if m:
+            return self._trim_value(m.group(1)), m.end()
+        raise ValueError('Unexpected content')
+
+    def _parse_dict(self, text, i):
+        res = collections.OrderedDict()
+        end_match = self.end_dict_re.match(text, i)
+        while not end_match:
+            m = self.attr_re.match(text, i)
+            i += len(m.group(0))
+            name = self._trim_value(m.group(1))
+            res[name], i = self._parse(text, i)
+            m = self.dict_delim_re.match(text, i)
+            i += len(m.group(0))
+            end_match = self.end_dict_re.match(text, i)
+        return res, i + len(end_match.group(0))
+
+    def _parse_list(self, text, i):
+        res = []
+        end_match = self.end_list_re.match(text, i)
+        while not end_match:
+            list_item, i = self._parse(text, i)
+            res.append(list_item)
+            end_match = self.end_list_re.match(text, i)
+            if not end_match:
+                m = self.list_delim_re.match(text, i)
+                i += len(m.group(0))
+        return res, i + len(end_match.group(0))
+
+    def _trim_value(self, value):
+        if value[0] == '"':
+            value = value[1:-1]
+        return Parser()._unescape(value)
+
+
+class StreamingParser(object):
+    """Adapts iterparse to the Parser interface."""
+
+    def parse(self, text):
+        return build_tree(iterparse(io.StringIO(text)))
+
+
+def throughput(parser, text, repeat=3):
+    """Return the best parsing throughput of `parser` on `text` in MB/s."""
+
+    megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+    seconds = min(timeit.repeat(
+        lambda: parser.parse(text), number=1, repeat=repeat))
+    return megabytes / seconds
+
+
+def benchmark(name, text):
+    if LegacyParser().parse(text) != Parser().parse(text):
+        raise AssertionError('parsers disagree on %s' % name)
+    old = throughput(LegacyParser(), text)
+    new = throughput(Parser(), text)
+    streaming = throughput(StreamingParser(), text)
+    print('%-40s %8.2f MB  legacy %6.2f MB/s  new %6.2f MB/s  (%.2fx)  '
+          'streaming %6.2f MB/s  (%.2fx)' % (
+              name, len(text.encode('utf-8')) / (1024 * 1024), old, new,
+              new / old, streaming, streaming / old))
+
+
+def main(args):
+    num_glyphs = int(args[0]) if args else 5000
+    num_masters = int(args[1]) if len(args) > 1 else 2
+    benchmark('synthetic (%d glyphs, %d masters)' % (num_glyphs, num_masters),
+              synthetic_glyphs_source(num_glyphs, num_masters))
+    for path in args[2:]:
+        with io.open(path, 'r', encoding='utf-8') as fp:
+            benchmark(path, fp.read())
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
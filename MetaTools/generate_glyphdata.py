@@ -22,12 +22,15 @@ from fontTools.misc.py23 import *
 import io
 import fontTools.agl
 import json
+import sys
 import urllib
 import textwrap
 import xml.etree.ElementTree as etree
 
 from collections import Counter, defaultdict, namedtuple
-from glyphsLib.glyphdata import get_glyph, _get_unicode_category, _get_category
+from glyphsLib.glyphdata import (
+    get_glyph, _get_unicode_category, _get_category, GlyphTable,
+    write_glyph_table)
 
 
 # Data tables which we put into the generated Python file.
@@ -242,11 +245,42 @@ def generate_python_source(data, out):
         out.write('\t"%s": %s,\n' % (glyphName, glyphsCat))
     out.write("}\n\n")
 
-    
+
+def generate_binary_table(data, path, names=None):
+    """Writes the binary table that glyphsLib.glyphdata reads, with reverse
+    indexes for the given glyph names, and checks that it holds the same
+    data.
+    """
+    with open(path, "wb") as out:
+        write_glyph_table(data, out, names)
+    table = GlyphTable(path)
+    for attr in GlyphData._fields:
+        expected = getattr(data, attr)
+        actual = getattr(table, attr)
+        if attr == "MISSING_UNICODE_STRINGS":
+            actual, expected = set(actual), set(expected)
+        else:
+            actual, expected = dict(actual), dict(expected)
+        assert actual == expected, attr
+
+
+# Usage: python MetaTools/generate_glyphdata.py [--binary-only]
+#
+# With --binary-only, the binary table is generated from the current
+# glyphdata_generated module, without fetching the upstream data; its
+# reverse indexes then cover the glyphs of glyphdata.known_glyph_names
+# rather than all the glyphs of the upstream data.
 if __name__ == "__main__":
     outpath = "Lib/glyphsLib/glyphdata_generated.py"
-    glyphs = fetch_all_glyphs()
-    data = build_data(glyphs)
-    test_data(glyphs, data)
-    with io.open(outpath, "w", encoding="utf-8") as out:
-        generate_python_source(data, out)
+    binpath = "Lib/glyphsLib/glyphdata.bin"
+    if "--binary-only" in sys.argv[1:]:
+        from glyphsLib import glyphdata_generated
+        generate_binary_table(glyphdata_generated, binpath)
+    else:
+        glyphs = fetch_all_glyphs()
+        data = build_data(glyphs)
+        test_data(glyphs, data)
+        with io.open(outpath, "w", encoding="utf-8") as out:
+            generate_python_source(data, out)
+        generate_binary_table(data, binpath, sorted(glyphs))
+        test_data(glyphs, GlyphTable(binpath))
@@ -0,0 +1,167 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generate synthetic .glyphs sources of arbitrary size for benchmarking.
+
+The generated data is structured like real Glyphs.app output: one layer per
+master for every glyph, closed contours made of line and curve nodes, marks
+and composites with anchors, kerning groups, class and glyph kerning, and a
+few feature prefixes, classes and features.
+"""
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+from fontTools.misc.py23 import *
+
+import collections
+import io
+import random
+
+from glyphsLib.parser import Writer
+
+
+BASE_NAMES = (
+    [chr(c) for c in range(ord('A'), ord('Z') + 1)] +
+    [chr(c) for c in range(ord('a'), ord('z') + 1)])
+MARK_NAMES = ['acutecomb', 'gravecomb', 'dieresiscomb', 'dotaccentcomb']
+# master weights, so that up to this many masters get distinct style names
+WEIGHTS = ['Light', 'Bold', 'Thin', 'Black', 'Medium', 'SemiBold',
+           'ExtraBold', 'SemiLight', 'Regular']
+
+
+def _dict(*items):
+    return collections.OrderedDict(items)
+
+
+def _contour(rng, num_nodes):
+    # end with an on-curve node, as the last node starts closed contours
+    num_nodes -= num_nodes % 3
+    nodes = []
+    for i in range(num_nodes):
+        x, y = rng.randint(0, 1000), rng.randint(-200, 800)
+        if i % 3 == 2:
+            nodes.append('%d %d CURVE SMOOTH' % (x, y))
+        elif i % 3 == 1:
+            nodes.append('%d.5 %d OFFCURVE' % (x, y))
+        else:
+            nodes.append('%d %d LINE' % (x, y))
+    return _dict(('closed', '1'), ('nodes', nodes))
+
+
+def _layer(rng, master_id, name, components, anchors):
+    layer = _dict(('layerId', master_id))
+    if anchors:
+        layer['anchors'] = [
+            _dict(('name', a), ('position', '{%d, %d}' % (
+                rng.randint(0, 600), rng.randint(-100, 700))))
+            for a in anchors]
+    if components:
+        layer['components'] = [
+            _dict(('name', c), ('transform', '{1, 0, 0, 1, %d, %d}' % (
+                rng.randint(0, 100), rng.randint(0, 100))))
+            for c in components]
+    else:
+        layer['paths'] = [_contour(rng, rng.randint(8, 40))
+                          for _ in range(rng.randint(1, 4))]
+    layer['width'] = str(rng.randint(200, 1000))
+    return layer
+
+
+def synthetic_font(num_glyphs=1000, num_masters=2, seed=0):
+    """Return uncast (string-valued) .glyphs data with the given number of
+    glyphs and masters.
+    """
+
+    rng = random.Random(seed)
+    master_ids = ['MASTER-%d' % i for i in range(num_masters)]
+    font = _dict(
+        ('.appVersion', '895'),
+        ('classes', [_dict(('code', 'A B C'), ('name', 'Uppercase'))]),
+        ('copyright', 'Copyright 2017 The Synthetic Project Authors'),
+        ('date', '2017-06-01 12:00:00 +0000'),
+        ('familyName', 'Synthetic Sans'),
+        ('featurePrefixes', [_dict(
+            ('code', 'languagesystem DFLT dflt;'), ('name', 'Languages'))]),
+        ('features', [_dict(
+            ('code', 'sub a by b;'), ('name', 'liga'))]),
+        ('fontMaster', [
+            _dict(('alignmentZones', ['{800, 16}', '{0, -16}']),
+                  ('ascender', '800'),
+                  ('capHeight', '700'),
+                  ('descender', '-200'),
+                  ('id', master_id),
+                  ('weight', WEIGHTS[i % len(WEIGHTS)]),
+                  ('weightValue', str(50 + 100 * i)),
+                  ('xHeight', '500'))
+            for i, master_id in enumerate(master_ids)]),
+        ('glyphs', []),
+    )
+
+    names = []
+    for i in range(num_glyphs):
+        if i < len(BASE_NAMES):
+            name, unicode_hex = BASE_NAMES[i], '%04X' % ord(BASE_NAMES[i])
+        elif i < len(BASE_NAMES) + len(MARK_NAMES):
+            name, unicode_hex = MARK_NAMES[i - len(BASE_NAMES)], None
+        else:
+            # CJK ideographs make up the bulk of really large fonts
+            code = 0x4E00 + i
+            name, unicode_hex = 'uni%04X' % code, '%04X' % code
+        names.append(name)
+
+        glyph = _dict(('glyphname', name),
+                      ('lastChange', '2017-06-01 12:00:00 +0000'))
+        components, anchors = [], []
+        if name in MARK_NAMES:
+            anchors = ['_top', 'top']
+        elif name in BASE_NAMES:
+            anchors = ['top', 'bottom']
+            glyph['leftKerningGroup'] = name.upper()
+            glyph['rightKerningGroup'] = name.upper()
+        elif i % 10 == 0 and len(names) > 2:
+            components = [rng.choice(BASE_NAMES), rng.choice(MARK_NAMES)]
+        glyph['layers'] = [_layer(rng, master_id, name, components, anchors)
+                           for master_id in master_ids]
+        if unicode_hex is not None:
+            glyph['unicode'] = unicode_hex
+        font['glyphs'].append(glyph)
+
+    font['kerning'] = _dict(*[
+        (master_id, _dict(
+            ('@MMK_L_A', _dict(('@MMK_R_V', '-50'), ('v', '-20'))),
+            *[(left, _dict(*[(right, str(rng.randint(-100, 50)))
+                             for right in rng.sample(BASE_NAMES, 10)]))
+              for left in BASE_NAMES]))
+        for master_id in master_ids])
+    font['unitsPerEm'] = '1000'
+    font['versionMajor'] = '1'
+    font['versionMinor'] = '0'
+    return font
+
+
+def synthetic_glyphs_source(num_glyphs=1000, num_masters=2, seed=0):
+    """Return the text of a synthetic .glyphs file."""
+
+    out = io.StringIO()
+    Writer(out).write(synthetic_font(num_glyphs, num_masters, seed))
+    return out.getvalue()
+
+
+if __name__ == '__main__':
+    import sys
+    num_glyphs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    num_masters = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    sys.stdout.write(synthetic_glyphs_source(num_glyphs, num_masters))
@@ -165,6 +165,7 @@ setup(
     license="Apache Software License 2.0",
     package_dir={"": "Lib"},
     packages=find_packages("Lib"),
+    package_data={"glyphsLib": ["glyphdata.bin"]},
     entry_points={
         "console_scripts": [
             "glyphs2ufo = glyphsLib.__main__:main"
@@ -18,7 +18,13 @@
 from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
 import collections
+import copy
 import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 # unittest.mock is only available for python 3+
 from mock import patch
@@ -26,11 +32,20 @@ import mock
 
 from defcon import Font
 from fontTools.misc.loggingTools import CapturingLogHandler
+import glyphsLib
 from glyphsLib import builder
+try:
+    from glyphsLib import ufowriter
+except ImportError:  # no ufoLib
+    ufowriter = None
+from glyphsLib.anchors import propagate_font_anchors
+from glyphsLib.__main__ import parse_options
 from glyphsLib.builder import build_style_name, set_custom_params,\
-    set_redundant_data, to_ufos, GLYPHS_PREFIX, PUBLIC_PREFIX, \
+    set_redundant_data, to_ufos, iter_ufos, GLYPHS_PREFIX, PUBLIC_PREFIX, \
     GLYPHLIB_PREFIX, draw_paths, set_default_params, UFO2FT_FILTERS_KEY, \
     parse_glyphs_filter
+from glyphsLib.casting import NodeArray
+from glyphsLib.subset import subset_data
 
 
 class BuildStyleNameTest(unittest.TestCase):
@@ -389,6 +404,55 @@ class ToUfosTest(unittest.TestCase):
         # due to conflict with (a, kern2.V, 100)
         self.assertEqual(ufo.kerning['A', 'v'], -100)
 
+    def test_load_kerning_conflict_warnings(self):
+        ufo = Font()
+        ufo.info.styleName = 'Regular'
+        ufo.groups['public.kern1.A'] = ['A', 'Aacute', 'Agrave']
+        ufo.groups['public.kern2.V'] = ['V', 'W']
+        kerning_data = collections.OrderedDict((
+            ('@MMK_L_A', collections.OrderedDict((
+                ('V', -50),
+            ))),
+            ('Aacute', collections.OrderedDict((
+                ('@MMK_R_V', -20),
+            ))),
+            ('@MMK_L_X', collections.OrderedDict((
+                ('V', -5),
+            ))),
+        ))
+
+        with CapturingLogHandler(builder.logger, "WARNING") as captor:
+            builder.load_kerning(ufo, kerning_data)
+
+        self.assertEqual(dict(ufo.kerning), {
+            ('Aacute', 'public.kern2.V'): -20,
+            ('A', 'V'): -50,
+            ('Agrave', 'V'): -50,
+        })
+        captor.assertRegex('Non-existent glyph class public.kern1.X')
+        captor.assertRegex(
+            'Conflicting kerning rules found in Regular master for glyph '
+            'pair "Aacute, V"')
+        self.assertEqual(len(captor.records), 2)
+
+    def test_kerning_group_index(self):
+        index = builder.KerningGroupIndex({
+            'public.kern1.A': ['A', 'Aacute'],
+            'public.kern1.AE': ['AE', 'Aacute'],
+            'public.kern2.V': ['V'],
+            'other': ['A'],
+        })
+        self.assertEqual(index.members['public.kern1.A'], {'A', 'Aacute'})
+        self.assertEqual(index.members['other'], {'A'})
+        self.assertEqual(index.groups_of[0]['A'], ['public.kern1.A'])
+        self.assertEqual(sorted(index.groups_of[0]['Aacute']),
+                         ['public.kern1.A', 'public.kern1.AE'])
+        self.assertEqual(index.groups_of[1], {'V': ['public.kern2.V']})
+        self.assertEqual(index.overlaps, {
+            'public.kern1.A': {'public.kern1.AE'},
+            'public.kern1.AE': {'public.kern1.A'},
+        })
+
     def test_propagate_anchors(self):
         """Test anchor propagation for some relatively complicated cases."""
 
@@ -436,6 +500,24 @@ class ToUfosTest(unittest.TestCase):
                 self.assertEqual(anchor.name, 'bottom_2')
                 self.assertEqual(anchor.x, 150)
 
+    @unittest.skipIf(ufowriter is None, 'requires ufoLib')
+    def test_propagate_anchors_deep_components(self):
+        # defcon notifications recurse through component chains themselves
+        ufo = ufowriter.Font()
+        depth = sys.getrecursionlimit() * 2
+        # composites come first, so that the deepest chain is walked at once
+        for i in range(depth, 0, -1):
+            pen = ufo.newGlyph('g%d' % i).getPointPen()
+            pen.addComponent('g%d' % (i - 1), (1, 0, 0, 1, 1, 0))
+        ufo.newGlyph('g0').appendAnchor({'name': 'top', 'x': 0, 'y': 100})
+
+        propagate_font_anchors(ufo)
+
+        for i in (1, depth):
+            anchors = ufo['g%d' % i].anchors
+            self.assertEqual([(a.name, a.x, a.y) for a in anchors],
+                             [('top', i, 100)])
+
     def test_postscript_name_from_data(self):
         data = self.generate_minimal_data()
         self.add_glyph(data, 'foo')['production'] = 'f_o_o.alt1'
@@ -455,6 +537,19 @@ class ToUfosTest(unittest.TestCase):
         postscriptNames = ufo.lib.get('public.postscriptNames')
         self.assertEqual(postscriptNames, {'C-fraktur': 'uni212D'})
 
+    def test_postscript_name_from_load_glyph(self):
+        ufo = Font()
+        layer = {'width': 500}
+        builder.load_glyph(ufo.newGlyph('C-fraktur'), layer, {})
+        builder.load_glyph(ufo.newGlyph('foo'), layer,
+                           {'production': 'f_o_o.alt1'})
+        builder.load_glyph(ufo.newGlyph('A'), layer, {})
+        self.assertEqual(ufo.lib['public.postscriptNames'],
+                         {'C-fraktur': 'uni212D', 'foo': 'f_o_o.alt1'})
+        builder.load_glyph(ufo.newGlyph('bar'), layer,
+                           {'production': 'bar.prod'}, production_names=False)
+        self.assertNotIn('bar', ufo.lib['public.postscriptNames'])
+
     def test_category(self):
         data = self.generate_minimal_data()
         self.add_glyph(data, 'foo')['category'] = 'Mark'
@@ -624,6 +719,46 @@ class ToUfosTest(unittest.TestCase):
         self.assertIn('[foo], # Liga', features)
         self.assertIn('[bar baz], # Mark', features)
 
+    def test_GDEF_masters(self):
+        data = self.generate_minimal_data()
+        data['fontMaster'].append(dict(data['fontMaster'][0], id='id2',
+                                       weight='Bold'))
+        for name in ('fi', 'A', 'acutecomb'):
+            glyph = self.add_glyph(data, name)
+            glyph['layers'].append(dict(glyph['layers'][0], layerId='id2'))
+        self.add_anchor(data, 'A', 'top', 300, 700)
+        for layer, x in zip(data['glyphs'][0]['layers'], (150, 160)):
+            layer['anchors'] = [{'name': 'caret_1', 'position': (x, 0)}]
+        with patch('glyphsLib.glyphdata.get_glyph',
+                   wraps=glyphsLib.glyphdata.get_glyph) as get_glyph:
+            light, bold = to_ufos(data)
+        self.assertEqual(get_glyph.call_count, 3)
+        self.assertEqual(light.features.text.splitlines()[2:7], [
+            '  GlyphClassDef',
+            '    [A], # Base',
+            '    [fi], # Liga',
+            '    [acutecomb], # Mark',
+            '    ;'])
+        self.assertEqual(bold.features.text.splitlines()[2:7],
+                         light.features.text.splitlines()[2:7])
+        self.assertIn('LigatureCaretByPos fi 150;', light.features.text)
+        self.assertIn('LigatureCaretByPos fi 160;', bold.features.text)
+
+    def test_GDEF_builder_reuses_class_def(self):
+        ufo = Font()
+        for name in ('b', 'a'):
+            ufo.newGlyph(name).appendAnchor({'name': 'top', 'x': 0, 'y': 0})
+        ufo.lib[PUBLIC_PREFIX + 'glyphOrder'] = ['b', 'a']
+        gdef_builder = builder.GDEFBuilder(['b', 'a'])
+        first = gdef_builder.build(ufo)
+        self.assertIn('    [b a], # Base', first.splitlines())
+        self.assertEqual(gdef_builder.build(ufo), first)
+        lines = gdef_builder._class_def[1]
+        self.assertIs(gdef_builder.class_def({'a', 'b'}, set(), set()), lines)
+        self.assertEqual(builder.build_gdef(ufo), first)
+        ufo['a'].clearAnchors()
+        self.assertIn('    [b], # Base', gdef_builder.build(ufo).splitlines())
+
     def test_set_blue_values(self):
         """Test that blue values are set correctly from alignment zones."""
 
@@ -681,6 +816,173 @@ class ToUfosTest(unittest.TestCase):
         self.assertIn(name, instances)
         self.assertEqual(instances[name], value)
 
+    def generate_full_data(self):
+        data = self.generate_minimal_data()
+        master_id = data['fontMaster'][0]['id']
+        data['fontMaster'][0].update({
+            'alignmentZones': [[0, -10], [500, 10]],
+            'userData': {'key': 'value'},
+            'weight': 'Bold',
+        })
+        data['customParameters'] = [
+            {'name': 'glyphOrder', 'value': ['b', 'a']}]
+        data['features'] = [{'name': 'liga', 'code': 'sub a b by b;'}]
+        for name in ('a', 'b', 'acutecomb'):
+            glyph = self.add_glyph(data, name)
+            glyph['rightKerningGroup'] = name
+            layer = glyph['layers'][0]
+            layer['width'] = 500
+            layer['paths'] = [{'closed': True, 'nodes': [
+                [0, 0, 'line', False], [100, 0, 'line', False],
+                [100, 100, 'line', False]]}]
+            layer['background'] = {'paths': [{'closed': True, 'nodes': [
+                [0, 0, 'line', False], [10, 0, 'line', False]]}]}
+        self.add_anchor(data, 'a', 'top', 250, 500)
+        self.add_anchor(data, 'acutecomb', '_top', 0, 500)
+        data['glyphs'][1]['layers'][0]['components'] = [
+            {'name': 'a'}, {'name': 'acutecomb', 'transform': (
+                1, 0, 0, 1, 250, 0)}]
+        data['kerning'] = {master_id: {'@MMK_L_a': {'b': -10}}}
+        return data
+
+    def test_input_data_unchanged(self):
+        data = self.generate_full_data()
+        original = copy.deepcopy(data)
+        to_ufos(data)
+        self.assertEqual(data, original)
+
+    def test_build_twice(self):
+        data = self.generate_full_data()
+        first, second = to_ufos(data)[0], to_ufos(data)[0]
+        self.assertEqual(first.lib, second.lib)
+        self.assertEqual(first.features.text, second.features.text)
+        self.assertEqual(dict(first.kerning), dict(second.kerning))
+        self.assertEqual(dict(first.groups), dict(second.groups))
+        self.assertEqual(first.lib[PUBLIC_PREFIX + 'glyphOrder'],
+                         ['b', 'a', 'acutecomb'])
+        for glyph in first:
+            other = second[glyph.name]
+            self.assertEqual(glyph.width, other.width)
+            self.assertEqual(glyph.lib, other.lib)
+            self.assertEqual([a.items() for a in glyph.anchors],
+                             [a.items() for a in other.anchors])
+            self.assertEqual(
+                [[(p.x, p.y, p.segmentType) for p in c] for c in glyph],
+                [[(p.x, p.y, p.segmentType) for p in c] for c in other])
+            self.assertEqual(
+                [(c.baseGlyph, c.transformation) for c in glyph.components],
+                [(c.baseGlyph, c.transformation) for c in other.components])
+
+    def test_iter_ufos(self):
+        data = self.generate_full_data()
+        data['fontMaster'].append(dict(data['fontMaster'][0], id='id2',
+                                       weight='Light'))
+        for glyph in data['glyphs']:
+            glyph['layers'].append(dict(glyph['layers'][0], layerId='id2'))
+        data['kerning']['id2'] = {'a': {'b': 20}}
+        expected = to_ufos(data)
+
+        ufos = iter_ufos(data)
+        ufo = next(ufos)
+        # the first UFO is complete before the second one is built
+        self.assertEqual(ufo.info.styleName, 'Bold')
+        self.assertEqual(len(ufo), 3)
+        self.assertEqual(len(ufo['b'].anchors), 1)
+        self.assertIn('GDEF', ufo.features.text)
+        self.assertEqual(dict(ufo.kerning), {('public.kern1.a', 'b'): -10})
+        ufo = next(ufos)
+        self.assertEqual(ufo.info.styleName, 'Light')
+        self.assertEqual(dict(ufo.kerning), {('a', 'b'): 20})
+        self.assertEqual(ufo.lib, expected[1].lib)
+        self.assertEqual(ufo.groups, expected[1].groups)
+        self.assertRaises(StopIteration, next, ufos)
+
+    def test_glyph_info_looked_up_once(self):
+        data = self.generate_full_data()
+        data['fontMaster'].append(dict(data['fontMaster'][0], id='id2',
+                                       weight='Light'))
+        for glyph in data['glyphs']:
+            glyph['layers'].append(dict(glyph['layers'][0], layerId='id2'))
+        with patch('glyphsLib.glyphdata.get_glyph',
+                   wraps=glyphsLib.glyphdata.get_glyph) as get_glyph:
+            to_ufos(data)
+        self.assertEqual(sorted(c[0][0] for c in get_glyph.call_args_list),
+                         ['a', 'acutecomb', 'b'])
+
+    def test_notifications_disabled_while_building(self):
+        data = self.generate_full_data()
+        data['glyphs'][0]['unicode'] = 0x61
+        disabled = []
+        load_glyph = builder.load_glyph
+
+        def check_load_glyph(glyph, *args, **kwargs):
+            disabled.append(glyph.font.dispatcher.areNotificationsDisabled())
+            load_glyph(glyph, *args, **kwargs)
+
+        with patch('glyphsLib.builder.load_glyph',
+                   side_effect=check_load_glyph):
+            ufo = to_ufos(data)[0]
+        self.assertEqual(disabled, [True, True, True])
+        self.assertFalse(ufo.dispatcher.areNotificationsDisabled())
+        self.assertTrue(ufo.dirty)
+        self.assertTrue(ufo.layers.defaultLayer.dirty)
+        self.assertEqual(ufo.unicodeData[0x61], ['a'])
+
+    def test_family_data_shared_by_masters(self):
+        data = self.generate_full_data()
+        data['fontMaster'].append(dict(data['fontMaster'][0], id='id2',
+                                       weight='Light'))
+        for glyph in data['glyphs']:
+            glyph['layers'].append(dict(glyph['layers'][0], layerId='id2'))
+            glyph['production'] = glyph['glyphname'] + '.prod'
+            glyph['rightKerningGroup'] = 'group'
+        # a glyph which only the second master has
+        data['glyphs'][1]['layers'].pop(0)
+        with patch('glyphsLib.builder.build_features_text',
+                   wraps=builder.build_features_text) as build_text:
+            ufo1, ufo2 = to_ufos(data)
+        self.assertEqual(build_text.call_count, 1)
+
+        self.assertEqual(list(ufo1.groups.keys()), ['public.kern1.group'])
+        self.assertEqual(ufo1.groups['public.kern1.group'],
+                         ufo2.groups['public.kern1.group'])
+        name = data['glyphs'][1]['glyphname']
+        self.assertNotIn(name, ufo1)
+        postscript_names = {n: n + '.prod' for n in ufo2.keys()}
+        self.assertEqual(ufo2.lib['public.postscriptNames'], postscript_names)
+        del postscript_names[name]
+        self.assertEqual(ufo1.lib['public.postscriptNames'], postscript_names)
+
+        # changing one UFO leaves the others unchanged
+        ufo1, ufo2, ufo3 = to_ufos(dict(
+            data, fontMaster=data['fontMaster'] + [dict(
+                data['fontMaster'][0], id='id3', weight='Bold')],
+            glyphs=[dict(glyph, layers=glyph['layers'] + [dict(
+                glyph['layers'][-1], layerId='id3')])
+                for glyph in data['glyphs']]))
+        ufo2.lib['public.postscriptNames']['extra'] = 'extra.prod'
+        ufo2.lib['public.glyphOrder'].append('extra')
+        ufo2.groups['public.kern1.group'].append('extra')
+        self.assertNotIn('extra', ufo3.lib['public.postscriptNames'])
+        self.assertNotIn('extra', ufo3.lib['public.glyphOrder'])
+        self.assertNotIn('extra', ufo3.groups['public.kern1.group'])
+
+    def test_debug_unused_data(self):
+        data = self.generate_full_data()
+        self.assertIsNone(to_ufos(data, debug=True))
+
+        data['unknownFontKey'] = 1
+        data['fontMaster'][0]['unknownMasterKey'] = [{'a': 1}, {}]
+        data['glyphs'][0]['layers'][0]['unknownLayerKey'] = 'x'
+        original = copy.deepcopy(data)
+        unused = to_ufos(data, debug=True)
+        self.assertEqual(data, original)
+        self.assertEqual(unused, {
+            'unknownFontKey': 1,
+            'fontMaster': [{'unknownMasterKey': [{'a': 1}]}],
+            'glyphs': [{'layers': [{'unknownLayerKey': 'x'}]}],
+        })
+
     def _run_guideline_test(self, data_in, expected):
         data = self.generate_minimal_data()
         data['glyphs'].append({
@@ -708,6 +1010,310 @@ class ToUfosTest(unittest.TestCase):
     #         {str('x'): 1, str('y'): 2, str('angle'): 90}])
 
 
+class BuildMastersTest(unittest.TestCase):
+    SOURCE = '''{
+familyName = MyFont;
+fontMaster = (
+{ascender = 800; capHeight = 700; descender = -200; id = M1;
+weight = Light; xHeight = 500;},
+{ascender = 800; capHeight = 700; descender = -200; id = M2;
+weight = Bold; xHeight = 500;}
+);
+classes = ({code = "A Aacute"; name = Uppercase;});
+features = ({code = "sub A by Aacute;"; name = ss01;});
+glyphs = (
+{glyphname = A; rightKerningGroup = A; unicode = 0041; layers = (
+{anchors = ({name = top; position = "{250, 700}";});
+layerId = M1; paths = ({closed = 1;
+nodes = ("0 0 LINE", "500 0 LINE", "250 700 LINE");});
+width = 500;},
+{anchors = ({name = top; position = "{300, 700}";});
+layerId = M2; paths = ({closed = 1;
+nodes = ("0 0 LINE", "600 0 LINE", "300 700 LINE");});
+width = 600;},
+{associatedMasterId = M1; layerId = B1; name = "{100}"; width = 500;}
+);},
+{glyphname = acutecomb; unicode = 0301; layers = (
+{anchors = ({name = _top; position = "{50, 700}";});
+layerId = M1; paths = ({closed = 1; nodes = ("0 700 LINE",
+"100 700 OFFCURVE", "100 800 OFFCURVE", "50 800 CURVE SMOOTH");});
+width = 100;},
+{anchors = ({name = _top; position = "{60, 700}";});
+layerId = M2; width = 120;}
+);},
+{glyphname = Aacute; unicode = 00C1; note = accented; layers = (
+{components = ({name = A;}, {name = acutecomb;
+transform = "{1, 0, 0, 1, 200, 0}";}); layerId = M1; width = 500;},
+{components = ({name = A;}, {name = acutecomb;
+transform = "{1, 0, 0, 1, 240, 0}";}); layerId = M2; width = 600;}
+);}
+);
+kerning = {M1 = {"@MMK_L_A" = {A = -20;};}; M2 = {A = {A = -30;};};};
+unitsPerEm = 1000;
+versionMajor = 1;
+versionMinor = 0;
+}'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'MyFont.glyphs')
+        with open(self.path, 'w') as fp:
+            fp.write(self.SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def master_dir(self, name):
+        master_dir = os.path.join(self.directory, name)
+        os.mkdir(master_dir)
+        return master_dir
+
+    def assertSameFiles(self, expected_dir, actual_dir):
+        for dirpath, _, filenames in os.walk(expected_dir):
+            for filename in filenames:
+                expected_path = os.path.join(dirpath, filename)
+                actual_path = os.path.join(
+                    actual_dir, os.path.relpath(expected_path, expected_dir))
+                with open(expected_path, 'rb') as fp:
+                    expected = fp.read()
+                with open(actual_path, 'rb') as fp:
+                    self.assertEqual(fp.read(), expected)
+        self.assertEqual(
+            sorted(os.path.relpath(os.path.join(dirpath, name), actual_dir)
+                   for dirpath, _, names in os.walk(actual_dir)
+                   for name in names),
+            sorted(os.path.relpath(os.path.join(dirpath, name), expected_dir)
+                   for dirpath, _, names in os.walk(expected_dir)
+                   for name in names))
+
+    def test_build_masters(self):
+        master_dir = self.master_dir('master_ufo')
+
+        built = []
+        def iter_ufos(*args, **kwargs):
+            for ufo in builder.iter_ufos(*args, **kwargs):
+                # the previous UFO was written before this one is built
+                self.assertEqual(len(os.listdir(master_dir)), len(built))
+                built.append(ufo.info.styleName)
+                yield ufo
+
+        with patch('glyphsLib.iter_ufos', side_effect=iter_ufos):
+            ufos = glyphsLib.build_masters(self.path, master_dir)
+        self.assertEqual(built, ['Light', 'Bold'])
+        self.assertEqual(sorted(os.listdir(master_dir)),
+                         ['MyFont-Bold.ufo', 'MyFont-Light.ufo'])
+        self.assertEqual([ufo.path for ufo in ufos], [
+            os.path.join(master_dir, 'MyFont-Light.ufo'),
+            os.path.join(master_dir, 'MyFont-Bold.ufo')])
+        self.assertEqual([ufo['A'].width for ufo in ufos], [500, 600])
+
+    def test_build_masters_workers(self):
+        serial_dir = self.master_dir('serial')
+        parallel_dir = self.master_dir('parallel')
+        glyphsLib.build_masters(self.path, serial_dir)
+        ufos = glyphsLib.build_masters(self.path, parallel_dir, workers=2)
+        self.assertEqual([ufo.info.styleName for ufo in ufos],
+                         ['Light', 'Bold'])
+        self.assertSameFiles(serial_dir, parallel_dir)
+
+    @unittest.skipIf(ufowriter is None, 'requires ufoLib')
+    def test_import_without_ufolib(self):
+        # direct and incremental writing are optional, and only they need
+        # ufoLib
+        code = ("import sys; sys.modules['fontTools.ufoLib'] = None; "
+                "sys.modules['ufoLib'] = None; import glyphsLib; "
+                "glyphsLib.load(open(%r))" % self.path)
+        subprocess.check_call(
+            [sys.executable, '-c', code],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+    @unittest.skipIf(ufowriter is None, 'requires ufoLib')
+    def test_build_masters_direct(self):
+        defcon_dir = self.master_dir('defcon')
+        direct_dir = self.master_dir('direct')
+        glyphsLib.build_masters(self.path, defcon_dir)
+        with patch('defcon.Font.save', side_effect=AssertionError):
+            ufos = glyphsLib.build_masters(self.path, direct_dir, direct=True)
+        self.assertEqual([ufo.path for ufo in ufos], [
+            os.path.join(direct_dir, 'MyFont-Light.ufo'),
+            os.path.join(direct_dir, 'MyFont-Bold.ufo')])
+        self.assertEqual(ufos[0]['Aacute'].components[1].transformation,
+                         (1, 0, 0, 1, 200, 0))
+        self.assertSameFiles(defcon_dir, direct_dir)
+
+    @unittest.skipIf(ufowriter is None, 'requires ufoLib')
+    def test_build_masters_direct_workers(self):
+        defcon_dir = self.master_dir('defcon')
+        direct_dir = self.master_dir('direct')
+        glyphsLib.build_masters(self.path, defcon_dir)
+        glyphsLib.build_masters(self.path, direct_dir, direct=True, workers=2)
+        self.assertSameFiles(defcon_dir, direct_dir)
+
+    @unittest.skipIf(ufowriter is None, 'requires ufoLib')
+    def test_build_masters_incremental(self):
+        def source(last_change_comb=None, comb_x=None, aacute=True):
+            text = self.SOURCE
+            if last_change_comb is not None:
+                text = text.replace(
+                    '{glyphname = A;',
+                    '{glyphname = A; lastChange = "2017-06-01 12:00:00 +0000";')
+                text = text.replace(
+                    '{glyphname = Aacute;',
+                    '{glyphname = Aacute; '
+                    'lastChange = "2017-06-01 12:00:00 +0000";')
+                text = text.replace(
+                    '{glyphname = acutecomb;',
+                    '{glyphname = acutecomb; lastChange = "%s";' %
+                    last_change_comb)
+            if comb_x is not None:
+                text = text.replace('"50 800 CURVE SMOOTH"',
+                                    '"%d 800 CURVE SMOOTH"' % comb_x)
+            if not aacute:
+                start = text.index('{glyphname = Aacute;')
+                text = text[:start].rstrip(',\n') + text[text.index(
+                    ');}\n);\nkerning', start) + len(');}'):]
+            with open(self.path, 'w') as fp:
+                fp.write(text)
+
+        def build_and_compare(name):
+            expected_dir = self.master_dir(name)
+            glyphsLib.build_masters(self.path, expected_dir)
+            ufos = glyphsLib.build_masters(
+                self.path, master_dir, incremental=True)
+            for style in ('Light', 'Bold'):
+                ufo_name = 'MyFont-%s.ufo' % style
+                self.assertSameFiles(os.path.join(expected_dir, ufo_name),
+                                     os.path.join(master_dir, ufo_name))
+            self.assertEqual(sorted(os.listdir(master_dir)), [
+                'MyFont-Bold.manifest.json', 'MyFont-Bold.ufo',
+                'MyFont-Light.manifest.json', 'MyFont-Light.ufo'])
+            return ufos
+
+        def reset_times():
+            for dirpath, _, filenames in os.walk(master_dir):
+                for filename in filenames:
+                    os.utime(os.path.join(dirpath, filename), (0, 0))
+
+        def rewritten(style):
+            ufo_path = os.path.join(master_dir, 'MyFont-%s.ufo' % style)
+            return sorted(
+                os.path.relpath(os.path.join(dirpath, filename), ufo_path)
+                for dirpath, _, filenames in os.walk(ufo_path)
+                for filename in filenames
+                if os.path.getmtime(os.path.join(dirpath, filename)) != 0)
+
+        master_dir = self.master_dir('incremental')
+        build_and_compare('full')
+        source(last_change_comb='2017-06-01 12:00:00 +0000')
+        build_and_compare('last_change')
+
+        # glyphs whose lastChange is the same aren't serialized again
+        reset_times()
+        with patch('glyphsLib.incremental.writeGlyphToString',
+                   side_effect=AssertionError):
+            build_and_compare('same')
+        self.assertEqual(rewritten('Light'), [])
+
+        # an edited glyph is rewritten, and those made of it are serialized
+        # but not rewritten if they didn't change
+        reset_times()
+        source(last_change_comb='2017-06-02 12:00:00 +0000', comb_x=60)
+        build_and_compare('edited')
+        self.assertEqual(rewritten('Light'), ['glyphs/acutecomb.glif'])
+        self.assertEqual(rewritten('Bold'), ['glyphs/acutecomb.glif'])
+
+        # removed glyphs are deleted
+        source(last_change_comb='2017-06-02 12:00:00 +0000', comb_x=60,
+               aacute=False)
+        ufos = build_and_compare('removed')
+        self.assertEqual(sorted(ufos[0].keys()), ['A', 'acutecomb'])
+
+        # without a manifest, the UFO is written from scratch
+        os.remove(os.path.join(master_dir, 'MyFont-Light.manifest.json'))
+        source()
+        build_and_compare('no_manifest')
+
+    def test_subset_data(self):
+        data = glyphsLib.loads(self.SOURCE)
+        data['customParameters'] = [
+            {'name': 'glyphOrder', 'value': ['Aacute', 'acutecomb', 'A']}]
+        expected = copy.deepcopy(data)
+
+        subset = subset_data(data, ['acutecomb'])
+        self.assertEqual([g['glyphname'] for g in subset['glyphs']],
+                         ['acutecomb'])
+        self.assertEqual(subset['kerning'], {'M1': {}, 'M2': {}})
+        self.assertEqual(subset['customParameters'][0]['value'],
+                         ['acutecomb'])
+
+        subset = subset_data(data, ['Aacute', 'foo'])
+        self.assertEqual([g['glyphname'] for g in subset['glyphs']],
+                         ['A', 'acutecomb', 'Aacute'])
+        self.assertEqual(subset['kerning'], data['kerning'])
+        self.assertEqual(data, expected)
+
+        subset = subset_data(data, ['A'])
+        self.assertEqual(subset['kerning'], {
+            'M1': {'@MMK_L_A': {'A': -20}}, 'M2': {'A': {'A': -30}}})
+
+    def test_subset_data_lazy(self):
+        data = glyphsLib.loads_lazy(self.SOURCE)
+        subset = subset_data(data, ['A'])
+        self.assertEqual([g['glyphname'] for g in subset['glyphs']], ['A'])
+        # the other glyphs were not parsed
+        self.assertEqual(list(data['glyphs']._glyphs), [0])
+
+    def test_to_ufos_lazy(self):
+        ufos = to_ufos(glyphsLib.loads_lazy(self.SOURCE))
+        expected = to_ufos(glyphsLib.loads(self.SOURCE))
+        self.assertEqual([list(ufo.keys()) for ufo in ufos],
+                         [list(ufo.keys()) for ufo in expected])
+        self.assertEqual(ufos[0].lib[PUBLIC_PREFIX + 'glyphOrder'],
+                         expected[0].lib[PUBLIC_PREFIX + 'glyphOrder'])
+
+    def test_build_masters_subset(self):
+        master_dir = self.master_dir('master_ufo')
+        with patch('glyphsLib.subset.logger') as logger:
+            ufos = glyphsLib.build_masters(
+                self.path, master_dir, subset=['A', 'foo'])
+        logger.warning.assert_called_once_with(
+            'Glyphs not found in the font: %s', 'foo')
+        self.assertEqual([sorted(ufo.keys()) for ufo in ufos],
+                         [['A'], ['A']])
+        self.assertEqual(ufos[0].lib[PUBLIC_PREFIX + 'glyphOrder'], ['A'])
+        self.assertEqual(dict(ufos[0].groups), {'public.kern1.A': ['A']})
+        self.assertEqual(dict(ufos[0].kerning),
+                         {('public.kern1.A', 'A'): -20})
+        self.assertNotIn('acutecomb', ufos[0].features.text)
+
+        # composite glyphs bring their components
+        with open(self.path) as fp:
+            ufos = glyphsLib.load_to_ufos(fp, subset=['Aacute'])
+        self.assertEqual(sorted(ufos[0].keys()), ['A', 'Aacute', 'acutecomb'])
+        self.assertEqual([a.name for a in ufos[0]['Aacute'].anchors],
+                         ['top'])
+        self.assertIn('[acutecomb]', ufos[0].features.text)
+
+    def test_cli_workers(self):
+        options = parse_options(['-g', 'font.glyphs', '-j', '4'])
+        self.assertEqual(options.workers, 4)
+        options = parse_options(['-g', 'font.glyphs'])
+        self.assertIsNone(options.workers)
+        self.assertFalse(options.direct)
+        options = parse_options(['-g', 'font.glyphs', '--direct'])
+        self.assertTrue(options.direct)
+        with patch('sys.stderr'), self.assertRaises(SystemExit):
+            parse_options(['-g', 'font.glyphs', '--direct', '-n'])
+        self.assertFalse(options.incremental)
+        options = parse_options(['-g', 'font.glyphs', '--incremental'])
+        self.assertTrue(options.incremental)
+        with patch('sys.stderr'), self.assertRaises(SystemExit):
+            parse_options(['-g', 'font.glyphs', '--incremental', '-n'])
+        self.assertIsNone(options.subset)
+        options = parse_options(['-g', 'font.glyphs', '--subset', 'A, B,'])
+        self.assertEqual(options.subset, ['A', 'B'])
+
+
 class _PointDataPen(object):
 
     def __init__(self):
@@ -802,6 +1408,23 @@ class DrawPathsTest(unittest.TestCase):
         first_segment_type = points[0][2]
         self.assertEqual(first_segment_type, 'qcurve')
 
+    def test_draw_paths_node_array(self):
+        nodes = [
+            [0, 0, 'line', False],
+            [1.5, 1, 'offcurve', False],
+            [2, 2, 'offcurve', False],
+            [3, 3, 'curve', True],
+        ]
+        for closed in (False, True):
+            pen = _PointDataPen()
+            draw_paths(pen, [{'closed': closed, 'nodes': list(nodes)}])
+            array_pen = _PointDataPen()
+            node_array = NodeArray(
+                [0, 0, 1.5, 1, 2, 2, 3, 3], [0, 3, 3, 1], [0, 0, 0, 1])
+            draw_paths(array_pen, [{'closed': closed, 'nodes': node_array}])
+            self.assertEqual(array_pen.contours, pen.contours)
+            self.assertEqual(node_array, nodes)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,124 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import patch
+
+import glyphsLib
+from glyphsLib import load, loads
+from glyphsLib.__main__ import parse_options
+from glyphsLib.cache import ParseCache
+
+
+SOURCE = '''{
+date = "2017-06-01 12:00:00 +0000";
+glyphs = (
+{
+glyphname = A;
+layers = (
+{
+layerId = M1;
+paths = (
+{
+closed = 1;
+nodes = ("0 0 LINE", "10 0 LINE", "10 10 CURVE SMOOTH");
+}
+);
+width = 600;
+}
+);
+}
+);
+unitsPerEm = 1000;
+}'''
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def entries(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.endswith('.pickle'))
+
+    def test_loads(self):
+        data = loads(SOURCE, cache=self.directory)
+        self.assertEqual(data, loads(SOURCE))
+        self.assertEqual(len(self.entries()), 1)
+
+        with patch('glyphsLib.loads', side_effect=AssertionError):
+            cached = loads(SOURCE, cache=self.directory)
+        self.assertEqual(cached, data)
+        self.assertIsNot(cached, data)
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_load(self):
+        data = load(io.StringIO(SOURCE), cache=ParseCache(self.directory))
+        self.assertEqual(data, loads(SOURCE))
+        self.assertEqual(load(io.BytesIO(SOURCE.encode('utf-8')),
+                              cache=self.directory), data)
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_key(self):
+        cache = ParseCache(self.directory)
+        source = SOURCE.encode('utf-8')
+        key = cache.key(source)
+        self.assertEqual(cache.key(source), key)
+        self.assertNotEqual(cache.key(source + b' '), key)
+        self.assertNotEqual(cache.key(source, compact_nodes=True), key)
+        with patch.object(glyphsLib, '__version__', '0.0.0'):
+            self.assertNotEqual(cache.key(source), key)
+
+    def test_unreadable_entry(self):
+        cache = ParseCache(self.directory)
+        key = cache.key(b'{}')
+        with open(os.path.join(self.directory, key + '.pickle'), 'wb') as fp:
+            fp.write(b'garbage')
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(self.entries(), [])
+
+    def test_evict(self):
+        cache = ParseCache(self.directory)
+        for i in range(3):
+            cache.put('key%d' % i, 'x' * 1000)
+            path = os.path.join(self.directory, 'key%d.pickle' % i)
+            os.utime(path, (time.time() - 10 + i, time.time() - 10 + i))
+        cache.get('key0')
+        cache.max_size = 2500
+        cache.evict()
+        self.assertEqual(self.entries(), ['key0.pickle', 'key2.pickle'])
+
+    def test_cli_options(self):
+        options = parse_options(['-g', 'font.glyphs', '--cache', 'cache'])
+        self.assertEqual(options.cache, 'cache')
+        self.assertEqual(options.cache_size, 1024)
+        options = parse_options(['-g', 'font.glyphs'])
+        self.assertIsNone(options.cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
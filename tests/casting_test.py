@@ -17,7 +17,9 @@ from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
 
 import unittest
-from glyphsLib.casting import cast_data, num, node, custom_params
+from glyphsLib.casting import (
+    cast_data, uncast_data, num, node, nodelist, compact_nodelist, point,
+    transform, custom_params, NodeArray)
 from copy import deepcopy
 
 
@@ -86,6 +88,45 @@ class RWNodeTest(unittest.TestCase):
         self.assertEqual(node.write([0, 0, 'qcurve', False]), '0 0 QCURVE' )
 
 
+class RWNodeListTest(unittest.TestCase):
+
+    def test_read(self):
+        nodes = nodelist.read(
+            ['1.0 -2 LINE', '1.5 1e2 OFFCURVE', '3 4 CURVE SMOOTH', '5 6 n/a'])
+        self.assertEqual(nodes, [
+            [1, -2, 'line', False], [1.5, 100, 'offcurve', False],
+            [3, 4, 'curve', True], [5, 6, 'n/a', False]])
+        self.assertIsInstance(nodes[0][0], int)
+        self.assertIsInstance(nodes[1][0], float)
+
+    def test_read_irregular(self):
+        # nodes which aren't split in bulk are read like RWNode does
+        self.assertEqual(nodelist.read(['1 2 LINE SMOOTHED', '3 4 CURVE']),
+                         [[1, 2, 'line', True], [3, 4, 'curve', False]])
+        with self.assertRaises(Exception):
+            nodelist.read(['1 2', 'LINE 3 4 LINE'])
+        with self.assertRaises(Exception):
+            nodelist.read(['inf 2 LINE'])
+
+    def test_read_compact(self):
+        src = ['1.0 -2 LINE', '1.5 1e2 OFFCURVE', '3 4 CURVE SMOOTH']
+        self.assertEqual(compact_nodelist.read(list(src)),
+                         nodelist.read(list(src)))
+        self.assertEqual(compact_nodelist.read(['1 2 LINE SMOOTHED']),
+                         [[1, 2, 'line', True]])
+
+
+class RWVectorTest(unittest.TestCase):
+
+    def test_read(self):
+        self.assertEqual(point.read('{800, -16.5}'), [800, -16.5])
+        self.assertEqual(transform.read('{1, 0, 0, 1, 10.0, 1e1}'),
+                         [1, 0, 0, 1, 10, 10])
+        self.assertEqual(point.read('{1, 2}, trailing'), [1, 2])
+        with self.assertRaises(Exception):
+            point.read('{1, 2, 3}')
+
+
 class RWCustomParamsTest(unittest.TestCase):
 
     raw_params = [
@@ -121,5 +162,77 @@ class RWCustomParamsTest(unittest.TestCase):
         self.assertEqual(custom_params.write(src), expected)
 
 
+class CastDataTest(unittest.TestCase):
+    raw_data = {
+        'glyphs': [{
+            'glyphname': 'A',
+            'layers': [{
+                'background': {
+                    'paths': [{'closed': '1', 'nodes': ['1 2 LINE']}],
+                    'width': '10'},
+                'layerId': 'M1',
+                'paths': [{'closed': '0',
+                           'nodes': ['0 0 LINE', '1.5 2 CURVE SMOOTH']}],
+                'unknown': '1',
+                'width': '600'}],
+            'unicode': '0041'}],
+        'unitsPerEm': '1000',
+        'unknown': ['1', {'width': '1'}]
+    }
+
+    cast_data = {
+        'glyphs': [{
+            'glyphname': 'A',
+            'layers': [{
+                'background': {
+                    'paths': [{'closed': True,
+                               'nodes': [[1, 2, 'line', False]]}],
+                    'width': 10},
+                'layerId': 'M1',
+                'paths': [{'closed': False, 'nodes': [
+                    [0, 0, 'line', False], [1.5, 2, 'curve', True]]}],
+                'unknown': '1',
+                'width': 600}],
+            'unicode': 0x41}],
+        'unitsPerEm': 1000,
+        'unknown': ['1', {'width': '1'}]
+    }
+
+    def test_cast(self):
+        data = deepcopy(self.raw_data)
+        cast_data(data)
+        self.assertEqual(data, self.cast_data)
+
+    def test_uncast(self):
+        data = deepcopy(self.cast_data)
+        uncast_data(data)
+        self.assertEqual(data, self.raw_data)
+
+    def test_cast_compact_nodes(self):
+        data = deepcopy(self.raw_data)
+        cast_data(data, compact_nodes=True)
+        self.assertEqual(data, self.cast_data)
+        layer = data['glyphs'][0]['layers'][0]
+        self.assertIsInstance(layer['paths'][0]['nodes'], NodeArray)
+        self.assertIsInstance(
+            layer['background']['paths'][0]['nodes'], NodeArray)
+        uncast_data(data)
+        self.assertEqual(data, self.raw_data)
+
+
+class NodeArrayTest(unittest.TestCase):
+    def test_sequence(self):
+        nodes = NodeArray([0, 0, 1.5, -2, 3, 4], [0, 3, 4], [1, 0, 0])
+        self.assertEqual(len(nodes), 3)
+        self.assertEqual(list(nodes), [
+            (0, 0, 'line', True), (1.5, -2, 'offcurve', False),
+            (3, 4, 'n/a', False)])
+        self.assertIsInstance(nodes[0][0], int)
+        self.assertEqual(nodes[-1], (3, 4, 'n/a', False))
+        self.assertEqual(nodes[1:], NodeArray([1.5, -2, 3, 4], [3, 4], [0, 0]))
+        with self.assertRaises(IndexError):
+            nodes[3]
+
+
 if __name__ == '__main__':
     unittest.main()
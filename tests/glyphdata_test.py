@@ -16,7 +16,15 @@
 
 from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
-from glyphsLib.glyphdata import get_glyph
+from collections import namedtuple
+from glyphsLib import glyphdata, glyphdata_generated
+from glyphsLib.glyphdata import (
+    get_glyph, get_glyphs, get_glyph_by_unicode, get_glyph_by_production_name,
+    GlyphTable, write_glyph_table)
+from mock import patch
+import os
+import shutil
+import tempfile
 import unittest
 
 
@@ -62,6 +70,155 @@ class GlyphDataTest(unittest.TestCase):
         self.assertEqual(cat("o_f_f_i.foo"), ("Letter", "Ligature"))
         self.assertEqual(cat("ain_alefMaksura-ar.fina"), ("Letter", "Ligature"))
 
+    def test_get_glyph_by_unicode(self):
+        name = lambda u: get_glyph_by_unicode(u).name
+        self.assertEqual(name("\u00e9"), "eacute")
+        self.assertEqual(name(0xE9), "eacute")
+        self.assertEqual(name(0x1EAE), "Abreveacute")
+        self.assertEqual(name(0x20AC), "euro")
+        self.assertEqual(name("\ufb01"), "fi")
+        self.assertEqual(name(0x1D4D3), "Dboldscript-math")
+        self.assertIsNone(get_glyph_by_unicode("st"))
+
+    def test_get_glyph_by_unicode_derived_names(self):
+        name = lambda u: get_glyph_by_unicode(u).name
+        self.assertEqual(name(0x4E00), "uni4E00")
+        self.assertEqual(name(0xE000), "uniE000")
+        self.assertEqual(name(0x1F0A1), "u1F0A1")
+        self.assertEqual(get_glyph_by_unicode(0x4E00), get_glyph("uni4E00"))
+
+    def test_get_glyph_by_production_name(self):
+        name = lambda n: get_glyph_by_production_name(n).name
+        self.assertEqual(name("uni1EAE"), "Abreveacute")
+        self.assertEqual(name("Euro"), "euro")
+        self.assertEqual(name("eacute"), "eacute")
+        self.assertEqual(name("u1D4D3"), "Dboldscript-math")
+        self.assertIsNone(get_glyph_by_production_name("foo"))
+
+    def test_get_glyph_by_production_name_derived_names(self):
+        name = lambda n: get_glyph_by_production_name(n).name
+        self.assertEqual(name("uni00E9"), "eacute")
+        self.assertEqual(name("uni4E00"), "uni4E00")
+        self.assertEqual(name("u1F0A1"), "u1F0A1")
+        self.assertIsNone(get_glyph_by_production_name("a.sc"))
+        self.assertIsNone(get_glyph_by_production_name("uni00730074"))
+
+    def test_reverse_lookups_in_module(self):
+        data = glyphdata_generated
+        self.assertEqual(get_glyph_by_unicode(0xE9, data),
+                         get_glyph_by_unicode(0xE9))
+        self.assertEqual(get_glyph_by_production_name("uni0410", data).name,
+                         "A-cy")
+
+    def test_cache(self):
+        glyphdata.clear_cache()
+        with patch.object(glyphdata, "CACHE_SIZE", 2), \
+                patch("glyphsLib.glyphdata._lookup_glyph",
+                      wraps=glyphdata._lookup_glyph) as lookup:
+            eacute = get_glyph("eacute")
+            self.assertIs(get_glyph("eacute"), eacute)
+            get_glyph("fi")
+            get_glyph("eacute")
+            get_glyph("s_t")  # evicts "fi", the least recently used
+            self.assertIs(get_glyph("eacute"), eacute)
+            self.assertEqual(get_glyph("fi").production_name, "fi")
+            self.assertEqual([c[0][0] for c in lookup.call_args_list],
+                             ["eacute", "fi", "s_t", "fi"])
+        glyphdata.clear_cache()
+
+    def test_get_glyphs(self):
+        glyphs = get_glyphs(["s_t", "eacute", "s_t"])
+        self.assertEqual(list(glyphs), ["s_t", "eacute"])
+        self.assertEqual(glyphs["eacute"], get_glyph("eacute"))
+
+
+
+GlyphData = namedtuple("GlyphData", [
+    "PRODUCTION_NAMES", "IRREGULAR_UNICODE_STRINGS", "MISSING_UNICODE_STRINGS",
+    "DEFAULT_CATEGORIES", "IRREGULAR_CATEGORIES"])
+
+
+class GlyphTableTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "glyphdata.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_table(self, data):
+        with open(self.path, "wb") as fp:
+            write_glyph_table(data, fp)
+        return GlyphTable(self.path)
+
+    def test_round_trip(self):
+        data = GlyphData(
+            {"Abreveacute": "uni1EAE", "\u00e9tude": "etude"},
+            {"fi": "\ufb01", "Dboldscript-math": "\U0001d4d3"},
+            {"s_t", "Abreveacute"},
+            {None: ("Letter", None), "Lu": ("Letter", "Uppercase")},
+            {"s_t": ("Letter", "Ligature"), "hib-ko": (None, None)})
+        table = self.write_table(data)
+        self.assertEqual(dict(table.PRODUCTION_NAMES), data.PRODUCTION_NAMES)
+        self.assertEqual(dict(table.IRREGULAR_UNICODE_STRINGS),
+                         data.IRREGULAR_UNICODE_STRINGS)
+        self.assertEqual(set(table.MISSING_UNICODE_STRINGS),
+                         data.MISSING_UNICODE_STRINGS)
+        self.assertEqual(table.DEFAULT_CATEGORIES, data.DEFAULT_CATEGORIES)
+        self.assertEqual(dict(table.IRREGULAR_CATEGORIES),
+                         data.IRREGULAR_CATEGORIES)
+        self.assertEqual(table.PRODUCTION_NAMES.get("fi", "fi"), "fi")
+        self.assertIsNone(table.IRREGULAR_UNICODE_STRINGS.get("s_t"))
+        self.assertIn("Abreveacute", table.MISSING_UNICODE_STRINGS)
+        self.assertNotIn("fi", table.MISSING_UNICODE_STRINGS)
+        self.assertNotIn("zzz", table.MISSING_UNICODE_STRINGS)
+        self.assertEqual(len(table.PRODUCTION_NAMES), 2)
+        for name in ("Abreveacute", "fi", "s_t", "hib-ko", "A", "\u00e9tude"):
+            self.assertEqual(get_glyph(name, table), get_glyph(name, data))
+        self.assertEqual(get_glyph_by_unicode(0x1D4D3, table).name,
+                         "Dboldscript-math")
+        # Abreveacute has no Unicode string in these tables
+        self.assertEqual(get_glyph_by_unicode(0x1EAE, table).name, "uni1EAE")
+        self.assertEqual(get_glyph_by_unicode(0xE9, table).name, "eacute")
+        self.assertEqual(get_glyph_by_production_name("etude", table).name,
+                         "\u00e9tude")
+        self.assertIsNone(get_glyph_by_unicode("st", table))
+
+    def test_reverse_indexes(self):
+        data = GlyphData(
+            {"A-cy": "uni0410", "A.alt": "uni0410"}, {}, set(), {}, {})
+        table = self.write_table(data)
+        # the first name wins
+        self.assertEqual(table.NAMES_BY_PRODUCTION_NAME["uni0410"], "A-cy")
+        self.assertEqual(table.NAMES_BY_UNICODE["\u0410"], "A-cy")
+        with open(self.path, "wb") as fp:
+            write_glyph_table(data, fp, ["A.alt", "zero"])
+        table = GlyphTable(self.path)
+        self.assertEqual(dict(table.NAMES_BY_UNICODE),
+                         {"\u0410": "A.alt", "0": "zero"})
+        self.assertEqual(dict(table.NAMES_BY_PRODUCTION_NAME),
+                         {"uni0410": "A.alt", "zero": "zero"})
+
+    def test_not_a_table(self):
+        with open(self.path, "wb") as fp:
+            fp.write(b"GLYPHS DATA")
+        self.assertRaises(ValueError, GlyphTable, self.path)
+
+    def test_built_in_table(self):
+        table = GlyphTable(glyphdata.TABLE_PATH)
+        self.assertEqual(dict(table.PRODUCTION_NAMES),
+                         glyphdata_generated.PRODUCTION_NAMES)
+        self.assertEqual(dict(table.IRREGULAR_CATEGORIES),
+                         glyphdata_generated.IRREGULAR_CATEGORIES)
+        self.assertEqual(set(table.MISSING_UNICODE_STRINGS),
+                         glyphdata_generated.MISSING_UNICODE_STRINGS)
+        self.assertIsInstance(glyphdata.default_data(), GlyphTable)
+
+    def test_missing_table(self):
+        with patch.object(glyphdata, "_default_data", None), \
+                patch.object(glyphdata, "TABLE_PATH", self.path):
+            self.assertIs(glyphdata.default_data(), glyphdata_generated)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -19,9 +19,15 @@ from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
 
 import collections
+import io
 import unittest
 
-from glyphsLib.parser import Parser
+from mock import patch
+
+from glyphsLib import load, loads, loads_lazy
+from glyphsLib.casting import cast_data, _TYPE_STRUCTURE
+from glyphsLib import parser
+from glyphsLib.parser import Parser, iterparse, build_tree, index_glyphs
 
 
 class ParserTest(unittest.TestCase):
@@ -51,11 +57,303 @@ class ParserTest(unittest.TestCase):
                 '{myval=@unexpected;}',
                 [('myval', '@unexpected')])
 
+    def test_parse_nested(self):
+        self.run_test(
+            '{a = {b = ("x", {c = "y z";}, (1, 2));}; "d e" = "";}',
+            [('a', collections.OrderedDict([
+                ('b', ['x', collections.OrderedDict([('c', 'y z')]),
+                       ['1', '2']])])),
+             ('d e', '')])
+
+    def test_parse_plain_list(self):
+        self.run_test(
+            '{nodes = (\n"354 0 LINE",\n"1 2.5 OFFCURVE",\n"3 4 CURVE SMOOTH"\n);'
+            ' empty = ();}',
+            [('nodes', ['354 0 LINE', '1 2.5 OFFCURVE', '3 4 CURVE SMOOTH']),
+             ('empty', [])])
+
+    def test_parse_plain_list_with_escapes(self):
+        self.run_test(
+            '{mylist = ("a\\"b", c, "\\U2019");}',
+            [('mylist', ['a"b', 'c', '\u2019'])])
+
+    def test_list_trailing_delimiter(self):
+        with self.assertRaises(ValueError):
+            self.run_test('{mylist=(1,2,);}', [('mylist', ['1', '2'])])
+        with self.assertRaises(ValueError):
+            self.run_test('{mylist=({a=1;},);}', [])
+
+    def test_missing_delimiter(self):
+        with self.assertRaises(ValueError):
+            self.run_test('{myval=1 mylist=(1,2,3);}', [])
+        with self.assertRaises(ValueError):
+            self.run_test('{mylist=({a=1;} {b=2;});}', [])
+
     def test_with_utf8(self):
         self.run_test(
             b'{mystr="Don\xe2\x80\x99t crash";}',
             [('mystr', 'Don’t crash')])
 
 
+class IterparseTest(unittest.TestCase):
+    text = ('{a = 1; "b c" = (x, "y\\"z"); d = ({e = ();}, (f));'
+            ' g = "\\U2019";}')
+
+    def test_events(self):
+        self.assertEqual(list(iterparse(io.StringIO(self.text))), [
+            ('start_dict', None),
+            ('key', 'a'), ('value', '1'),
+            ('key', 'b c'),
+            ('start_list', None),
+            ('value', 'x'), ('value', 'y"z'),
+            ('end_list', None),
+            ('key', 'd'),
+            ('start_list', None),
+            ('start_dict', None),
+            ('key', 'e'), ('start_list', None), ('end_list', None),
+            ('end_dict', None),
+            ('start_list', None), ('value', 'f'), ('end_list', None),
+            ('end_list', None),
+            ('key', 'g'), ('value', '\u2019'),
+            ('end_dict', None),
+        ])
+
+    def test_build_tree(self):
+        expected = Parser().parse(self.text)
+        for chunk_size in (1, 2, 3, 5, 8, 65536):
+            self.assertEqual(
+                build_tree(iterparse(io.StringIO(self.text), chunk_size)),
+                expected)
+
+    def test_bytes(self):
+        text = '{mystr = "Don\u2019t crash"; mylist = ("\u2019", a);}'
+        for chunk_size in (1, 2, 65536):
+            fp = io.BytesIO(text.encode('utf-8'))
+            self.assertEqual(build_tree(iterparse(fp, chunk_size)),
+                             Parser().parse(text))
+
+    def test_errors(self):
+        for text in ('{myval=1;}trailing', '{myval=@unexpected;}',
+                     '{mylist=(1,2,);}', '{myval=1 other=2;}', '{myval=1;',
+                     '{mylist=(1,{a=b;}', '(a b)'):
+            with self.assertRaises(ValueError):
+                list(iterparse(io.StringIO(text), 2))
+
+    def test_lazy(self):
+        class Reader(io.StringIO):
+            reads = 0
+
+            def read(self, size=-1):
+                self.reads += 1
+                return io.StringIO.read(self, size)
+
+        fp = Reader('(' + ', '.join(['{a = b;}'] * 1000) + ')')
+        events = iterparse(fp, 16)
+        self.assertEqual(next(events), ('start_list', None))
+        self.assertEqual(next(events), ('start_dict', None))
+        self.assertLess(fp.reads, 5)
+
+    def test_bounded_buffer(self):
+        glyph = ('{glyphname = "g%d"; layers = ({layerId = M1; paths = ('
+                 '{closed = 1; nodes = ("0 0 LINE", "10 10 LINE");});'
+                 ' width = 500;});}')
+        text = '{glyphs = (%s); unitsPerEm = 1000;}' % ', '.join(
+            glyph % i for i in range(2000))
+        sizes = []
+        read_chunk = parser._Scanner._read_chunk
+
+        def recording_read_chunk(scanner, i):
+            i = read_chunk(scanner, i)
+            sizes.append(len(scanner.text))
+            return i
+
+        with patch.object(parser._Scanner, '_read_chunk',
+                          recording_read_chunk):
+            tree = build_tree(iterparse(io.StringIO(text), 256))
+        self.assertEqual(tree, Parser().parse(text))
+        self.assertGreater(len(sizes), len(text) // 256)
+        self.assertLessEqual(max(sizes), 3 * 256)
+
+
+GLYPHS_SOURCE = """{
+familyName = "My (Font)";
+glyphs = (
+{
+glyphname = A;
+layers = (
+{
+layerId = "M1";
+paths = (
+{
+closed = 1;
+nodes = (
+"0 0 LINE",
+"100 0 LINE"
+);
+}
+);
+width = 500;
+}
+);
+unicode = 0041;
+},
+{
+leftKerningGroup = "{";
+glyphname = "a.sc";
+layers = (
+);
+}
+);
+unitsPerEm = 1000;
+}"""
+
+
+TYPED_SOURCE = """{
+customParameters = (
+{
+name = panose;
+value = (2, 0, "5");
+},
+{
+name = note;
+value = "a (note)";
+}
+);
+date = "2017-06-01 12:00:00 +0000";
+fontMaster = (
+{
+alignmentZones = ("{800, 16}", "{0, -16}");
+id = M1;
+userData = {
+GSOffsetHorizontal = 10;
+other = 1;
+};
+}
+);
+glyphs = (
+{
+glyphname = A;
+layers = (
+{
+background = {
+paths = (
+{
+closed = 1;
+nodes = ("1 2 LINE");
+}
+);
+};
+layerId = M1;
+paths = (
+{
+closed = 0;
+nodes = ("0 0 LINE", "1.5 2 OFFCURVE", "10 -20 CURVE SMOOTH");
+}
+);
+width = 600.5;
+}
+);
+unicode = 0041;
+}
+);
+kerning = {
+M1 = {
+A = {
+V = -50;
+};
+};
+};
+unitsPerEm = 1000;
+unknownKey = (1, {a = 1;});
+}"""
+
+
+class TypedParserTest(unittest.TestCase):
+    def expected(self, text):
+        data = Parser().parse(text)
+        cast_data(data)
+        return data
+
+    def test_parse(self):
+        self.assertEqual(Parser(_TYPE_STRUCTURE).parse(TYPED_SOURCE),
+                         self.expected(TYPED_SOURCE))
+        self.assertEqual(Parser(_TYPE_STRUCTURE).parse(GLYPHS_SOURCE),
+                         self.expected(GLYPHS_SOURCE))
+
+    def test_build_tree(self):
+        for chunk_size in (1, 7, 65536):
+            self.assertEqual(
+                build_tree(iterparse(io.StringIO(TYPED_SOURCE), chunk_size),
+                           _TYPE_STRUCTURE),
+                self.expected(TYPED_SOURCE))
+
+    def test_parse_file(self):
+        expected = self.expected(TYPED_SOURCE)
+        for chunk_size in (1, 7, 65536):
+            self.assertEqual(
+                Parser(_TYPE_STRUCTURE).parse_file(
+                    io.StringIO(TYPED_SOURCE), chunk_size),
+                expected)
+
+    def test_load_reads_chunks(self):
+        class Reader(io.BytesIO):
+            def read(self, size=-1):
+                assert size > 0, 'the whole file is read at once'
+                return io.BytesIO.read(self, size)
+
+        self.assertEqual(load(Reader(TYPED_SOURCE.encode('utf-8'))),
+                         self.expected(TYPED_SOURCE))
+
+    def test_errors(self):
+        for text in ('(a, b)', '{glyphs = ({a = 1;},);}', '{unitsPerEm = x;}'):
+            with self.assertRaises(ValueError):
+                Parser(_TYPE_STRUCTURE).parse(text)
+            with self.assertRaises(ValueError):
+                Parser(_TYPE_STRUCTURE).parse_file(io.StringIO(text), 2)
+
+
+class IndexGlyphsTest(unittest.TestCase):
+    def test_index_glyphs(self):
+        start, end, glyphs = index_glyphs(GLYPHS_SOURCE)
+        parsed = Parser().parse(GLYPHS_SOURCE)
+        self.assertEqual(
+            Parser().parse(GLYPHS_SOURCE[start:end]), parsed['glyphs'])
+        self.assertEqual([name for name, _, _ in glyphs], ['A', 'a.sc'])
+        self.assertEqual(
+            [Parser().parse(GLYPHS_SOURCE[s:e]) for _, s, e in glyphs],
+            parsed['glyphs'])
+
+    def test_no_glyphs(self):
+        self.assertIsNone(
+            index_glyphs('{myglyphs = (a); b = {glyphs = ();};}'))
+
+    def test_loads_lazy(self):
+        data = loads(GLYPHS_SOURCE)
+        lazy = loads_lazy(GLYPHS_SOURCE)
+        self.assertEqual(list(lazy.keys()), list(data.keys()))
+        self.assertEqual(lazy['unitsPerEm'], 1000)
+        self.assertEqual(list(lazy['glyphs']), data['glyphs'])
+        self.assertEqual(lazy['glyphs'].names(), ['A', 'a.sc'])
+        self.assertEqual(lazy['glyphs']['A'], data['glyphs'][0])
+        self.assertEqual(lazy['glyphs']['a.sc'], data['glyphs'][1])
+        self.assertEqual(lazy['glyphs'][-1], data['glyphs'][1])
+        self.assertEqual(lazy['glyphs'][:1], data['glyphs'][:1])
+        self.assertIs(lazy['glyphs']['A'], lazy['glyphs'][0])
+        self.assertIn('A', lazy['glyphs'])
+        self.assertNotIn('B', lazy['glyphs'])
+        self.assertIsNone(lazy['glyphs'].get('B'))
+        with self.assertRaises(IndexError):
+            lazy['glyphs'][2]
+
+
+class ParallelLoadTest(unittest.TestCase):
+    def test_loads_workers(self):
+        text = GLYPHS_SOURCE.replace(
+            'glyphs = (\n', 'glyphs = (\n' + '{glyphname = B%d;},\n' * 20)
+        text = text % tuple(range(20))
+        self.assertEqual(loads(text, workers=2), loads(text))
+        self.assertEqual(load(io.StringIO(text), workers=2), loads(text))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,212 @@
+# coding=UTF-8
+#
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (print_function, division, absolute_import,
+                        unicode_literals)
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+from mock import patch
+
+import glyphsLib
+from glyphsLib.__main__ import main, parse_options
+from glyphsLib.timing import Timings, span
+
+
+SOURCE = '''{
+familyName = MyFont;
+fontMaster = ({ascender = 800; capHeight = 700; descender = -200; id = M1;
+xHeight = 500;});
+glyphs = (
+{glyphname = A; layers = ({layerId = M1; paths = ({closed = 1;
+nodes = ("0 0 LINE", "500 0 LINE", "250 700 LINE");}); width = 500;});},
+{glyphname = B; layers = ({layerId = M1; width = 500;});}
+);
+kerning = {M1 = {A = {B = -20;};};};
+unitsPerEm = 1000;
+versionMajor = 1;
+versionMinor = 0;
+}'''
+
+
+class TimingsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_span_inactive(self):
+        with span('stage', 3) as stage:
+            stage.count = 4
+        self.assertEqual(stage.name, 'stage')
+        self.assertIsNone(stage.wall)
+
+    def test_spans(self):
+        finished = []
+        with Timings(callback=finished.append) as timings:
+            for i in range(2):
+                with span('outer', 2) as outer:
+                    with span('inner') as inner:
+                        inner.count = i
+        with span('after'):
+            pass
+        self.assertEqual([s.name for s in timings.spans],
+                         ['inner', 'outer', 'inner', 'outer'])
+        self.assertEqual(finished, timings.spans)
+        self.assertGreaterEqual(outer.wall, inner.wall)
+        self.assertGreaterEqual(outer.cpu, 0)
+
+        totals = timings.totals()
+        self.assertEqual(list(totals), ['inner', 'outer'])
+        self.assertEqual(totals['inner']['calls'], 2)
+        self.assertEqual(totals['inner']['count'], 1)
+        self.assertEqual(totals['outer']['count'], 4)
+        report = json.loads(timings.report())
+        self.assertEqual(report['spans'][1]['name'], 'outer')
+        self.assertEqual(report['totals']['outer']['calls'], 2)
+
+    def test_failed_span(self):
+        with Timings() as timings:
+            with self.assertRaises(ValueError):
+                with span('stage'):
+                    raise ValueError()
+        self.assertEqual([s.name for s in timings.spans], ['stage'])
+
+    def test_profile(self):
+        with Timings(profile=True) as timings:
+            for _ in range(2):
+                with span('outer'):
+                    with span('inner'):
+                        sorted(range(10))
+        # inner stages are profiled as part of the outer one
+        self.assertEqual(list(timings.profiles), ['outer'])
+        self.assertEqual(len(timings.spans), 4)
+        paths = timings.dump_profiles(os.path.join(self.directory, 'prof'))
+        self.assertEqual(paths, [
+            os.path.join(self.directory, 'prof', 'outer.prof')])
+        stats = pstats.Stats(paths[0])
+        self.assertTrue(any('sorted' in func[2] for func in stats.stats))
+
+    @unittest.skipIf(tracemalloc is None, 'requires tracemalloc')
+    def test_memory(self):
+        with Timings(memory=True, top=2) as timings:
+            self.assertTrue(tracemalloc.is_tracing())
+            with span('outer') as outer:
+                held = [bytearray(1000) for _ in range(1000)]
+                with span('inner') as inner:
+                    transient = bytearray(2000000)
+                    del transient
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(len(held), 1000)
+
+        self.assertGreater(inner.memory_peak - inner.memory_start, 1900000)
+        self.assertLess(inner.memory_end - inner.memory_start, 2000000)
+        self.assertGreaterEqual(outer.memory_peak, inner.memory_peak)
+        self.assertGreaterEqual(outer.memory_end - outer.memory_start,
+                                1000000)
+        site = outer.top_allocations[0]
+        self.assertEqual(site.filename, __file__)
+        self.assertGreaterEqual(site.size, 1000000)
+        self.assertGreaterEqual(site.count, 1000)
+        self.assertLessEqual(len(outer.top_allocations), 2)
+
+        totals = timings.totals()
+        self.assertEqual(totals['outer']['memory_peak'], outer.memory_peak)
+        report = json.loads(timings.report())
+        self.assertEqual(report['spans'][1]['memory_peak'], outer.memory_peak)
+        self.assertEqual(report['spans'][1]['top_allocations'][0]['lineno'],
+                         site.lineno)
+
+    @unittest.skipIf(tracemalloc is None, 'requires tracemalloc')
+    def test_memory_without_allocation_sites(self):
+        with Timings(memory=True, top=0) as timings:
+            with span('stage') as stage:
+                pass
+        self.assertIsNotNone(stage.memory_peak)
+        self.assertIsNone(stage.top_allocations)
+        self.assertNotIn('top_allocations', json.loads(timings.report())[
+            'spans'][0])
+
+    def test_to_ufos(self):
+        data = glyphsLib.loads(SOURCE)
+        with Timings() as timings:
+            glyphsLib.to_ufos(data)
+        totals = timings.totals()
+        self.assertEqual(list(totals), [
+            'master_layers', 'base_font', 'family', 'glyphs', 'anchors',
+            'features', 'groups', 'kerning'])
+        self.assertEqual(totals['glyphs']['count'], 2)
+        self.assertEqual(totals['kerning']['count'], 1)
+
+    def test_cli(self):
+        options = parse_options(['-g', 'font.glyphs'])
+        self.assertIsNone(options.timings)
+        self.assertIsNone(options.profile)
+        options = parse_options(['-g', 'font.glyphs', '--timings'])
+        self.assertEqual(options.timings, '-')
+
+        path = os.path.join(self.directory, 'MyFont.glyphs')
+        with open(path, 'w') as fp:
+            fp.write(SOURCE)
+        master_dir = os.path.join(self.directory, 'master_ufo')
+        os.mkdir(master_dir)
+        report_path = os.path.join(self.directory, 'timings.json')
+        profile_dir = os.path.join(self.directory, 'prof')
+        main(['-g', path, '-m', master_dir, '--timings', report_path,
+              '--profile', profile_dir])
+        with open(report_path) as fp:
+            totals = json.load(fp)['totals']
+        self.assertEqual(totals['parse']['count'], 2)
+        self.assertEqual(totals['write']['count'], 2)
+        self.assertIn('write.prof', os.listdir(profile_dir))
+
+    @unittest.skipIf(tracemalloc is None, 'requires tracemalloc')
+    def test_cli_memory(self):
+        options = parse_options(['-g', 'font.glyphs'])
+        self.assertIsNone(options.memory)
+        options = parse_options(['-g', 'font.glyphs', '--memory'])
+        self.assertEqual(options.memory, 10)
+
+        def build(opt):
+            with span('stage'):
+                pass
+        with patch('glyphsLib.__main__.build', side_effect=build), \
+                patch('glyphsLib.__main__.print', create=True) as print_:
+            main(['-g', 'font.glyphs', '--memory', '3'])
+        stage = json.loads(print_.call_args[0][0])['spans'][0]
+        self.assertIn('memory_peak', stage)
+        self.assertLessEqual(len(stage['top_allocations']), 3)
+
+    def test_cli_print(self):
+        with patch('glyphsLib.__main__.build') as build, \
+                patch('glyphsLib.__main__.print', create=True) as print_:
+            main(['-g', 'font.glyphs', '--timings'])
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(json.loads(print_.call_args[0][0]),
+                         {'spans': [], 'totals': {}})
+
+
+if __name__ == '__main__':
+    unittest.main()